@@ -1,2 +1,51 @@
-from .core import TableBase, connect
-from .schema import *
+"""The porydex database: its schema, and tools for loading and querying it.
+
+Importing this package is cheap; SQLAlchemy and the schema are only imported
+the first time something from them is used.  Every mapped class is defined
+at once on first access, rather than module by module, so that string-based
+relationships between classes in different modules can always be resolved.
+`from porydex.db import *` loads the schema, and imports all of it.
+"""
+
+import importlib as _importlib
+
+
+def __getattr__(name):
+    if name == '__all__':
+        _load_schema()
+        return [name for name in globals() if not name.startswith('_')]
+    # Other dunder lookups (from pickle, inspect, etc.) shouldn't import
+    # anything
+    elif name.startswith('__'):
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
+    elif name == 'connect':
+        return _importlib.import_module('.core', __name__).connect
+
+    _load_schema()
+
+    try:
+        return globals()[name]
+    except KeyError:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name)) from None
+
+def __dir__():
+    _load_schema()
+    return list(globals())
+
+def _load_schema():
+    """Import the whole schema, and copy its public names in here."""
+
+    # (Not `from . import ...`, which would look the names up on this module
+    # and end up back in __getattr__)
+    core = _importlib.import_module('.core', __name__)
+    schema = _importlib.import_module('.schema', __name__)
+
+    namespace = globals()
+    namespace.setdefault('TableBase', core.TableBase)
+    namespace.setdefault('connect', core.connect)
+
+    for name, value in vars(schema).items():
+        if not name.startswith('_'):
+            namespace.setdefault(name, value)
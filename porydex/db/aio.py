@@ -0,0 +1,276 @@
+"""An asyncio facade for read-only lookups.
+
+SQLAlchemy (as of 1.3) only talks to databases synchronously, so `AsyncDex`
+runs each lookup in its own session on a bounded pool of worker threads,
+each with a connection from a pool of the same size, and awaits the result
+without blocking the event loop:
+
+    async with AsyncDex('sqlite:////path/to/porydex.sqlite') as dex:
+        pikachu = await dex.by_identifier(porydex.db.Pokemon, 'pikachu')
+        instance = await dex.instance_detail(game_id, pikachu.id)
+        moves = await dex.learnset(game_id, pikachu.id, form_id)
+
+At most `max_workers` lookups run at once; any more wait in the executor's
+queue.  Lookups hand back detached objects with everything they promise
+already loaded, so touching anything else raises DetachedInstanceError
+rather than quietly blocking on the database.  `run` takes any function of
+a session, for other lookups.
+
+Cancelling a lookup that hasn't started yet keeps it from starting.
+Cancelling one that's running interrupts its query, on SQLite and on
+PostgreSQL with psycopg2; elsewhere the query runs to completion and its
+result is thrown away.  Any statement it starts afterwards fails.  Either
+way, its session is closed and its connection goes back to the pool.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+
+import sqlalchemy as sa
+import sqlalchemy.orm
+
+import porydex.db
+import porydex.db.core
+import porydex.db.learnsets
+import porydex.db.loaders
+
+
+DEFAULT_MAX_WORKERS = 8
+
+# How many SQLite virtual machine instructions run between checks for
+# whether a lookup has been cancelled
+SQLITE_PROGRESS_STEPS = 1000
+
+
+class AsyncDex:
+    """Awaitable lookups on a database, run on a bounded thread pool.
+
+    With no URI, the prebuilt database is used; see
+    `porydex.db.core.prebuilt_engine`.  In-memory SQLite databases can't be
+    shared between threads, so they aren't supported.
+    """
+
+    def __init__(self, uri=None, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.engine = pooled_engine(uri, max_workers)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers, thread_name_prefix='porydex-aio')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Wait for running lookups to finish, then close every connection
+        and thread.
+        """
+
+        await asyncio.get_running_loop().run_in_executor(None, self._close)
+
+    def _close(self):
+        self._executor.shutdown(wait=True)
+        self.engine.dispose()
+
+    async def run(self, func, *args):
+        """Call `func(session, *args)` with a new session on a worker
+        thread, and return the result.
+
+        The session is closed before the result is handed back, so `func`
+        should load everything the caller needs.
+        """
+
+        job = Job()
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._run_job, job, func, args)
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # (Cancelling `future` already kept it from starting, if it
+            # hadn't yet)
+            job.cancel()
+            raise
+
+    def _run_job(self, job, func, args):
+        with self.engine.connect() as connection:
+            if not job.start(connection):
+                return None
+
+            session = sa.orm.Session(bind=connection)
+
+            try:
+                return func(session, *args)
+            finally:
+                job.finish()
+                session.close()
+
+    async def by_identifier(self, cls, identifier):
+        """Return the `cls` with an identifier, or None; see
+        `fetch_by_identifier`.
+        """
+
+        return await self.run(fetch_by_identifier, cls, identifier)
+
+    async def instance_detail(self, game_id, pokemon_id, form_id=None):
+        """Return a Pokémon instance, or None; see
+        `fetch_instance_detail`.
+        """
+
+        return await self.run(
+            fetch_instance_detail, game_id, pokemon_id, form_id)
+
+    async def learnset(self, game_id, pokemon_id, form_id):
+        """Return a Pokémon form's learnset in a game; see `fetch_learnset`.
+        """
+
+        return await self.run(fetch_learnset, game_id, pokemon_id, form_id)
+
+
+class Job:
+    """One lookup, as seen from both the event loop and its worker thread,
+    so that the loop can interrupt it.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._interrupt = None
+        self._dbapi_connection = None
+        self._lock = threading.Lock()
+
+    def start(self, connection):
+        """Note that the lookup is about to run on a connection; return
+        False if it's already been cancelled.
+
+        From then on, statements the lookup starts after it's cancelled fail
+        right away, and on SQLite, so do running ones, however close the
+        cancellation comes to the start of the statement.
+        """
+
+        with self._lock:
+            if self.cancelled:
+                return False
+
+            sa.event.listen(connection, 'before_cursor_execute',
+                            self._check_cancelled)
+
+            if connection.dialect.name == 'sqlite':
+                self._dbapi_connection = connection.connection.connection
+                self._dbapi_connection.set_progress_handler(
+                    lambda: self.cancelled, SQLITE_PROGRESS_STEPS)
+
+            self._interrupt = interrupter(connection)
+            return True
+
+    def finish(self):
+        """Note that the lookup is done with its connection."""
+
+        with self._lock:
+            self._interrupt = None
+
+            # The connection goes back to the pool, for other lookups
+            if self._dbapi_connection is not None:
+                self._dbapi_connection.set_progress_handler(None, 0)
+                self._dbapi_connection = None
+
+    def cancel(self):
+        """Cancel the lookup, interrupting its query if it's running."""
+
+        with self._lock:
+            self.cancelled = True
+
+            if self._interrupt is not None:
+                self._interrupt()
+
+    def _check_cancelled(self, *args):
+        if self.cancelled:
+            raise Cancelled()
+
+
+class Cancelled(Exception):
+    """Raised in a worker thread when its lookup is cancelled between
+    statements.
+    """
+
+
+def interrupter(connection):
+    """Return a function that aborts whatever a connection is executing,
+    callable from another thread, or None if there's no way to.
+    """
+
+    dbapi_connection = connection.connection.connection
+    dialect = connection.dialect
+
+    if dialect.name == 'sqlite':
+        return dbapi_connection.interrupt
+    elif dialect.name == 'postgresql' and dialect.driver == 'psycopg2':
+        return dbapi_connection.cancel
+
+    return None
+
+def pooled_engine(uri, pool_size):
+    """Create an engine with a pool of `pool_size` connections that any
+    thread can use, for `uri` or the prebuilt database; see
+    `porydex.db.core.create_pooled_engine`.
+
+    It's not shared with `porydex.db.connect`, since `AsyncDex.close`
+    disposes of it.
+    """
+
+    return porydex.db.core.create_pooled_engine(
+        uri, pool_size=pool_size, max_overflow=0)
+
+
+### Lookups
+
+def fetch_by_identifier(session, cls, identifier):
+    """Return the `cls` with an identifier (and its names, for `ByLanguage`
+    classes), or None.
+    """
+
+    return session.query(cls).filter_by(identifier=identifier).one_or_none()
+
+def fetch_instance_detail(session, game_id, pokemon_id, form_id=None):
+    """Return a Pokémon instance in a game, or None, with everything in
+    `porydex.db.loaders.INSTANCE_DETAIL` loaded.  Without `form_id`, return
+    the default form's.
+    """
+
+    PokemonInstance = porydex.db.PokemonInstance
+    query = (porydex.db.loaders.INSTANCE_DETAIL.query(session)
+             .filter_by(game_id=game_id, pokemon_id=pokemon_id))
+
+    if form_id is None:
+        query = (query.join(PokemonInstance.pokemon_form)
+                 .filter(porydex.db.PokemonForm.is_default))
+    else:
+        query = query.filter_by(form_id=form_id)
+
+    return query.one_or_none()
+
+def fetch_learnset(session, game_id, pokemon_id, form_id):
+    """Return a list of `porydex.db.learnsets.LearnsetMove`s for everything
+    a Pokémon form can learn in a game, grouped by method.
+    """
+
+    tables = porydex.db.TableBase.metadata.tables
+    move_list_map = tables['pokemon_move_list_map']
+    pokemon_moves = tables['pokemon_moves']
+
+    rows = session.execute(
+        sa.select([pokemon_moves.c.move_id, move_list_map.c.method,
+                   pokemon_moves.c.level, pokemon_moves.c.order_within_level])
+        .select_from(move_list_map.join(
+            pokemon_moves,
+            pokemon_moves.c.pokemon_move_list_id ==
+                move_list_map.c.pokemon_move_list_id
+        ))
+        .where(move_list_map.c.game_id == game_id)
+        .where(move_list_map.c.pokemon_id == pokemon_id)
+        .where(move_list_map.c.form_id == form_id)
+        .order_by(move_list_map.c.method, pokemon_moves.c.move_id)
+    )
+
+    return [porydex.db.learnsets.LearnsetMove(*row) for row in rows]
@@ -0,0 +1,528 @@
+"""Benchmarks for loading, dumping, and reading the database, with
+regression tracking.
+
+Each benchmark runs `--repeat` times against a scratch SQLite database (and,
+optionally, a PostgreSQL database you provide), and its best time is
+compared against a baseline from an earlier run:
+
+    python -m porydex.db.benchmark -o baseline.json
+    ... change things ...
+    python -m porydex.db.benchmark -b baseline.json -t 0.1
+
+That exits with status 1 if any benchmark got more than 10% slower.  The
+benchmarks are:
+
+    load, reload, dump      the CLI commands, as a whole
+    validate                checking the CSVs, without the database
+    load_table/<table>      loading one of the big CSVs into its table
+    read/names              names of everything, through `ByLanguage`
+    read/instances          a game's Pokémon, with stats, types, abilities
+    read/learnsets          a game's learnsets, through `PokemonMoveListMap`
+    import/<module>         importing porydex.db or the CLI, in a new process
+
+Import times also have a fixed budget (see `IMPORT_BUDGETS`), and going over
+it fails the run whether or not there's a baseline.  Give some names (or
+prefixes, like `read`) to run only those.  The CSVs are copied into a
+scratch directory first, so dump never touches the real ones.
+
+Best times are compared rather than averages, since noise on a busy machine
+only ever makes things slower.  Only compare results from the same machine.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import sqlalchemy as sa
+import sqlalchemy.orm
+
+import porydex
+import porydex.db
+import porydex.db.cli
+import porydex.db.core
+import porydex.db.csvs
+import porydex.db.validate
+
+
+RESULTS_VERSION = 1
+
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.1
+
+# The biggest CSVs, for the load_table benchmarks
+DEFAULT_TABLES = (
+    'pokemon_stats',
+    'pokemon_move_list_map',
+    'pokemon_abilities',
+    'pokemon_types',
+    'pokemon_egg_groups',
+)
+
+# The most each module may take to import, in seconds, as measured by
+# `import_time`.  porydex.db takes a few milliseconds, since it imports
+# nothing until it's used; the CLI takes about 0.25s, mostly SQLAlchemy.
+# Both leave room for a busy machine, so that only real regressions fail.
+IMPORT_BUDGETS = {
+    'porydex.db': 0.05,
+    'porydex.db.cli': 0.6,
+}
+
+
+class Stopwatch:
+    """Times a `with` block."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+
+
+class Backend:
+    """A database to run benchmarks against."""
+
+    def __init__(self, name, uri):
+        self.name = name
+        self.uri = uri
+        self.engine = sa.create_engine(uri)
+
+    def run_command(self, func, **args):
+        """Run a CLI command the way `porydex.db.cli.main` does, without its
+        output.
+        """
+
+        with quiet(), self.engine.connect() as connection:
+            with connection.begin():
+                func(connection, **args)
+
+            porydex.db.cli.run_after_commit(connection)
+
+    def empty(self):
+        """Drop everything porydex creates."""
+
+        with self.engine.begin() as connection:
+            porydex.db.TableBase.metadata.drop_all(connection)
+            porydex.db.core.sync_metadata.drop_all(connection)
+
+    def session(self):
+        return sa.orm.Session(bind=self.engine)
+
+    def dispose(self):
+        self.engine.dispose()
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow anything printed in a `with` block."""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+### Benchmarks
+
+def bench_load(backend):
+    backend.empty()
+
+    with Stopwatch() as stopwatch:
+        backend.run_command(porydex.db.cli.load)
+
+    return stopwatch.seconds
+
+def bench_reload(backend):
+    with Stopwatch() as stopwatch:
+        backend.run_command(porydex.db.cli.reload)
+
+    return stopwatch.seconds
+
+def bench_dump(backend):
+    with Stopwatch() as stopwatch:
+        backend.run_command(porydex.db.cli.dump)
+
+    return stopwatch.seconds
+
+def bench_validate(backend):
+    with Stopwatch() as stopwatch:
+        porydex.db.validate.validate_csvs()
+
+    return stopwatch.seconds
+
+def bench_load_table(backend, table_name):
+    """Time loading one table's CSV into it, after emptying it in a
+    transaction that's then rolled back.
+    """
+
+    table = porydex.db.TableBase.metadata.tables[table_name]
+
+    with quiet(), backend.engine.connect() as connection:
+        transaction = connection.begin()
+
+        try:
+            connection.execute(table.delete())
+
+            with Stopwatch() as stopwatch:
+                porydex.db.cli.load_table(table, connection)
+        finally:
+            transaction.rollback()
+
+    return stopwatch.seconds
+
+def bench_names(backend):
+    session = backend.session()
+
+    try:
+        with Stopwatch() as stopwatch:
+            for cls in (porydex.db.Pokemon, porydex.db.PokemonForm,
+                        porydex.db.Move, porydex.db.Ability,
+                        porydex.db.Type):
+                for thing in session.query(cls):
+                    thing.name
+    finally:
+        session.close()
+
+    return stopwatch.seconds
+
+def bench_instances(backend):
+    session = backend.session()
+    game_id = biggest_game_id(session)
+
+    try:
+        with Stopwatch() as stopwatch:
+            for instance in (session.query(porydex.db.PokemonInstance)
+                             .filter_by(game_id=game_id)):
+                for pokemon_stat in instance.stats:
+                    pokemon_stat.stat.name
+
+                for type_ in instance.types:
+                    type_.name
+
+                for pokemon_ability in instance.pokemon_abilities:
+                    pokemon_ability.ability.name
+    finally:
+        session.close()
+
+    return stopwatch.seconds
+
+def bench_learnsets(backend):
+    session = backend.session()
+    game_id = biggest_game_id(session)
+
+    try:
+        with Stopwatch() as stopwatch:
+            for move_list_map in (session.query(porydex.db.PokemonMoveListMap)
+                                  .filter_by(game_id=game_id)):
+                for pokemon_move in (move_list_map.pokemon_move_list
+                                     .pokemon_moves):
+                    pokemon_move.move.name
+    finally:
+        session.close()
+
+    return stopwatch.seconds
+
+def import_time(module):
+    """Return how long a module takes to import in a new interpreter, in
+    seconds, according to `python -X importtime`.
+    """
+
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(porydex.__file__)))
+    ).stderr
+
+    # Lines look like "import time:  self [us] | cumulative | package"
+    for line in output.splitlines():
+        parts = line.split('|')
+
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1e6
+
+    raise ValueError('No import time for {}'.format(module))
+
+def biggest_game_id(session):
+    """Return the id of the game with the most Pokémon."""
+
+    instance = porydex.db.PokemonInstance
+
+    return (session.query(instance.game_id)
+            .group_by(instance.game_id)
+            .order_by(sa.func.count().desc(), instance.game_id)
+            .limit(1)
+            .scalar())
+
+def benchmarks(tables=DEFAULT_TABLES):
+    """Return a list of (name, function) pairs for every benchmark, in the
+    order they run.
+
+    load and reload leave the database loaded for everything after them.
+    """
+
+    referenced = {
+        key.column.table
+        for table in porydex.db.TableBase.metadata.tables.values()
+        for key in table.foreign_keys
+        if key.column.table is not table
+    }
+
+    result = [
+        ('load', bench_load),
+        ('reload', bench_reload),
+        ('dump', bench_dump),
+        ('validate', bench_validate),
+    ]
+
+    for table_name in tables:
+        table = porydex.db.TableBase.metadata.tables[table_name]
+
+        # Emptying a table other tables point to would break their foreign
+        # keys, on databases that check them right away
+        if table in referenced:
+            raise ValueError('Other tables refer to {}, so it can\'t be '
+                             'benchmarked on its own'.format(table_name))
+
+        result.append((
+            'load_table/{}'.format(table_name),
+            lambda backend, table_name=table_name:
+                bench_load_table(backend, table_name)
+        ))
+
+    result.extend([
+        ('read/names', bench_names),
+        ('read/instances', bench_instances),
+        ('read/learnsets', bench_learnsets),
+    ])
+
+    return result
+
+def selected(name, patterns):
+    """Return whether a benchmark is one of `patterns`, or under one of
+    them, e.g. 'read/names' is under 'read'.
+    """
+
+    return not patterns or any(
+        name == pattern or name.startswith(pattern.rstrip('/') + '/')
+        for pattern in patterns)
+
+
+### Running and comparing
+
+def run(backends, patterns=(), repeat=DEFAULT_REPEAT, tables=DEFAULT_TABLES,
+        report=print):
+    """Run the selected benchmarks against each backend, and return the
+    results as a JSON-friendly dict.
+    """
+
+    results = {}
+
+    def record(key, times):
+        results[key] = {
+            'times': times,
+            'best': min(times),
+            'median': statistics.median(times),
+        }
+        report('{:<40} {:>9.3f}s'.format(key, min(times)))
+
+    # Imports don't depend on the database
+    for module in IMPORT_BUDGETS:
+        key = 'import/{}'.format(module)
+
+        if selected(key, patterns):
+            record(key, [import_time(module) for n in range(repeat)])
+
+    chosen = [(name, func) for name, func in benchmarks(tables)
+              if selected(name, patterns)]
+
+    for backend in backends if chosen else ():
+        if not any(name in ('load', 'reload') for name, func in chosen):
+            report('{}: loading...'.format(backend.name))
+            backend.empty()
+            backend.run_command(porydex.db.cli.load)
+
+        for name, func in chosen:
+            record('{}/{}'.format(backend.name, name),
+                   [func(backend) for n in range(repeat)])
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'sqlalchemy': sa.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+def compare(results, baseline):
+    """Compare results against a baseline.
+
+    Return a list of (key, baseline best, best, change) tuples for every
+    benchmark in both, where change is the fractional change in best time,
+    e.g. 0.25 for 25% slower.
+    """
+
+    if baseline.get('version') != RESULTS_VERSION:
+        raise ValueError('The baseline is from an incompatible version')
+
+    comparisons = []
+
+    for key, result in results['results'].items():
+        try:
+            baseline_best = baseline['results'][key]['best']
+        except KeyError:
+            continue
+
+        change = result['best'] / baseline_best - 1 if baseline_best else 0
+        comparisons.append((key, baseline_best, result['best'], change))
+
+    return comparisons
+
+def over_budget(results):
+    """Return a list of (module, best import time, budget) tuples for every
+    module whose import took longer than its budget.
+    """
+
+    over = []
+
+    for module, budget in IMPORT_BUDGETS.items():
+        result = results['results'].get('import/{}'.format(module))
+
+        if result is not None and result['best'] > budget:
+            over.append((module, result['best'], budget))
+
+    return over
+
+def regressions(comparisons, threshold=DEFAULT_THRESHOLD):
+    """Return the comparisons that got slower by more than `threshold`."""
+
+    return [comparison for comparison in comparisons
+            if comparison[3] > threshold]
+
+@contextlib.contextmanager
+def scratch_data_dir(directory):
+    """Copy the CSVs into a directory, and use them from there inside a
+    `with` block.  Worker processes inherit it through the environment.
+    """
+
+    shutil.copytree(porydex.db.csvs.data_dir(), directory,
+                    ignore=shutil.ignore_patterns('.*'))
+    old_data_dir = os.environ.get('PORYDEX_DATA_DIR')
+    os.environ['PORYDEX_DATA_DIR'] = directory
+
+    try:
+        yield
+    finally:
+        if old_data_dir is None:
+            del os.environ['PORYDEX_DATA_DIR']
+        else:
+            os.environ['PORYDEX_DATA_DIR'] = old_data_dir
+
+
+### main method stuff
+
+def make_parser():
+    """Create and return a parser for command-line arguments."""
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark loading, dumping, and reading the porydex '
+                    'database.')
+    parser.add_argument(
+        'benchmarks', nargs='*',
+        help='The benchmarks to run, or prefixes of them (default: all).')
+    parser.add_argument(
+        '-o', '--output', metavar='PATH',
+        help='Write the results to a JSON file, e.g. to use as a baseline.')
+    parser.add_argument(
+        '-b', '--baseline', metavar='PATH',
+        help='Compare the results against an earlier JSON file.')
+    parser.add_argument(
+        '-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='How much slower than the baseline counts as a regression, as '
+             'a fraction (default {}).'.format(DEFAULT_THRESHOLD))
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=DEFAULT_REPEAT,
+        help='How many times to run each benchmark (default {}).'
+             .format(DEFAULT_REPEAT))
+    parser.add_argument(
+        '--table', action='append', dest='tables', metavar='TABLE',
+        help='A table for the load_table benchmarks; can be given more than '
+             'once (default: {}).'.format(', '.join(DEFAULT_TABLES)))
+    parser.add_argument(
+        '--postgresql', metavar='URI',
+        help='Also benchmark this PostgreSQL database.  Anything porydex '
+             'put in it is dropped!')
+
+    return parser
+
+def main(argv=None):
+    """Parse arguments, run the benchmarks, and exit with status 1 if any of
+    them regressed or went over budget.
+    """
+
+    args = make_parser().parse_args(argv)
+    tables = tuple(args.tables or DEFAULT_TABLES)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    with tempfile.TemporaryDirectory(prefix='porydex-benchmark-') as scratch:
+        backends = [Backend('sqlite', 'sqlite:///{}'.format(
+            os.path.join(scratch, 'porydex.sqlite')))]
+
+        if args.postgresql is not None:
+            backends.append(Backend('postgresql', args.postgresql))
+
+        try:
+            with scratch_data_dir(os.path.join(scratch, 'data')):
+                results = run(backends, args.benchmarks, args.repeat, tables)
+        finally:
+            for backend in backends:
+                backend.dispose()
+
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+            output_file.write('\n')
+
+    failed = False
+
+    for module, seconds, budget in over_budget(results):
+        print('Importing {} took {:.3f}s, over its budget of {:.3f}s'.format(
+            module, seconds, budget))
+        failed = True
+
+    if baseline is not None:
+        comparisons = compare(results, baseline)
+        print()
+        print('{:<40} {:>10} {:>10} {:>8}'.format(
+            'benchmark', 'baseline', 'now', 'change'))
+
+        for key, baseline_best, best, change in comparisons:
+            print('{:<40} {:>9.3f}s {:>9.3f}s {:>+7.1f}%{}'.format(
+                key, baseline_best, best, change * 100,
+                '  REGRESSION' if change > args.threshold else ''))
+
+        slower = regressions(comparisons, args.threshold)
+
+        if slower:
+            print('{} benchmark(s) regressed by more than {:.0%}'.format(
+                len(slower), args.threshold))
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""An opt-in, process-wide cache of small, static reference tables.
+
+Languages, generations, games, types, stats, egg groups, type charts, and
+abilities never change at runtime, but every new session would otherwise
+query them again, e.g. through `PokemonStat.stat` and `PokemonAbility.ability`,
+which are joined eagerly.  With the cache, each of those tables (and their
+names) is loaded once per database, kept detached, and merged into new
+sessions without loading anything:
+
+    session = porydex.db.connect(uri, cache=True)
+
+Sessions with the cache also use `ReferenceCacheQuery`, which loads
+relationships to cached classes lazily rather than joining them; the lazy
+load finds the object in the session's identity map, so navigating to a
+cached object (e.g. `pokemon_stat.stat.name`) never reaches the database,
+and nor does `Query.get`.  Other queries for cached classes, like
+`session.query(Stat).filter_by(...)`, still run their one SELECT, since
+their criteria can't be answered from the cache; but the rows they find are
+the cached objects, and their names aren't loaded again.
+
+The cache holds up to `maxsize` databases' worth of objects, evicting the
+least recently used.  load, reload, and sync clear it for the database they
+change (see `porydex.db.core.invalidate_caches`); anything else that changes
+the tables, including another process, should call `invalidate`.
+"""
+
+import collections
+import threading
+
+import sqlalchemy as sa
+import sqlalchemy.orm
+
+import porydex.db
+from porydex.db.core import register_invalidation_hook
+
+
+DEFAULT_MAXSIZE = 8
+
+
+def cached_classes():
+    """Return the mapped classes whose rows are cached."""
+
+    return (
+        porydex.db.Language,
+        porydex.db.Generation,
+        porydex.db.Game,
+        porydex.db.Type,
+        porydex.db.Stat,
+        porydex.db.EggGroup,
+        porydex.db.TypeChart,
+        porydex.db.Ability,
+    )
+
+
+class ReferenceCache:
+    """Detached copies of every row of the cached classes, per database."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._objects = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def objects(self, engine):
+        """Return a list of detached objects for every cached row in a
+        database, loading them if necessary.
+        """
+
+        key = self.key(engine)
+
+        with self._lock:
+            try:
+                self._objects.move_to_end(key)
+                return self._objects[key]
+            except KeyError:
+                pass
+
+        # Loading happens outside the lock; at worst, two threads both load
+        # the same tables, and one copy wins
+        objects = self._load(engine)
+
+        with self._lock:
+            objects = self._objects.setdefault(key, objects)
+            self._objects.move_to_end(key)
+
+            while len(self._objects) > self.maxsize:
+                self._objects.popitem(last=False)
+
+        return objects
+
+    def attach(self, session):
+        """Merge every cached object into a session, without querying."""
+
+        engine = session.get_bind()
+        session.info['porydex_reference_cache'] = [
+            session.merge(thing, load=False)
+            for thing in self.objects(engine)
+        ]
+
+    def invalidate(self, engine=None):
+        """Forget the cached objects for one database, or for all of them."""
+
+        with self._lock:
+            if engine is None:
+                self._objects.clear()
+            else:
+                self._objects.pop(self.key(engine), None)
+
+    @staticmethod
+    def key(engine):
+        """Return the key an engine's database is cached under.
+
+        Engines for the same database file or server share a key; in-memory
+        databases (including prebuilt engines, which use a custom creator)
+        are only shared through the same engine.
+        """
+
+        if engine.url.database in (None, '', ':memory:'):
+            return engine
+
+        return str(engine.url)
+
+    def _load(self, engine):
+        session = sa.orm.Session(bind=engine)
+
+        try:
+            objects = []
+
+            for cls in cached_classes():
+                # ByLanguage's names are loaded along with everything else,
+                # since they're selectin
+                objects.extend(session.query(cls).all())
+
+            session.expunge_all()
+            return objects
+        finally:
+            session.close()
+
+
+class ReferenceCacheQuery(sa.orm.Query):
+    """A query that loads relationships to cached classes lazily, so that
+    they come from the session's identity map instead of a join.
+    """
+
+    def __iter__(self):
+        options = []
+
+        for description in self.column_descriptions:
+            entity = description['entity']
+
+            # Aliases and plain columns are left alone
+            if isinstance(entity, type) and entity is description['type']:
+                options.extend(lazyload_options(entity))
+
+        query = self.options(*options) if options else self
+        return super(ReferenceCacheQuery, query).__iter__()
+
+
+_lazyload_options = {}
+
+def lazyload_options(cls):
+    """Return loader options that make every many-to-one relationship to a
+    cached class, from `cls` or anything it loads eagerly, load lazily.
+
+    For a cached class itself, every relationship loads lazily, since the
+    cached objects already have everything loaded.
+    """
+
+    try:
+        return _lazyload_options[cls]
+    except KeyError:
+        pass
+
+    cached = set(cached_classes())
+    options = []
+
+    def walk(mapper, path, seen):
+        for relationship in mapper.relationships:
+            attribute = getattr(mapper.class_, relationship.key)
+            target = relationship.mapper
+
+            if (target.class_ in cached and
+                    relationship.direction is sa.orm.interfaces.MANYTOONE):
+                options.append(
+                    sa.orm.lazyload(attribute) if path is None
+                    else path.lazyload(attribute))
+            elif (relationship.lazy in ('joined', 'selectin', 'subquery') and
+                    target not in seen):
+                walk(target,
+                     sa.orm.defaultload(attribute) if path is None
+                     else path.defaultload(attribute),
+                     seen | {target})
+
+    mapper = sa.inspect(cls)
+
+    if mapper.class_ in cached:
+        options.extend(
+            sa.orm.lazyload(getattr(cls, relationship.key))
+            for relationship in mapper.relationships)
+    else:
+        walk(mapper, None, {mapper})
+
+    return _lazyload_options.setdefault(cls, options)
+
+
+default_cache = ReferenceCache()
+
+def cached_session(engine, cache=None):
+    """Return a new session on an engine, with the reference cache attached."""
+
+    if cache is None:
+        cache = default_cache
+
+    session = sa.orm.Session(bind=engine, query_cls=ReferenceCacheQuery)
+    cache.attach(session)
+    return session
+
+def invalidate(engine=None):
+    """Forget the default cache's objects for one database, or for all of
+    them.
+    """
+
+    default_cache.invalidate(engine)
+
+register_invalidation_hook(invalidate)
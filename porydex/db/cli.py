@@ -1,112 +1,1110 @@
 import argparse
+import concurrent.futures
 import csv
+import io
+import itertools
+import operator
+import os
+import shutil
+import sqlite3
+import tempfile
 
-import pkg_resources
 import sqlalchemy as sqla
 
 import porydex.db
+import porydex.db.columnar
+import porydex.db.convert
+import porydex.db.core
+import porydex.db.profiler
+import porydex.db.ranged
+import porydex.db.validate
+from porydex.db.csvs import (
+    combine_hashes, csv_game_ids, csv_hash, csv_path, data_hash, file_hash,
+    open_csv, ranged_csv_path, stored_csv_path)
+
+
+### Shared helpers
+
+def batches(iterable, size):
+    """Yield lists of up to `size` items from an iterable."""
+
+    iterator = iter(iterable)
+
+    while True:
+        batch = list(itertools.islice(iterator, size))
+
+        if not batch:
+            return
+
+        yield batch
+
+def csv_text(value):
+    """Return a value from the database as it would appear in a CSV."""
+
+    return '' if value is None else str(value)
+
+def insertion_order(table, headers, rows):
+    """Return the rows to insert into a table in an order that won't upset
+    any self-referencing foreign keys.
+    """
+
+    # pokemon has a self-referencing key — preevolution_id — so its rows have
+    # to be inserted in dependency order.  Instead of actually figuring it out,
+    # however, we can just use the order column.  It's small enough that
+    # reading it all in at once is no big deal.
+    # XXX Do this right someday
+    if table.name == 'pokemon':
+        return sorted(rows, key=operator.itemgetter(headers.index('order')))
+
+    return rows
+
+def after_commit(connection, func):
+    """Arrange for `func(connection)` to be called once the transaction
+    `connection` is in has been committed, for things that can't be done
+    inside a transaction.
+    """
+
+    connection.info.setdefault('porydex_after_commit', []).append(func)
+
+def run_after_commit(connection):
+    """Call everything passed to `after_commit` for this connection."""
+
+    for func in connection.info.pop('porydex_after_commit', []):
+        func(connection)
+
+def invalidate_caches(connection):
+    """Clear this process's caches of the database; pass this to
+    `after_commit` from anything that changes the data.
+    """
+
+    porydex.db.core.invalidate_caches(connection.engine)
 
 
 ### "load" command
 
-def load(connection):
-    """Create the database from scratch."""
+DEFAULT_BATCH_SIZE = 5000
 
-    print('Creating tables...')
-    porydex.db.TableBase.metadata.create_all(connection)
+def load(connection, batch_size=DEFAULT_BATCH_SIZE, jobs=1, bulk=False,
+         vacuum=False, validate_first=True):
+    """Create the database from scratch.
+
+    With more than one of `jobs`, the CSVs are parsed in that many worker
+    processes, but every row is still inserted through `connection`; see
+    `load_parallel`.  On PostgreSQL, the CSVs are parsed by the server with
+    COPY instead, and `jobs` is ignored.
+
+    `bulk` and `vacuum` only work with SQLite; see `sqlite_bulk_load`.  With
+    `validate_first`, the CSVs are checked before anything is created, with
+    the same number of `jobs`; see `validate`.
+    """
+
+    if (bulk or vacuum) and connection.dialect.name != 'sqlite':
+        raise ValueError('Bulk loading and vacuuming only work with SQLite')
+
+    if validate_first:
+        validate(connection, jobs)
+
+    if bulk:
+        sqlite_bulk_load(connection, batch_size, jobs)
+    else:
+        print('Creating tables...')
+        with porydex.db.profiler.phase(connection, 'create tables'):
+            porydex.db.TableBase.metadata.create_all(connection)
+
+        load_tables(connection, batch_size, jobs)
+
+    with porydex.db.profiler.phase(connection, 'record hashes'):
+        porydex.db.core.sync_metadata.create_all(connection)
+        record_csv_hashes(connection,
+                          porydex.db.TableBase.metadata.sorted_tables)
+    after_commit(connection, invalidate_caches)
+
+    if vacuum:
+        after_commit(connection, sqlite_vacuum)
+
+def load_tables(connection, batch_size, jobs):
+    """Load every table from its CSV into the freshly-created schema."""
 
     print('Loading tables...')
-    for table in porydex.db.TableBase.metadata.sorted_tables:
-        print('  - {}...'.format(table.name))
-        load_table(table, connection)
+    with porydex.db.profiler.phase(connection, 'load tables'):
+        if jobs > 1 and not postgresql_can_copy(connection):
+            # (COPY parses the CSVs server-side, so there's nothing for the
+            # worker processes to do)
+            load_parallel(connection, batch_size, jobs)
+        else:
+            for table in porydex.db.TableBase.metadata.sorted_tables:
+                print('  - {}...'.format(table.name))
+                load_table(table, connection, batch_size=batch_size)
+
+def load_table(table, connection, batch_size=DEFAULT_BATCH_SIZE):
+    """Load data into an empty table from a CSV.
 
-def load_table(table, connection):
-    """Load data into an empty table from a CSV."""
+    Rows are streamed from the CSV and inserted `batch_size` at a time, so
+    memory use doesn't grow with the size of the table.  On PostgreSQL, the
+    CSV is streamed to COPY instead.
 
-    csv_path = 'db/data/{0}.csv'.format(table.name)
-    csv_path = pkg_resources.resource_filename('porydex', csv_path)
+    If the connection is being profiled, the time spent on each step is
+    recorded; see `porydex.db.profiler`.
+    """
+
+    timings = porydex.db.profiler.table_timings(connection, table.name)
+
+    if postgresql_can_copy(connection):
+        with porydex.db.profiler.timed(timings, 'insert'):
+            row_count = postgresql_copy_load_table(table, connection)
+
+        if timings is not None:
+            timings.rows += max(row_count, 0)
+
+        return
 
     try:
-        with open(csv_path, encoding='UTF-8', newline='') as table_csv:
-            reader = csv.DictReader(table_csv)
-            rows = list(preprocess_rows(table, reader))
+        with porydex.db.profiler.timed(timings, 'read'):
+            table_csv = open_csv(table)
     except FileNotFoundError:
         print('      ! CSV not found: {}.csv'.format(table.name))
         return
 
-    if not rows:
-        # Passing an empty list for rows means something else, which borks
+    with table_csv:
+        headers, rows = read_rows(table, table_csv, timings)
+        insert_rows(table, connection, headers, rows, batch_size, timings)
+
+def read_rows(table, table_csv, timings=None):
+    """Read an open table CSV, and return a tuple of its column names and an
+    iterable of converted value tuples, in the order they should be inserted.
+
+    `timings` is passed along to `porydex.db.convert.read_csv`.
+    """
+
+    headers, rows = porydex.db.convert.read_csv(table, table_csv, timings)
+    return headers, insertion_order(table, headers, rows)
+
+def insert_rows(table, connection, headers, rows, batch_size, timings=None):
+    """Insert value tuples into a table `batch_size` at a time.
+
+    If `timings` is a `porydex.db.profiler.TableTimings`, the time spent
+    inserting, and the number of rows, are added to it.
+    """
+
+    empty = True
+
+    for batch in batches(rows, batch_size):
+        with porydex.db.profiler.timed(timings, 'insert'):
+            batch = [dict(zip(headers, row)) for row in batch]
+            connection.execute(table.insert(), batch)
+
+        empty = False
+
+        if timings is not None:
+            timings.rows += len(batch)
+
+    if empty:
+        # Passing an empty list for rows means something else, so there's
+        # nothing to insert
         print('      ! CSV empty: {}.csv'.format(table.name))
-        return
 
-    # pokemon has a self-referencing key — preevolution_id — so its rows have
-    # to be inserted in dependency order.  Instead of actually figuring it out,
-    # however, we can just use the order column.
-    # XXX Do this right someday
-    if table.name == 'pokemon':
-        rows.sort(key=lambda row: row['order'])
 
-    connection.execute(table.insert(), rows)
+### Parallel loading
+
+def load_parallel(connection, batch_size, jobs):
+    """Load every table, reading and converting the CSVs in `jobs` worker
+    processes.
+
+    All the CSVs are handed to the pool right away.  Inserts still go through
+    the one connection (and thus the one transaction) the load runs in, but
+    within each dependency level, tables are inserted in whatever order they
+    finish parsing, so that inserting one table overlaps with parsing the
+    rest.
+
+    Parsed tables are held in memory until they're inserted, so this trades
+    memory for wall-clock time.
+    """
+
+    tables = porydex.db.TableBase.metadata.sorted_tables
+    profiling = porydex.db.profiler.connection_profiler(connection) is not None
+
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        futures = {table: executor.submit(read_table, table.name, profiling)
+                   for table in tables}
+
+        for level in dependency_levels(tables):
+            pending = {futures[table]: table for table in level}
+
+            for future in concurrent.futures.as_completed(pending):
+                table = pending[future]
+                print('  - {}...'.format(table.name))
+
+                result = future.result()
+
+                if result is None:
+                    print('      ! CSV not found: {}.csv'.format(table.name))
+                    continue
+
+                headers, rows, read_timings = result
+                timings = porydex.db.profiler.table_timings(
+                    connection, table.name)
+
+                if timings is not None:
+                    timings.add(read_timings)
+
+                insert_rows(table, connection, headers, rows, batch_size,
+                            timings)
+
+def read_table(table_name, timed=False):
+    """Read and convert an entire table's CSV in a worker process.
+
+    Return a tuple of the column names, a list of value tuples, and (if
+    `timed`) the `porydex.db.profiler.TableTimings` for reading and
+    converting them, otherwise None.  Return None if there's no CSV.
+    """
+
+    table = porydex.db.TableBase.metadata.tables[table_name]
+    timings = porydex.db.profiler.TableTimings() if timed else None
+
+    try:
+        with porydex.db.profiler.timed(timings, 'read'):
+            table_csv = open_csv(table)
+    except FileNotFoundError:
+        return None
+
+    with table_csv:
+        headers, rows = read_rows(table, table_csv, timings)
+        return headers, list(rows), timings
+
+def dependency_levels(tables):
+    """Group tables into levels, such that each table only has foreign keys
+    to tables in earlier levels (or to itself).
+
+    `tables` should already be sorted in dependency order, e.g. by
+    `MetaData.sorted_tables`; each level keeps that order.
+    """
+
+    levels = []
+    done = set()
+    remaining = list(tables)
+
+    while remaining:
+        level = [
+            table for table in remaining
+            if all(key.column.table in done or key.column.table is table
+                   for key in table.foreign_keys)
+        ]
+
+        if not level:
+            raise ValueError('Circular foreign keys between tables: {}'
+                             .format(', '.join(t.name for t in remaining)))
+
+        levels.append(level)
+        done.update(level)
+        remaining = [table for table in remaining if table not in done]
+
+    return levels
+
+
+### SQLite bulk loading
+
+# Pragmas to relax while bulk loading.  If anything goes wrong we're going to
+# throw the whole database away anyway, so there's no need to spend time
+# keeping it crash-safe along the way.
+SQLITE_BULK_PRAGMAS = {
+    'journal_mode': 'MEMORY',
+    'synchronous': 'OFF',
+}
+
+def sqlite_bulk_load(connection, batch_size, jobs):
+    """Load an SQLite database as quickly as possible.
+
+    Tables are created without their indexes, which are then built all at
+    once after the data is in, rather than being updated on every insert.
+    The journal and fsync pragmas are relaxed for the duration, and the
+    database is analyzed at the end so the query planner has statistics to
+    work with.
+
+    Unique constraints can't be added to an existing table in SQLite, so
+    they're still created along with their tables; this way, the end result
+    is identical to a normal load.
 
-def preprocess_rows(table, reader):
-    """Yield from a CSV dict reader, and as we go, tweak certain values that
-    SQLA won't get right on its own.
+    This has to start outside a transaction (which it will be at the start of
+    a load, since pysqlite only begins a transaction before the first DML
+    statement), and the pragmas get put back once the transaction has been
+    committed.
     """
 
-    for row in reader:
-        for column_name, value in row.items():
-            column = table.c[column_name]
+    metadata = porydex.db.TableBase.metadata
+
+    old_pragmas = sqlite_set_pragmas(connection, SQLITE_BULK_PRAGMAS)
+    after_commit(
+        connection,
+        lambda connection: sqlite_set_pragmas(connection, old_pragmas)
+    )
+
+    print('Creating tables...')
+    with porydex.db.profiler.phase(connection, 'create tables'):
+        for table in metadata.sorted_tables:
+            connection.execute(sqla.schema.CreateTable(table))
+
+    load_tables(connection, batch_size, jobs)
+
+    print('Creating indexes...')
+    with porydex.db.profiler.phase(connection, 'create indexes'):
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection)
+
+    print('Analyzing...')
+    with porydex.db.profiler.phase(connection, 'analyze'):
+        connection.execute('ANALYZE')
+
+def sqlite_set_pragmas(connection, pragmas):
+    """Set some SQLite pragmas and return a dict of their old values.
+
+    The journal mode is left alone if the database is using WAL, since
+    switching out of WAL is permanent rather than per-connection.
+    """
+
+    old_pragmas = {}
+
+    for pragma, value in pragmas.items():
+        old_value = connection.execute('PRAGMA {}'.format(pragma)).scalar()
 
-            if value == '' and column.nullable:
-                row[column_name] = None
-            elif isinstance(column.type, sqla.types.Boolean):
-                if value == 'True':
-                    row[column_name] = True
-                elif value == 'False':
-                    row[column_name] = False
+        if pragma == 'journal_mode' and old_value.lower() == 'wal':
+            continue
 
-        yield row
+        connection.execute('PRAGMA {} = {}'.format(pragma, value))
+        old_pragmas[pragma] = old_value
+
+    return old_pragmas
+
+def sqlite_vacuum(connection):
+    """Rebuild an SQLite database to compact it."""
+
+    print('Vacuuming...')
+    with porydex.db.profiler.phase(connection, 'vacuum'):
+        connection.execute('VACUUM')
+
+
+### PostgreSQL COPY
+
+def postgresql_can_copy(connection):
+    """Return whether we can use PostgreSQL's COPY on this connection."""
+
+    return (connection.dialect.name == 'postgresql' and
+            connection.dialect.driver == 'psycopg2')
+
+def postgresql_copy_load_table(table, connection):
+    """Load data into an empty table from a CSV with COPY ... FROM STDIN.
+
+    This does the same normalization as `porydex.db.convert`: empty values
+    are only treated as null for nullable columns, and PostgreSQL already
+    understands True and False and enum members' names.  Non-deferrable
+    foreign keys are checked at the end of each statement, so pokemon's
+    self-reference doesn't need its rows in any particular order.
+
+    Return the number of rows loaded.
+    """
+
+    preparer = connection.dialect.identifier_preparer
+
+    try:
+        table_csv = open_csv(table)
+    except FileNotFoundError:
+        print('      ! CSV not found: {}.csv'.format(table.name))
+        return 0
+
+    with table_csv:
+        headers = next(csv.reader([table_csv.readline()]), [])
+        not_null = [name for name in headers if not table.c[name].nullable]
+
+        options = ['FORMAT csv']
+        if not_null:
+            options.append('FORCE_NOT_NULL ({})'.format(
+                ', '.join(preparer.quote(name) for name in not_null)))
+
+        copy = 'COPY {table} ({columns}) FROM STDIN WITH ({options})'.format(
+            table=preparer.format_table(table),
+            columns=', '.join(preparer.quote(name) for name in headers),
+            options=', '.join(options)
+        )
+
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(copy, table_csv)
+
+    if cursor.rowcount == 0:
+        print('      ! CSV empty: {}.csv'.format(table.name))
+
+    return cursor.rowcount
+
+def postgresql_copy_dump_table(table, connection, table_csv):
+    """Dump a table into an open CSV with COPY ... TO STDOUT.
+
+    Booleans are spelled out as True and False, like `write_table` would.
+    """
+
+    columns = []
+
+    for column in table.columns:
+        if isinstance(column.type, sqla.types.Boolean):
+            column = sqla.case(
+                [(column.is_(sqla.true()), 'True'),
+                 (column.is_(sqla.false()), 'False')]
+            ).label(column.name)
+
+        columns.append(column)
+
+    query = (sqla.select(columns)
+             .select_from(table)
+             .order_by(*table.primary_key.columns))
+    query = query.compile(
+        dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+
+    copy = 'COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)'.format(query)
+
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(copy, table_csv)
 
 
 ### "reload" command
 
-def reload(connection):
+def reload(connection, validate_first=True, **load_args):
     """Tear down and recreate the database."""
 
+    # Before dropping anything, so that bad CSVs leave the database alone
+    if validate_first:
+        validate(connection, load_args.get('jobs', 1))
+
     print('Dropping tables...')
     porydex.db.TableBase.metadata.drop_all(connection)
+    porydex.db.core.sync_metadata.drop_all(connection)
+
+    load(connection, validate_first=False, **load_args)
+
+
+### "validate" command
+
+def validate(connection, jobs=None):
+    """Check the CSVs against the schema's constraints, without touching the
+    database, and print every violation; see `porydex.db.validate`.
+
+    Raise `porydex.db.validate.ValidationError` if there are any.
+    """
+
+    print('Validating CSVs...')
+    with porydex.db.profiler.phase(connection, 'validate'):
+        violations = porydex.db.validate.validate_csvs(jobs)
+
+    for violation in violations:
+        print('  ! {}'.format(violation))
+
+    if violations:
+        raise porydex.db.validate.ValidationError(violations)
+
+
+### "sync" command
+
+def sync(connection):
+    """Apply changes in the CSVs to the database, touching only the rows that
+    actually changed.
+
+    Tables whose CSVs haven't changed since they were last loaded or synced
+    are skipped entirely.  Every changed table is compared first; then
+    deletes are applied in reverse dependency order, and then inserts and
+    updates in dependency order.  Deleting first means a row can be replaced
+    by one with a different key but the same unique values (e.g. a type
+    chart renumbered from 3 to 4).
+
+    In between, rows that are only updated to refer to the replacement still
+    refer to the deleted row.  SQLite doesn't check foreign keys by default,
+    but PostgreSQL refuses the delete, so there a renumbering has to be done
+    with reload instead.
+    """
+
+    tables = porydex.db.TableBase.metadata.sorted_tables
+
+    csv_hashes = porydex.db.core.csv_hashes
+    porydex.db.core.sync_metadata.create_all(connection)
+    old_hashes = {row.table_name: row.sha256
+                  for row in connection.execute(csv_hashes.select())}
+
+    print('Syncing tables...')
+    diffs = []
+
+    for table in tables:
+        if csv_hash(table) in (None, old_hashes.get(table.name)):
+            continue
+
+        print('  - {}...'.format(table.name))
+        inserts, updates, deletes = diff_table(table, connection)
+        print('      {} inserted, {} updated, {} deleted'.format(
+            len(inserts), len(updates), len(deletes)))
+
+        diffs.append((table, inserts, updates, deletes))
+
+    for table, inserts, updates, deletes in reversed(diffs):
+        if deletes:
+            connection.execute(
+                keyed_statement(table, table.delete()), deletes)
+
+    for table, inserts, updates, deletes in diffs:
+        if inserts:
+            connection.execute(table.insert(), inserts)
+
+        if updates:
+            connection.execute(keyed_statement(table, table.update()), updates)
+
+    changed_tables = [table for table, *diff in diffs]
+    record_csv_hashes(connection, changed_tables)
+
+    if changed_tables:
+        after_commit(connection, invalidate_caches)
+
+def diff_table(table, connection):
+    """Compare a table's CSV to its contents in the database.
+
+    Return a tuple of lists of rows to insert, rows to update, and rows to
+    delete, as dicts.  Rows to insert are converted just like in
+    `load_table`; rows to update are the same, plus the primary key as it
+    appears in the database under the `keyed_statement` parameter names; and
+    rows to delete just have the latter.
+    """
 
-    load(connection)
+    with open_csv(table) as table_csv:
+        path = table_csv.name
+        reader = csv.reader(table_csv)
+        headers = tuple(next(reader))
+
+        key_indices = [headers.index(column.name)
+                       for column in table.primary_key.columns]
+        get_key = operator.itemgetter(*key_indices)
+
+        # Rows are kept as strings for comparison's sake, along with their
+        # line numbers in case they turn out not to convert
+        csv_rows = {get_key(row): (reader.line_num, row) for row in reader}
+
+    columns = [table.c[name] for name in headers]
+    key_names = ['key_' + column.name for column in table.primary_key.columns]
+
+    updates = []
+    deletes = []
+
+    for db_row in connection.execute(sqla.select(columns)):
+        text_row = [csv_text(value) for value in db_row]
+        line, csv_row = csv_rows.pop(get_key(text_row), (None, None))
+
+        if csv_row is None:
+            deletes.append(db_row)
+        elif csv_row != text_row:
+            updates.append((db_row, line, csv_row))
+
+    convert = porydex.db.convert.compile_converter(table, headers)
+
+    def convert_row(line, row):
+        try:
+            return convert(row)
+        except ValueError:
+            raise porydex.db.convert.conversion_error(
+                table, headers, row, path, line)
+
+    def db_key(db_row):
+        return {name: db_row[index]
+                for name, index in zip(key_names, key_indices)}
+
+    inserts = [convert_row(line, row) for line, row in csv_rows.values()]
+    inserts = [dict(zip(headers, row))
+               for row in insertion_order(table, headers, inserts)]
+    updates = [dict(zip(headers, convert_row(line, row)), **db_key(db_row))
+               for db_row, line, row in updates]
+    deletes = [db_key(db_row) for db_row in deletes]
+
+    return inserts, updates, deletes
+
+def keyed_statement(table, statement):
+    """Add a WHERE clause to an UPDATE or DELETE, matching the primary key to
+    parameters named key_<column name>.
+    """
+
+    return statement.where(sqla.and_(*(
+        column == sqla.bindparam('key_' + column.name)
+        for column in table.primary_key.columns
+    )))
+
+def record_csv_hashes(connection, tables):
+    """Record the current CSV hashes for some tables, so that sync knows
+    they're up to date.
+    """
+
+    hashes = [{'table_name': table.name, 'sha256': csv_hash(table)}
+              for table in tables]
+    hashes = [row for row in hashes if row['sha256'] is not None]
+    csv_hashes = porydex.db.core.csv_hashes
+
+    connection.execute(csv_hashes.delete().where(
+        csv_hashes.c.table_name.in_([table.name for table in tables])))
+
+    if hashes:
+        connection.execute(csv_hashes.insert(), hashes)
+
+def forget_csv_hashes(connection, tables):
+    """Forget the recorded CSV hashes for some tables whose contents were
+    changed by something other than the CSVs, so that sync checks them again.
+    """
+
+    csv_hashes = porydex.db.core.csv_hashes
+
+    if connection.dialect.has_table(connection, csv_hashes.name):
+        connection.execute(csv_hashes.delete().where(
+            csv_hashes.c.table_name.in_([table.name for table in tables])))
+
+
+### "build" command
+
+def build(connection, jobs=1):
+    """Build a compacted, fully-indexed SQLite database from the CSVs, unless
+    it's already up to date with them.
+    """
+
+    if (connection.dialect.name != 'sqlite' or
+            porydex.db.core.is_sqlite_memory_uri(connection.engine.url)):
+        raise ValueError('Can only build an SQLite database file')
+
+    build_sqlite(connection.engine.url.database, jobs=jobs)
+
+def build_sqlite(path, jobs=1, validate_first=True):
+    """Build an SQLite database file from the CSVs, unless it's already up to
+    date with them.  Return whether it was built.
+
+    `jobs` and `validate_first` are passed along to `load`.
+
+    The database is built under a temporary name and then moved into place,
+    so anything else using the old file can carry on, and anything opening
+    the new one never sees it half-built.
+    """
+
+    if os.path.exists(path) and sqlite_data_hash(path) == data_hash():
+        print('Already up to date: {}'.format(path))
+        return False
+
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix='.sqlite.tmp')
+    os.close(fd)
+
+    engine = sqla.create_engine('sqlite:///{}'.format(temp_path))
+
+    try:
+        with engine.connect() as connection:
+            with connection.begin():
+                load(connection, jobs=jobs, bulk=True, vacuum=True,
+                     validate_first=validate_first)
+
+            run_after_commit(connection)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    finally:
+        engine.dispose()
+
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+    return True
+
+def sqlite_data_hash(path):
+    """Return the hash of all the CSVs that an SQLite database file was last
+    loaded or synced from, or None if it doesn't know.
+    """
+
+    connection = sqlite3.connect(
+        '{}?mode=ro'.format(porydex.db.core.sqlite_file_uri(path)), uri=True)
+
+    try:
+        return combine_hashes(connection.execute(
+            'SELECT table_name, sha256 FROM porydex_csv_hashes'))
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        connection.close()
+
+### "snapshot" and "load-snapshot" commands
+
+def snapshot(connection, path):
+    """Write a columnar snapshot of the big per-game tables to a file."""
+
+    print('Writing snapshot...')
+    porydex.db.columnar.write_snapshot(connection, path)
+
+def load_snapshot(connection, path, batch_size=DEFAULT_BATCH_SIZE):
+    """Replace the contents of the tables in a columnar snapshot with the
+    snapshot's rows.
+    """
+
+    metadata = porydex.db.TableBase.metadata
+
+    with porydex.db.columnar.Snapshot(path) as snapshot:
+        tables = [table for table in metadata.sorted_tables
+                  if table.name in snapshot.tables]
+
+        print('Clearing tables...')
+        for table in reversed(tables):
+            connection.execute(table.delete())
+
+        print('Loading tables...')
+        for table in tables:
+            print('  - {}...'.format(table.name))
+            snapshot_table = snapshot[table.name]
+            insert_rows(table, connection, snapshot_table.column_names,
+                        snapshot_table.rows(), batch_size)
+
+    forget_csv_hashes(connection, tables)
+    after_commit(connection, invalidate_caches)
+
+
+### "compact-movelists" command
+
+def compact_movelists(connection):
+    """Merge move lists with identical contents, pointing every map row at
+    one canonical copy, and delete the rest.
+
+    Lists with no moves are left alone: they're placeholders for moves that
+    haven't been filled in yet, not actual duplicates.  Run dump afterwards
+    to write the compacted lists back to the CSVs.
+    """
+
+    metadata = porydex.db.TableBase.metadata
+    move_lists = metadata.tables['pokemon_move_lists']
+    pokemon_moves = metadata.tables['pokemon_moves']
+    list_map = metadata.tables['pokemon_move_list_map']
+
+    # A list's contents are its moves minus the ids and the list id, sorted,
+    # so that the same moves in a different row order still match
+    content_columns = [column for column in pokemon_moves.columns
+                       if column.name not in ('id', 'pokemon_move_list_id')]
+    contents = {}
+    move_rows = {}
+
+    print('Reading move lists...')
+    for row in connection.execute(
+        pokemon_moves.select().order_by(pokemon_moves.c.pokemon_move_list_id)
+    ):
+        list_id = row[pokemon_moves.c.pokemon_move_list_id]
+        contents.setdefault(list_id, []).append(tuple(
+            csv_text(row[column]) for column in content_columns))
+        move_rows.setdefault(list_id, []).append(row)
+
+    canonical_lists = {}
+    replacements = {}
+
+    for list_id in sorted(contents):
+        content = tuple(sorted(contents[list_id]))
+        canonical_id = canonical_lists.setdefault(content, list_id)
+
+        if canonical_id != list_id:
+            replacements[list_id] = canonical_id
+
+    if not replacements:
+        print('No duplicate move lists.')
+        return
+
+    print('Merging {} duplicate move lists...'.format(len(replacements)))
+    connection.execute(
+        list_map.update()
+        .where(list_map.c.pokemon_move_list_id == sqla.bindparam('old_id'))
+        .values(pokemon_move_list_id=sqla.bindparam('new_id')),
+        [{'old_id': old_id, 'new_id': new_id}
+         for old_id, new_id in replacements.items()]
+    )
+
+    removed_ids = sorted(replacements)
+    removed_moves = [row for list_id in removed_ids
+                     for row in move_rows[list_id]]
+
+    for batch in batches(removed_ids, DEFAULT_BATCH_SIZE):
+        connection.execute(pokemon_moves.delete().where(
+            pokemon_moves.c.pokemon_move_list_id.in_(batch)))
+        connection.execute(move_lists.delete().where(
+            move_lists.c.id.in_(batch)))
+
+    forget_csv_hashes(connection, [move_lists, pokemon_moves, list_map])
+    after_commit(connection, invalidate_caches)
+
+    saved_bytes = (csv_size([(list_id,) for list_id in removed_ids]) +
+                   csv_size(removed_moves))
+
+    print('Removed {} pokemon_move_lists rows and {} pokemon_moves rows, '
+          'saving {} bytes of CSV.'.format(
+              len(removed_ids), len(removed_moves), saved_bytes))
+
+def csv_size(rows):
+    """Return how many bytes some database rows take up in a CSV."""
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    for row in rows:
+        writer.writerow([csv_text(value) for value in row])
+
+    return len(buffer.getvalue().encode('UTF-8'))
+
+
+### "pack" and "unpack" commands
+
+def pack(connection, tables=()):
+    """Convert tables' plain CSVs into ranged CSVs (by default, the ones in
+    `porydex.db.ranged.RANGED_TABLES`).
+
+    This only touches the CSVs, not the database.  Ranged CSVs are much
+    smaller, but slower to load; see `porydex.db.ranged`.
+    """
+
+    game_ids = csv_game_ids()
+
+    print('Packing CSVs...')
+    for table in ranged_tables(tables):
+        print('  - {}...'.format(table.name))
+
+        if stored_csv_path(table) != csv_path(table):
+            print('      Already packed')
+            continue
+
+        with open(csv_path(table), encoding='UTF-8', newline='') as plain_csv:
+            write_csv_atomically(
+                ranged_csv_path(table),
+                lambda ranged_csv: porydex.db.ranged.pack_csv(
+                    table, plain_csv, ranged_csv, game_ids),
+                mode_from=csv_path(table)
+            )
+
+        os.remove(csv_path(table))
+
+def unpack(connection, tables=()):
+    """Convert tables' ranged CSVs back into plain CSVs (by default, the
+    ones in `porydex.db.ranged.RANGED_TABLES`).
+
+    This only touches the CSVs, not the database.
+    """
+
+    print('Unpacking CSVs...')
+    for table in ranged_tables(tables):
+        print('  - {}...'.format(table.name))
+
+        if stored_csv_path(table) == csv_path(table):
+            print('      Not packed')
+            continue
+
+        with open_csv(table) as plain_csv:
+            write_csv_atomically(
+                csv_path(table),
+                lambda table_csv: shutil.copyfileobj(plain_csv, table_csv),
+                mode_from=ranged_csv_path(table)
+            )
+
+        os.remove(ranged_csv_path(table))
+
+def ranged_tables(table_names):
+    """Return the tables with the given names, or the default ranged tables
+    if there are none, checking that they all have a game_id to range over.
+    """
+
+    tables = porydex.db.TableBase.metadata.tables
+
+    if not table_names:
+        table_names = porydex.db.ranged.RANGED_TABLES
+
+    for table_name in table_names:
+        if table_name not in tables:
+            raise ValueError('No such table: {}'.format(table_name))
+        elif 'game_id' not in tables[table_name].primary_key.columns:
+            raise ValueError("Can't pack {}, as it isn't per-game".format(
+                table_name))
+
+    return [tables[table_name] for table_name in table_names]
+
+def write_csv_atomically(path, write, mode_from):
+    """Call `write` with an open temporary file, then move it to `path`,
+    with the same permissions as the file at `mode_from`.
+    """
+
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix='.', suffix='.csv.tmp')
+
+    try:
+        with open(fd, 'w', encoding='UTF-8', newline='') as temp_csv:
+            write(temp_csv)
+
+        shutil.copymode(mode_from, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
 
 
 ### "dump" command
 
-def dump(connection):
-    """Update the CSVs from the contents of the database."""
+def dump(connection, jobs=1):
+    """Update the CSVs from the contents of the database.
+
+    CSVs are only replaced if their contents actually changed.  With `jobs`,
+    tables are dumped in that many worker processes, each with its own
+    connection.
+    """
+
+    tables = list(porydex.db.TableBase.metadata.tables.values())
+    changed_tables = []
 
     print('Dumping tables...')
-    for table in porydex.db.TableBase.metadata.tables.values():
-        print('  - {}...'.format(table.name))
-        dump_table(table, connection)
+    url = connection.engine.url
+
+    if jobs > 1 and not porydex.db.core.is_sqlite_memory_uri(url):
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            futures = {
+                executor.submit(
+                    dump_table_separately, connection.engine.url, table.name
+                ): table
+                for table in tables
+            }
+
+            for future in concurrent.futures.as_completed(futures):
+                table = futures[future]
+                print('  - {}...'.format(table.name))
+
+                if future.result():
+                    changed_tables.append(table)
+    else:
+        for table in tables:
+            print('  - {}...'.format(table.name))
+
+            if dump_table(table, connection):
+                changed_tables.append(table)
+
+    if changed_tables:
+        print('Changed: {}'.format(
+            ', '.join(sorted(table.name for table in changed_tables))))
+    else:
+        print('No tables changed.')
 
 def dump_table(table, connection):
-    """Dump a table into a CSV."""
+    """Dump a table into a CSV.
+
+    The table is written to a temporary file first, and only replaces the
+    existing CSV if they differ, so unchanged CSVs keep their modification
+    times.  Return whether the CSV changed.
+    """
+
+    path = stored_csv_path(table)
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix='.{}.'.format(table.name),
+        suffix='.csv.tmp')
+
+    try:
+        with open(fd, 'w', encoding='UTF-8', newline='') as temp_csv:
+            if path == csv_path(table):
+                dump_plain_table(table, connection, temp_csv)
+            else:
+                # Ranged CSVs get packed back up
+                plain_csv = io.StringIO(newline='')
+                dump_plain_table(table, connection, plain_csv)
+                plain_csv.seek(0)
+                porydex.db.ranged.pack_csv(
+                    table, plain_csv, temp_csv, csv_game_ids())
+
+        if file_hash(temp_path) == csv_hash(table):
+            os.remove(temp_path)
+            return False
+
+        # mkstemp makes files only readable by their owner
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+
+        os.replace(temp_path, path)
+        return True
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def dump_plain_table(table, connection, table_csv):
+    """Dump a table into an open plain CSV, with COPY where possible."""
+
+    if postgresql_can_copy(connection):
+        postgresql_copy_dump_table(table, connection, table_csv)
+    else:
+        write_table(table, connection, table_csv)
+
+def write_table(table, connection, table_csv):
+    """Write a table's contents to an open CSV.
+
+    Rows are streamed from the database — with a server-side cursor, where
+    the backend has them — rather than all being fetched at once.
+    """
 
     headers = [column.name for column in table.columns]
     primary_key = table.primary_key.columns
-    rows = connection.execute(table.select().order_by(*primary_key))
+    rows = (connection.execution_options(stream_results=True)
+            .execute(table.select().order_by(*primary_key)))
 
-    csv_path = 'db/data/{}.csv'.format(table.name)
-    csv_path = pkg_resources.resource_filename('porydex', csv_path)
+    writer = csv.writer(table_csv, lineterminator='\n')
+    writer.writerow(headers)
 
-    with open(csv_path, 'w', encoding='UTF-8', newline='') as table_csv:
-        writer = csv.writer(table_csv, lineterminator='\n')
-        writer.writerow(headers)
-        writer.writerows(rows)
+    while True:
+        batch = rows.fetchmany(DEFAULT_BATCH_SIZE)
 
+        if not batch:
+            break
+
+        writer.writerows(batch)
+
+def dump_table_separately(url, table_name):
+    """Dump a table over a new connection, in a worker process.
+
+    Return whether the CSV changed.
+    """
+
+    engine = sqla.create_engine(url)
+    table = porydex.db.TableBase.metadata.tables[table_name]
+
+    try:
+        with engine.connect() as connection:
+            return dump_table(table, connection)
+    finally:
+        engine.dispose()
 
 ### main method stuff
 
+def positive_int(value):
+    """Convert a command-line argument into an int of at least 1."""
+
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'invalid int value: {!r}'.format(value))
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            'must be at least 1, not {}'.format(number))
+
+    return number
+
+def add_load_arguments(parser):
+    """Add the arguments shared by the load and reload commands."""
+
+    parser.add_argument(
+        '-b', '--batch-size', type=positive_int, default=DEFAULT_BATCH_SIZE,
+        help='The number of rows to insert at a time (default {}).'
+             .format(DEFAULT_BATCH_SIZE))
+    parser.add_argument(
+        '-j', '--jobs', type=positive_int, default=1,
+        help='The number of processes to parse CSVs with (default 1); rows '
+             'are still inserted through one connection, and PostgreSQL, '
+             'which parses CSVs itself with COPY, ignores this.')
+    parser.add_argument(
+        '--bulk', action='store_true',
+        help='SQLite only: defer indexes and relax durability while loading.')
+    parser.add_argument(
+        '--vacuum', action='store_true',
+        help='SQLite only: compact the database afterwards.')
+    parser.add_argument(
+        '--no-validate', dest='validate_first', action='store_false',
+        help="Don't check the CSVs before loading.")
+
 def make_parser():
     """Create and return a parser for command-line arguments."""
 
@@ -116,6 +1114,12 @@ def make_parser():
     parser.add_argument(
         '-s', '--sql', action='store_true',
         help='Echo all SQL queries executed.')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Print timings for the command and its SQL afterwards.')
+    parser.add_argument(
+        '--profile-json', metavar='PATH',
+        help='Write the timings to a JSON file (implies --profile).')
     parser.add_argument(
         'database', help='An SQLA URI for the porydex database.')
     subparsers = parser.add_subparsers(title='commands')
@@ -124,16 +1128,87 @@ def make_parser():
     load_parser = subparsers.add_parser(
         'load', help='Create the database from scratch.')
     load_parser.set_defaults(func=load)
+    add_load_arguments(load_parser)
 
     # reload command
     reload_parser = subparsers.add_parser(
         'reload', help='Tear down and recreate the database.')
     reload_parser.set_defaults(func=reload)
+    add_load_arguments(reload_parser)
+
+    # sync command
+    sync_parser = subparsers.add_parser(
+        'sync', help='Apply only the rows that changed in the CSVs.')
+    sync_parser.set_defaults(func=sync)
+
+    # validate command
+    validate_parser = subparsers.add_parser(
+        'validate',
+        help="Check the CSVs against the schema's constraints.")
+    validate_parser.set_defaults(func=validate)
+    validate_parser.add_argument(
+        '-j', '--jobs', type=positive_int,
+        help='The number of processes to check CSVs with (default: one per '
+             'CPU).')
+
+    # build command
+    build_parser = subparsers.add_parser(
+        'build',
+        help='Build a compacted SQLite database, if the CSVs have changed.')
+    build_parser.set_defaults(func=build)
+    build_parser.add_argument(
+        '-j', '--jobs', type=positive_int, default=1,
+        help='The number of processes to parse CSVs with (default 1).')
+
+    # snapshot commands
+    snapshot_parser = subparsers.add_parser(
+        'snapshot',
+        help='Write a columnar snapshot of the big per-game tables.')
+    snapshot_parser.set_defaults(func=snapshot)
+    snapshot_parser.add_argument('path', help='The snapshot file to write.')
+
+    load_snapshot_parser = subparsers.add_parser(
+        'load-snapshot',
+        help="Replace the big per-game tables' contents from a snapshot.")
+    load_snapshot_parser.set_defaults(func=load_snapshot)
+    load_snapshot_parser.add_argument(
+        'path', help='The snapshot file to read.')
+    load_snapshot_parser.add_argument(
+        '-b', '--batch-size', type=positive_int, default=DEFAULT_BATCH_SIZE,
+        help='The number of rows to insert at a time (default {}).'
+             .format(DEFAULT_BATCH_SIZE))
+
+    # compact-movelists command
+    compact_parser = subparsers.add_parser(
+        'compact-movelists', help='Merge move lists with identical contents.')
+    compact_parser.set_defaults(func=compact_movelists)
+
+    # pack commands
+    pack_parser = subparsers.add_parser(
+        'pack',
+        help='Store per-game CSVs as ranges of games (smaller, but slower '
+             'to load).')
+    pack_parser.set_defaults(func=pack)
+    pack_parser.add_argument(
+        'tables', nargs='*',
+        help='The tables to pack (default: {}).'.format(
+            ', '.join(porydex.db.ranged.RANGED_TABLES)))
+
+    unpack_parser = subparsers.add_parser(
+        'unpack', help='Store ranged CSVs as plain per-game CSVs again.')
+    unpack_parser.set_defaults(func=unpack)
+    unpack_parser.add_argument(
+        'tables', nargs='*',
+        help='The tables to unpack (default: {}).'.format(
+            ', '.join(porydex.db.ranged.RANGED_TABLES)))
 
     # dump command
     dump_parser = subparsers.add_parser(
         'dump', help='Update the data CSVs from the contents of the database.')
     dump_parser.set_defaults(func=dump)
+    dump_parser.add_argument(
+        '-j', '--jobs', type=positive_int, default=1,
+        help='The number of processes to dump tables with (default 1).')
 
     return parser
 
@@ -141,8 +1216,43 @@ def main(argv=None):
     """Parse arguments and run the appropriate command."""
 
     parser = make_parser()
-    args = parser.parse_args(argv)
-    engine = sqla.create_engine(args.database, echo=args.sql)
+    args = vars(parser.parse_args(argv))
+
+    # Everything left over after popping the global arguments is specific to
+    # the command, and gets passed along to it
+    database = args.pop('database')
+    echo = args.pop('sql')
+    profile_json = args.pop('profile_json')
+    profile = args.pop('profile') or profile_json is not None
+
+    try:
+        func = args.pop('func')
+    except KeyError:
+        parser.error('a command is required')
+
+    engine = sqla.create_engine(database, echo=echo)
+    profiler = None
+
+    if profile:
+        profiler = porydex.db.profiler.Profiler()
+        profiler.attach(engine)
+
+    try:
+        with engine.connect() as connection:
+            if profiler is not None:
+                connection.info[porydex.db.profiler.INFO_KEY] = profiler
+
+            with connection.begin():
+                func(connection, **args)
+
+            run_after_commit(connection)
+    except porydex.db.validate.ValidationError as error:
+        # The violations have already been printed
+        parser.exit(1, '{}\n'.format(error))
+
+    if profiler is not None:
+        profiler.detach()
+        print(profiler.summary())
 
-    with engine.begin() as connection:
-        args.func(connection)
+        if profile_json is not None:
+            profiler.write_json(profile_json)
@@ -0,0 +1,269 @@
+"""A memory-mappable columnar snapshot format for the big per-game tables.
+
+pokemon_stats, pokemon_types, pokemon_abilities, pokemon_egg_groups, and
+pokemon_move_list_map are all narrow tables of integers (and the odd enum),
+and between them they make up most of the data.  A snapshot stores each of
+their columns as a fixed-width array of integers, so that a reader can mmap
+the file and use the columns directly, without parsing anything or touching
+the database.  Since the file is mapped read-only, any number of processes
+can share one copy of it through the page cache.
+
+The file layout is:
+
+- the magic bytes PORYCOL1;
+- the length of the directory, as a little-endian 64-bit integer;
+- the directory: UTF-8 JSON describing every table and column;
+- padding up to a multiple of eight bytes;
+- the column data, each array starting on a multiple of eight bytes.
+
+Each column is stored with the smallest signed integer type its values fit
+in, as an `array` typecode.  Enum columns are stored as each member's
+position in the enum, and the member names are listed in the directory.
+Nullable columns have a separate array of bytes, 1 where the value is null
+(and 0 stored in the column itself).  Arrays are in the writing machine's
+byte order, which is recorded in the directory.
+"""
+
+import array
+import json
+import mmap
+import struct
+import sys
+
+import sqlalchemy as sa
+
+import porydex.db
+
+
+MAGIC = b'PORYCOL1'
+ALIGNMENT = 8
+
+SNAPSHOT_TABLES = (
+    'pokemon_stats',
+    'pokemon_types',
+    'pokemon_abilities',
+    'pokemon_egg_groups',
+    'pokemon_move_list_map',
+)
+
+
+### Writing
+
+def write_snapshot(connection, path, table_names=SNAPSHOT_TABLES):
+    """Write a snapshot of some tables from the database to a file."""
+
+    directory = {'byteorder': sys.byteorder, 'tables': {}}
+    arrays = []
+    offset = 0
+
+    for table_name in table_names:
+        table = porydex.db.TableBase.metadata.tables[table_name]
+        rows = connection.execute(
+            table.select().order_by(*table.primary_key.columns)).fetchall()
+
+        table_entry = directory['tables'][table_name] = {
+            'length': len(rows), 'columns': []}
+
+        for index, column in enumerate(table.columns):
+            enum_class = column_enum_class(column)
+            values = [row[index] for row in rows]
+            nulls = None
+
+            if column.nullable:
+                nulls = array.array('B', (value is None for value in values))
+
+            if enum_class is not None:
+                codes = {member: code
+                         for code, member in enumerate(enum_class)}
+                values = [codes.get(value, 0) for value in values]
+            elif nulls is not None:
+                values = [0 if value is None else value for value in values]
+
+            values = array.array(smallest_typecode(values), values)
+
+            column_entry = {
+                'name': column.name,
+                'typecode': values.typecode,
+                'offset': offset,
+                'nulls': None,
+                'enum': None if enum_class is None else
+                        [member.name for member in enum_class],
+            }
+
+            arrays.append(values)
+            offset = aligned(offset + len(values) * values.itemsize)
+
+            if nulls is not None:
+                column_entry['nulls'] = offset
+                arrays.append(nulls)
+                offset = aligned(offset + len(nulls))
+
+            table_entry['columns'].append(column_entry)
+
+    header = json.dumps(directory).encode('UTF-8')
+
+    with open(path, 'wb') as snapshot:
+        snapshot.write(MAGIC)
+        snapshot.write(struct.pack('<Q', len(header)))
+        snapshot.write(header)
+        pad(snapshot)
+
+        for column_array in arrays:
+            column_array.tofile(snapshot)
+            pad(snapshot)
+
+def column_enum_class(column):
+    """Return a column's enum class, or None if it isn't an enum column.
+
+    Raise ValueError if the column can't go in a snapshot at all.
+    """
+
+    if isinstance(column.type, sa.types.Enum) and column.type.enum_class:
+        return column.type.enum_class
+    elif isinstance(column.type, sa.types.Integer):
+        return None
+    else:
+        raise ValueError("Can't snapshot column {}.{} of type {}".format(
+            column.table.name, column.name, column.type))
+
+def smallest_typecode(values):
+    """Return the smallest signed array typecode all the values fit in."""
+
+    low = min(values, default=0)
+    high = max(values, default=0)
+
+    for typecode in 'bhilq':
+        bits = array.array(typecode).itemsize * 8
+
+        if -2 ** (bits - 1) <= low and high < 2 ** (bits - 1):
+            return typecode
+
+    raise ValueError('Values too big to snapshot')
+
+def aligned(offset):
+    """Round an offset up to the next multiple of ALIGNMENT."""
+
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def pad(file):
+    """Pad an open file with zeroes up to the next multiple of ALIGNMENT."""
+
+    file.write(bytes(aligned(file.tell()) - file.tell()))
+
+
+### Reading
+
+class Snapshot:
+    """A read-only, memory-mapped snapshot file.
+
+    Index it by table name to get a `SnapshotTable`.  The columns are views
+    into the mapped file, so they're only valid until the snapshot is closed.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot:
+            self._mmap = mmap.mmap(
+                snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(self._mmap)
+
+        if view[:len(MAGIC)] != MAGIC:
+            view.release()
+            self._mmap.close()
+            raise ValueError('{} is not a porydex snapshot'.format(path))
+
+        start = len(MAGIC) + 8
+        (header_length,) = struct.unpack('<Q', view[len(MAGIC):start])
+        directory = json.loads(
+            bytes(view[start:start + header_length]).decode('UTF-8'))
+
+        if directory['byteorder'] != sys.byteorder:
+            view.release()
+            self._mmap.close()
+            raise ValueError('{} was written on a {}-endian machine'.format(
+                path, directory['byteorder']))
+
+        data = view[aligned(start + header_length):]
+        self._views = [view, data]
+        self.tables = {
+            name: SnapshotTable(name, entry, data, self._views)
+            for name, entry in directory['tables'].items()
+        }
+
+    def __getitem__(self, table_name):
+        return self.tables[table_name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release all the column views and unmap the file."""
+
+        for view in reversed(self._views):
+            view.release()
+
+        self._mmap.close()
+
+
+class SnapshotTable:
+    """One table in a snapshot.
+
+    `columns` maps column names to memoryviews of raw integers (enum codes,
+    for enum columns), and `nulls` maps nullable columns' names to
+    memoryviews of bytes that are 1 where the value is null.  `rows` and
+    `value` give decoded values instead.
+    """
+
+    def __init__(self, name, entry, data, views):
+        table = porydex.db.TableBase.metadata.tables[name]
+
+        self.name = name
+        self.length = entry['length']
+        self.column_names = [column['name'] for column in entry['columns']]
+        self.columns = {}
+        self.nulls = {}
+        self.enums = {}
+
+        for column in entry['columns']:
+            itemsize = array.array(column['typecode']).itemsize
+            offset = column['offset']
+            view = data[offset:offset + self.length * itemsize]
+            self.columns[column['name']] = view.cast(column['typecode'])
+            views.extend((view, self.columns[column['name']]))
+
+            if column['nulls'] is not None:
+                offset = column['nulls']
+                view = data[offset:offset + self.length]
+                self.nulls[column['name']] = view
+                views.append(view)
+
+            if column['enum'] is not None:
+                enum_class = table.c[column['name']].type.enum_class
+                self.enums[column['name']] = [
+                    enum_class[member] for member in column['enum']]
+
+    def __len__(self):
+        return self.length
+
+    def value(self, column_name, index):
+        """Return the decoded value of one column in one row."""
+
+        nulls = self.nulls.get(column_name)
+
+        if nulls is not None and nulls[index]:
+            return None
+
+        value = self.columns[column_name][index]
+        members = self.enums.get(column_name)
+
+        return value if members is None else members[value]
+
+    def rows(self):
+        """Yield every row as a tuple of decoded values."""
+
+        for index in range(self.length):
+            yield tuple(self.value(column_name, index)
+                        for column_name in self.column_names)
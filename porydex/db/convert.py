@@ -0,0 +1,186 @@
+"""Conversion of CSV values into the Python values that go in the database.
+
+Rather than looking up each column and checking its type for every cell, a
+converter is compiled once per table: a list of conversion functions, one per
+CSV column in order, which is then applied to plain tuple rows.
+"""
+
+import csv
+import decimal
+import time
+
+import sqlalchemy as sa
+
+
+class ConversionError(ValueError):
+    """A value in a CSV that can't be converted for its column."""
+
+    def __init__(self, path, line, message):
+        # Passing everything along keeps this picklable, for worker processes
+        super().__init__(path, line, message)
+
+        self.path = path
+        self.line = line
+        self.message = message
+
+    def __str__(self):
+        return '{}, line {}: {}'.format(self.path, self.line, self.message)
+
+
+def read_csv(table, table_csv, timings=None):
+    """Read an open CSV for a table.
+
+    Return a tuple of the column names, in the order they appear in the CSV,
+    and an iterator over tuples of converted values.  A `ConversionError` is
+    raised for the first value that can't be converted.
+
+    If `timings` is a `porydex.db.profiler.TableTimings`, the time spent
+    reading and converting rows is added to it as they're iterated over.
+    """
+
+    path = getattr(table_csv, 'name', '{}.csv'.format(table.name))
+    reader = csv.reader(table_csv)
+    headers = tuple(next(reader, ()))
+
+    for name in headers:
+        if name not in table.c:
+            raise ConversionError(
+                path, 1, 'no column {} in {}'.format(name, table.name))
+
+    convert = compile_converter(table, headers)
+
+    def rows():
+        for row in reader:
+            try:
+                yield convert(row)
+            except ValueError:
+                raise conversion_error(
+                    table, headers, row, path, reader.line_num)
+
+    def timed_rows():
+        clock = time.perf_counter
+        start = clock()
+
+        for row in reader:
+            read = clock()
+
+            try:
+                values = convert(row)
+            except ValueError:
+                raise conversion_error(
+                    table, headers, row, path, reader.line_num)
+
+            converted = clock()
+            timings.read += read - start
+            timings.convert += converted - read
+
+            yield values
+            start = clock()
+
+    return headers, (rows() if timings is None else timed_rows())
+
+def compile_converter(table, headers):
+    """Return a function that converts a row of strings from a table's CSV,
+    with its columns in the order given by `headers`, into a tuple of Python
+    values.
+
+    The function raises ValueError for any value it can't convert.
+    """
+
+    converters = [column_converter(table.c[name]) for name in headers]
+    width = len(converters)
+
+    def convert(row):
+        if len(row) != width:
+            raise ValueError('Wrong number of values')
+
+        return tuple([func(value) for func, value in zip(converters, row)])
+
+    return convert
+
+def conversion_error(table, headers, row, path, line):
+    """Figure out which value in a row a converter choked on, and return a
+    ConversionError explaining what's wrong with it.
+    """
+
+    if len(row) != len(headers):
+        message = 'expected {} values, found {}'.format(
+            len(headers), len(row))
+    else:
+        message = 'unknown error'  # Shouldn't stick
+
+        for name, value in zip(headers, row):
+            try:
+                column_converter(table.c[name])(value)
+            except ValueError as error:
+                message = 'bad value {!r} for {}: {}'.format(
+                    value, name, error)
+                break
+
+    return ConversionError(path, line, message)
+
+def column_converter(column):
+    """Return a function that converts a string from a CSV into a Python
+    value for the given column.
+    """
+
+    type_ = column.type
+
+    # Enum has to come before String, since it's a subclass
+    if isinstance(type_, sa.types.Boolean):
+        convert = convert_boolean
+    elif isinstance(type_, sa.types.Enum) and type_.enum_class is not None:
+        convert = enum_converter(type_.enum_class)
+    elif isinstance(type_, sa.types.Integer):
+        convert = int
+    elif isinstance(type_, sa.types.Numeric):
+        convert = convert_decimal if type_.asdecimal else float
+    else:
+        convert = str
+
+    if column.nullable:
+        return nullable_converter(convert)
+    else:
+        return convert
+
+def nullable_converter(convert):
+    """Wrap a converter so that it turns empty strings into None."""
+
+    def convert_nullable(value):
+        if value == '':
+            return None
+
+        return convert(value)
+
+    return convert_nullable
+
+def convert_boolean(value):
+    """Convert True or False into a bool."""
+
+    if value == 'True':
+        return True
+    elif value == 'False':
+        return False
+    else:
+        raise ValueError('Expected True or False')
+
+def convert_decimal(value):
+    """Convert a string into a Decimal."""
+
+    try:
+        return decimal.Decimal(value)
+    except decimal.InvalidOperation:
+        raise ValueError('Not a decimal number')
+
+def enum_converter(enum_class):
+    """Return a function that converts a member's name into an enum member."""
+
+    members = enum_class.__members__
+
+    def convert_enum(value):
+        try:
+            return members[value]
+        except KeyError:
+            raise ValueError('Not a member of {}'.format(enum_class.__name__))
+
+    return convert_enum
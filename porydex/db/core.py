@@ -1,7 +1,20 @@
+import contextlib
+import functools
+import glob
+import io
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+
 import sqlalchemy as sa
 import sqlalchemy.orm
+import sqlalchemy.pool
 import sqlalchemy.ext.declarative
 
+import porydex.db.csvs
+
 
 class TableBase(sa.ext.declarative.declarative_base()):
     __abstract__ = True
@@ -21,7 +34,383 @@ class TableBase(sa.ext.declarative.declarative_base()):
         )
 
 
-def connect(uri, echo=False):
-    """Connect to the db and return a session."""
+def connect(uri=None, echo=False, cache=False, profiler=None, **pool_args):
+    """Connect to the db and return a session.
+
+    If no URI is given, connect to a prebuilt, read-only SQLite database
+    instead; see `prebuilt_engine`.  With `cache`, the session gets the
+    process-wide cache of static reference tables; see `porydex.db.cache`.
+
+    Sessions for the same URI (and `echo` and `pool_args`, which are passed
+    to `shared_engine`) share one engine and its pool of connections.
+    SQLite files are opened read-only unless `read_only=False` is passed.
+
+    A `porydex.db.profiler.Profiler` passed as `profiler` records every
+    statement executed through the session.  Each profiler gets its own
+    engine, shared by every session connected with it, so sessions without
+    it aren't recorded.
+    """
+
+    engine = shared_engine(uri, echo=echo, profiler=profiler, **pool_args)
+    return make_session(engine, cache)
+
+def scoped_sessions(uri=None, echo=False, cache=False, profiler=None,
+                    **pool_args):
+    """Return a `scoped_session` for a URI, which gives each thread its own
+    session from `connect`:
+
+        Session = scoped_sessions(uri)
+        Session.query(...)  # In any thread
+        Session.remove()    # At the end of each request
+
+    Every thread's session shares one engine and its pool of connections.
+    """
+
+    engine = shared_engine(uri, echo=echo, profiler=profiler, **pool_args)
+    return sa.orm.scoped_session(
+        functools.partial(make_session, engine, cache))
+
+def make_session(engine, cache=False):
+    """Return a new session on an engine, with the reference cache if
+    `cache`.
+    """
+
+    if cache:
+        # Imported here, since the cache needs the whole schema
+        import porydex.db.cache
+        return porydex.db.cache.cached_session(engine)
+
+    return sa.orm.Session(bind=engine)
+
+
+_invalidation_hooks = []
+
+def register_invalidation_hook(func):
+    """Register `func(engine)` to be called whenever the data in a database
+    is changed by porydex itself, so that caches of it can be cleared.
+    """
+
+    _invalidation_hooks.append(func)
+
+def invalidate_caches(engine):
+    """Call every registered invalidation hook for a database."""
+
+    for func in _invalidation_hooks:
+        func(engine)
+
+
+### Sync bookkeeping
+
+# The hash of each table's CSV as of the last time the table was loaded or
+# synced.  This lives outside TableBase's metadata so that it isn't treated
+# as part of the dex proper (e.g. by dump).
+sync_metadata = sa.MetaData()
+
+csv_hashes = sa.Table(
+    'porydex_csv_hashes', sync_metadata,
+    sa.Column('table_name', sa.Unicode, primary_key=True),
+    sa.Column('sha256', sa.Unicode, nullable=False)
+)
+
+
+### Engines and connection pools
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+
+class PoolMetrics:
+    """Counts of what a `MeteredQueuePool` has done.
+
+    `checkouts` is how many times a connection was handed out, `connects`
+    how many connections were opened, and `timeouts` how many checkouts
+    gave up waiting.  `waits` is how many checkouts couldn't get a
+    connection right away, and `wait_seconds` and `max_wait_seconds` how
+    long checkouts spent getting one, in total and at most (including
+    opening a new connection, when the pool had none idle).
+    """
+
+    # A checkout that takes longer than this had to wait for a connection,
+    # rather than just being handed one
+    WAIT_THRESHOLD = 0.001
+
+    def __init__(self):
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, seconds, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+            if seconds > self.WAIT_THRESHOLD:
+                self.waits += 1
+
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'timeouts': self.timeouts,
+                'waits': self.waits,
+                'wait_seconds': self.wait_seconds,
+                'max_wait_seconds': self.max_wait_seconds,
+            }
+
+
+class MeteredQueuePool(sa.pool.QueuePool):
+    """A QueuePool that keeps `PoolMetrics`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+
+        try:
+            connection = super()._do_get()
+        except sa.exc.TimeoutError:
+            self.metrics.record_checkout(
+                time.perf_counter() - start, timed_out=True)
+            raise
+
+        self.metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def _create_connection(self):
+        self.metrics.record_connect()
+        return super()._create_connection()
+
+def pool_metrics(engine):
+    """Return a dict of an engine's `PoolMetrics`, plus how many connections
+    are checked out and idle right now, or None if its pool isn't metered.
+    """
+
+    pool = engine.pool
+
+    if not isinstance(pool, MeteredQueuePool):
+        return None
+
+    metrics = pool.metrics.as_dict()
+    metrics['checked_out'] = pool.checkedout()
+    metrics['idle'] = pool.checkedin()
+    return metrics
+
+
+_shared_engines = {}
+_shared_engines_lock = threading.Lock()
+
+def shared_engine(uri=None, echo=False, profiler=None,
+                  pool_size=DEFAULT_POOL_SIZE,
+                  max_overflow=DEFAULT_MAX_OVERFLOW, read_only=True):
+    """Return the engine for a URI, creating it the first time; see
+    `create_pooled_engine`.
+
+    Engines are shared within the process for each combination of
+    arguments, except for in-memory SQLite databases: each of those is a
+    separate database, so each call gets a new engine for a new one.  A
+    `profiler` is attached to the engine when it's created, so each profiler
+    gets engines of its own.
+    """
+
+    if uri is None:
+        return prebuilt_engine(echo=echo, profiler=profiler,
+                               pool_size=pool_size, max_overflow=max_overflow)
+    elif is_sqlite_memory_uri(uri):
+        engine = sa.create_engine(uri, echo=echo)
+
+        if profiler is not None:
+            profiler.attach(engine)
+
+        return engine
+
+    key = (uri, echo, profiler, pool_size, max_overflow, read_only)
+
+    with _shared_engines_lock:
+        try:
+            return _shared_engines[key]
+        except KeyError:
+            engine = create_pooled_engine(
+                uri, echo=echo, pool_size=pool_size,
+                max_overflow=max_overflow, read_only=read_only)
+
+            if profiler is not None:
+                profiler.attach(engine)
+
+            return _shared_engines.setdefault(key, engine)
+
+def create_pooled_engine(uri=None, echo=False, pool_size=DEFAULT_POOL_SIZE,
+                         max_overflow=DEFAULT_MAX_OVERFLOW, read_only=True):
+    """Create an engine with a `MeteredQueuePool`, whose connections any
+    thread can use (one thread at a time), for `uri` or the prebuilt
+    database.
+
+    SQLite files are opened with pysqlite's same-thread check off, and,
+    unless `read_only` is false, in SQLite's read-only mode; other databases
+    ignore `read_only`.  In-memory SQLite databases can't be shared between
+    connections, so they're refused.
+    """
+
+    pool_args = dict(poolclass=MeteredQueuePool, pool_size=pool_size,
+                     max_overflow=max_overflow, echo=echo)
+
+    if uri is None:
+        return sa.create_engine(
+            'sqlite://',
+            creator=sqlite_creator(prebuilt_path(), 'immutable=1'),
+            **pool_args)
+
+    url = sa.engine.url.make_url(uri)
+
+    if url.get_backend_name() != 'sqlite':
+        return sa.create_engine(uri, **pool_args)
+    elif is_sqlite_memory_uri(uri):
+        raise ValueError('In-memory SQLite databases can\'t be pooled')
+    elif read_only:
+        return sa.create_engine(
+            'sqlite://', creator=sqlite_creator(url.database, 'mode=ro'),
+            **pool_args)
+
+    return sa.create_engine(
+        uri, connect_args={'check_same_thread': False}, **pool_args)
+
+def is_sqlite_memory_uri(uri):
+    """Return whether a URI is for an in-memory SQLite database."""
+
+    url = sa.engine.url.make_url(uri)
+    return (url.get_backend_name() == 'sqlite' and
+            url.database in (None, '', ':memory:'))
+
+_prebuilt_engines = {}
+
+def prebuilt_engine(directory=None, echo=False, profiler=None,
+                    pool_size=DEFAULT_POOL_SIZE,
+                    max_overflow=DEFAULT_MAX_OVERFLOW):
+    """Return a shared engine for a prebuilt SQLite database, building it
+    first if necessary.
+
+    The database lives in `directory` (by default $PORYDEX_CACHE_DIR, or
+    porydex under the user's cache directory), named after a hash of all the
+    CSVs, so it's only rebuilt when the CSVs change.  It's opened in SQLite's
+    immutable mode, which skips locking and change detection entirely, and
+    its connections are pooled like `create_pooled_engine`'s.  Like
+    `shared_engine`, each `profiler` gets an engine of its own.
+
+    The CSVs are only hashed the first time; see `prebuilt_path`.
+    """
+
+    if directory is None:
+        directory = default_cache_dir()
+
+    key = (directory, echo, profiler, pool_size, max_overflow)
+
+    try:
+        return _prebuilt_engines[key]
+    except KeyError:
+        pass
+
+    path = prebuilt_path(directory)
+
+    with _shared_engines_lock:
+        try:
+            return _prebuilt_engines[key]
+        except KeyError:
+            engine = sa.create_engine(
+                'sqlite://', creator=sqlite_creator(path, 'immutable=1'),
+                poolclass=MeteredQueuePool, pool_size=pool_size,
+                max_overflow=max_overflow, echo=echo)
+
+            if profiler is not None:
+                profiler.attach(engine)
+
+            return _prebuilt_engines.setdefault(key, engine)
+
+_prebuilt_paths = {}
+_prebuilt_paths_lock = threading.Lock()
+
+def prebuilt_path(directory=None):
+    """Return the path to the prebuilt SQLite database in `directory` (see
+    `prebuilt_engine`), building it first if necessary.
+
+    The path is worked out (and the database built) once per directory per
+    process, so CSVs changed after that are only picked up by new processes.
+    """
+
+    if directory is None:
+        directory = default_cache_dir()
+
+    # Held while building, so that threads starting at once build it once
+    with _prebuilt_paths_lock:
+        try:
+            return _prebuilt_paths[directory]
+        except KeyError:
+            path = _prebuilt_paths[directory] = build_prebuilt(directory)
+            return path
+
+def build_prebuilt(directory):
+    """Build the prebuilt SQLite database in `directory` if it's not up to
+    date with the CSVs, and return its path.
+
+    It's built quietly, and the CSVs aren't validated first, since the ones
+    shipped with porydex are already known to be good.
+    """
+
+    path = os.path.join(directory, 'porydex-{}.sqlite'.format(
+        porydex.db.csvs.data_hash()[:16]))
+
+    if not os.path.exists(path):
+        # Building is just loading, which is the CLI's job; it's only
+        # imported here, when there's actually something to build
+        from porydex.db import cli
+
+        os.makedirs(directory, exist_ok=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cli.build_sqlite(path, validate_first=False)
+
+        # Clear out any databases built from older CSVs.  Anything still
+        # using them will keep its open file.
+        for old_path in glob.glob(os.path.join(directory, 'porydex-*.sqlite')):
+            if old_path != path:
+                os.remove(old_path)
+
+    return path
+
+def sqlite_creator(path, parameters):
+    """Return a function that opens an SQLite database file with some URI
+    parameters (e.g. 'mode=ro'), for any thread to use; pass it to
+    `create_engine` as `creator`.
+    """
+
+    uri = '{}?{}'.format(sqlite_file_uri(path), parameters)
+    return lambda: sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+def sqlite_file_uri(path):
+    """Return a file: URI for an SQLite database, as understood by SQLite."""
+
+    return 'file:{}'.format(urllib.request.pathname2url(os.path.abspath(path)))
+
+def default_cache_dir():
+    """Return the directory prebuilt databases go in by default."""
+
+    try:
+        return os.environ['PORYDEX_CACHE_DIR']
+    except KeyError:
+        pass
 
-    return sa.orm.Session(bind=sa.create_engine(uri, echo=echo))
+    cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                  os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'porydex')
@@ -0,0 +1,114 @@
+"""Finding, opening, and hashing the CSVs the database is loaded from.
+
+These are shared by the CLI, which loads and dumps the CSVs, by
+`porydex.db.validate`, which checks them, and by `porydex.db.core`, which
+names prebuilt databases after a hash of them, so none of those needs
+any of the others.
+"""
+
+import csv
+import hashlib
+import os
+
+import porydex.db
+import porydex.db.ranged
+
+
+### Finding and opening CSVs
+
+def data_dir():
+    """Return the directory the CSVs live in: $PORYDEX_DATA_DIR if it's set,
+    or the package's own data directory otherwise.
+    """
+
+    try:
+        return os.environ['PORYDEX_DATA_DIR']
+    except KeyError:
+        # The package isn't zip-safe, so its data is always a real directory
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'data')
+
+def csv_path(table):
+    """Return the path to a table's CSV."""
+
+    return os.path.join(data_dir(), '{}.csv'.format(table.name))
+
+def ranged_csv_path(table):
+    """Return the path to a table's ranged CSV; see `porydex.db.ranged`."""
+
+    return os.path.join(data_dir(), '{}.ranged.csv'.format(table.name))
+
+def stored_csv_path(table):
+    """Return the path to whichever CSV a table is actually stored in:
+    its ranged CSV if it has one, and its plain CSV otherwise.
+    """
+
+    path = ranged_csv_path(table)
+    return path if os.path.exists(path) else csv_path(table)
+
+def open_csv(table):
+    """Open a table's CSV for reading.
+
+    A ranged CSV is expanded into a plain one as it's read, so either way
+    the result reads like a plain CSV.  Raise FileNotFoundError if the table
+    has no CSV.
+    """
+
+    path = stored_csv_path(table)
+    table_csv = open(path, encoding='UTF-8', newline='')
+
+    if path == csv_path(table):
+        return table_csv
+
+    with table_csv:
+        plain_csv = porydex.db.ranged.expand_csv(
+            table, table_csv, csv_game_ids())
+
+    plain_csv.name = '{} (expanded)'.format(path)
+    return plain_csv
+
+def csv_game_ids():
+    """Return every game id in the games CSV, in order."""
+
+    games = porydex.db.TableBase.metadata.tables['games']
+
+    with open(csv_path(games), encoding='UTF-8', newline='') as games_csv:
+        reader = csv.reader(games_csv)
+        id_index = next(reader).index('id')
+        return sorted(int(row[id_index]) for row in reader)
+
+
+### Hashing
+
+def csv_hash(table):
+    """Return the SHA-256 of a table's CSV, or None if there's no CSV."""
+
+    return file_hash(stored_csv_path(table))
+
+def file_hash(path):
+    """Return the SHA-256 of a file, or None if it doesn't exist."""
+
+    try:
+        with open(path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def data_hash():
+    """Return a hash of all the CSVs together."""
+
+    return combine_hashes(
+        (table.name, csv_hash(table))
+        for table in porydex.db.TableBase.metadata.sorted_tables
+    )
+
+def combine_hashes(table_hashes):
+    """Combine (table name, CSV hash) pairs into a single hash."""
+
+    combined = hashlib.sha256()
+
+    for table_name, sha256 in sorted(table_hashes):
+        if sha256 is not None:
+            combined.update('{} {}\n'.format(table_name, sha256).encode())
+
+    return combined.hexdigest()
@@ -0,0 +1,289 @@
+"""Vectorized type effectiveness, computed with NumPy.
+
+Each type chart is compiled once into a dense matrix of damage multipliers,
+indexed by attacking type and defending type, and each game's Pokémon types
+are compiled into an array of indexes into that matrix.  Working out how
+effective some attacking types are against every Pokémon in a game is then a
+single fancy-indexing operation and a product along the type axis:
+
+    result = effectiveness(connection, game_id, [fire_id, water_id])
+    result.multipliers  # shape (2, number of Pokémon instances in the game)
+
+Every multiplier in a type chart is 0, 1/2, 1, or 2, so every product of
+them is zero or a power of two, which a float represents exactly; the floats
+here always equal the `Fraction` you'd get by multiplying the matchups'
+`TypeMatchupResult` values together, and `as_fraction` converts them back.
+
+NumPy is an optional dependency: install porydex[numpy] to use this module.
+Compiled charts and games are cached per engine, since the data is static.
+load, reload, and sync clear the cache for the database they change; call
+`clear_cache` after changing it any other way.
+"""
+
+import fractions
+import weakref
+
+import numpy
+import sqlalchemy as sa
+
+import porydex.db
+from porydex.db.core import register_invalidation_hook
+
+
+# {engine: {('chart', type_chart_id) or ('game', game_id): compiled}}
+_cache = weakref.WeakKeyDictionary()
+
+
+class CompiledTypeChart:
+    """A type chart compiled into a matrix of damage multipliers.
+
+    `multipliers[a, d]` is the multiplier when a move of type `type_ids[a]`
+    hits a Pokémon of type `type_ids[d]`.  The matrix has one extra column at
+    the end, NO_TYPE, which is all ones; it pads out the type lists of
+    Pokémon with fewer types than others.
+    """
+
+    def __init__(self, type_chart_id, type_ids, multipliers):
+        self.type_chart_id = type_chart_id
+        self.type_ids = tuple(type_ids)
+        self.type_indexes = {
+            type_id: index for index, type_id in enumerate(self.type_ids)}
+        self.multipliers = multipliers
+        self.multipliers.flags.writeable = False
+
+    @property
+    def NO_TYPE(self):
+        return len(self.type_ids)
+
+    def index(self, type_id):
+        """Return a type's index in the matrix.
+
+        Raise KeyError if the type isn't part of this chart.
+        """
+
+        try:
+            return self.type_indexes[type_id]
+        except KeyError:
+            raise KeyError('Type {} is not in type chart {}'.format(
+                type_id, self.type_chart_id)) from None
+
+    def indexes(self, type_ids):
+        """Return an array of the matrix indexes of some types."""
+
+        return numpy.array([self.index(type_id) for type_id in type_ids],
+                           dtype=numpy.intp)
+
+    def multiplier(self, attacking_type_id, *defending_type_ids):
+        """Return the damage multiplier for a move of one type hitting a
+        Pokémon with some types, as a Fraction.
+        """
+
+        row = self.multipliers[self.index(attacking_type_id)]
+        return as_fraction(row[self.indexes(defending_type_ids)].prod())
+
+
+class CompiledGameTypes:
+    """Every Pokémon instance's types in one game, as chart indexes.
+
+    `pokemon_ids` and `form_ids` identify the instances, in form order, and
+    row i of `type_indexes` holds the chart indexes of instance i's types, in
+    slot order, padded with the chart's NO_TYPE.
+    """
+
+    def __init__(self, game_id, chart, pokemon_ids, form_ids, type_indexes):
+        self.game_id = game_id
+        self.chart = chart
+        self.pokemon_ids = pokemon_ids
+        self.form_ids = form_ids
+        self.type_indexes = type_indexes
+
+        for array in (pokemon_ids, form_ids, type_indexes):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.pokemon_ids)
+
+    def keys(self):
+        """Return a list of (pokemon_id, form_id) pairs, in order."""
+
+        return list(zip(self.pokemon_ids.tolist(), self.form_ids.tolist()))
+
+
+class Effectiveness:
+    """The result of `effectiveness`.
+
+    `multipliers[i, j]` is the multiplier for `attacking_type_ids[i]` against
+    the Pokémon form (`pokemon_ids[j]`, `form_ids[j]`) in the game.
+    """
+
+    def __init__(self, game_types, attacking_type_ids, multipliers):
+        self.game_id = game_types.game_id
+        self.attacking_type_ids = tuple(attacking_type_ids)
+        self.pokemon_ids = game_types.pokemon_ids
+        self.form_ids = game_types.form_ids
+        self.multipliers = multipliers
+
+    def fraction(self, attacking_type_id, pokemon_id, form_id):
+        """Return one multiplier as a Fraction."""
+
+        row = self.attacking_type_ids.index(attacking_type_id)
+        (column,) = numpy.flatnonzero(
+            (self.pokemon_ids == pokemon_id) & (self.form_ids == form_id))
+
+        return as_fraction(self.multipliers[row, column])
+
+
+def effectiveness(connection, game_id, attacking_type_ids):
+    """Work out how effective moves of some types are against every Pokémon
+    instance in a game, using the game's type chart.
+
+    Return an `Effectiveness`, whose `multipliers` has one row per attacking
+    type and one column per instance.
+    """
+
+    game_types = compiled_game_types(connection, game_id)
+    attacking = game_types.chart.indexes(attacking_type_ids)
+
+    # (attacking, instance, slot) -> (attacking, instance)
+    matrix = game_types.chart.multipliers
+    multipliers = matrix[attacking[:, None, None],
+                         game_types.type_indexes[None, :, :]].prod(axis=2)
+
+    return Effectiveness(game_types, attacking_type_ids, multipliers)
+
+def compiled_type_chart(connection, type_chart_id):
+    """Return a type chart compiled into a `CompiledTypeChart`, from the
+    cache if possible.
+    """
+
+    cache = _engine_cache(connection)
+    key = ('chart', type_chart_id)
+
+    if key not in cache:
+        cache[key] = compile_type_chart(connection, type_chart_id)
+
+    return cache[key]
+
+def compiled_game_types(connection, game_id):
+    """Return a game's Pokémon types compiled into a `CompiledGameTypes`,
+    from the cache if possible.
+    """
+
+    cache = _engine_cache(connection)
+    key = ('game', game_id)
+
+    if key not in cache:
+        cache[key] = compile_game_types(connection, game_id)
+
+    return cache[key]
+
+def clear_cache(engine=None):
+    """Forget compiled charts and games, for one engine or for all of them."""
+
+    if engine is None:
+        _cache.clear()
+    else:
+        _cache.pop(engine, None)
+
+register_invalidation_hook(clear_cache)
+
+def _engine_cache(connection):
+    return _cache.setdefault(connection.engine, {})
+
+def compile_type_chart(connection, type_chart_id):
+    """Compile a type chart from the database, without using the cache.
+
+    Raise ValueError if the chart doesn't have a matchup for every pair of
+    its types.
+    """
+
+    type_matchup = porydex.db.TypeMatchup.__table__
+    rows = connection.execute(
+        sa.select([type_matchup.c.attacking_type_id,
+                   type_matchup.c.defending_type_id,
+                   type_matchup.c.result])
+        .where(type_matchup.c.type_chart_id == type_chart_id)
+    ).fetchall()
+
+    type_ids = sorted({row.attacking_type_id for row in rows} |
+                      {row.defending_type_id for row in rows})
+    indexes = {type_id: index for index, type_id in enumerate(type_ids)}
+
+    if not type_ids:
+        raise ValueError('No matchups for type chart {}'.format(
+            type_chart_id))
+    elif len(rows) != len(type_ids) ** 2:
+        raise ValueError('Type chart {} has {} matchups for {} types'.format(
+            type_chart_id, len(rows), len(type_ids)))
+
+    multipliers = numpy.ones((len(type_ids), len(type_ids) + 1))
+
+    for row in rows:
+        multipliers[indexes[row.attacking_type_id],
+                    indexes[row.defending_type_id]] = (
+            float(row.result.damage_multiplier))
+
+    return CompiledTypeChart(type_chart_id, type_ids, multipliers)
+
+def compile_game_types(connection, game_id):
+    """Compile a game's Pokémon types from the database, without using the
+    cache (except for the game's type chart).
+    """
+
+    game = porydex.db.Game.__table__
+    instance = porydex.db.PokemonInstance.__table__
+    form = porydex.db.PokemonForm.__table__
+    pokemon_type = porydex.db.PokemonType.__table__
+
+    type_chart_id = connection.execute(
+        sa.select([game.c.type_chart_id]).where(game.c.id == game_id)
+    ).scalar()
+
+    if type_chart_id is None:
+        raise ValueError('No game with id {}'.format(game_id))
+
+    chart = compiled_type_chart(connection, type_chart_id)
+
+    keys = connection.execute(
+        sa.select([instance.c.pokemon_id, instance.c.form_id])
+        .select_from(instance.join(form))
+        .where(instance.c.game_id == game_id)
+        .order_by(form.c.order)
+    ).fetchall()
+    positions = {tuple(key): position for position, key in enumerate(keys)}
+
+    types = [[] for key in keys]
+
+    for row in connection.execute(
+        sa.select([pokemon_type.c.pokemon_id, pokemon_type.c.form_id,
+                   pokemon_type.c.type_id])
+        .where(pokemon_type.c.game_id == game_id)
+        .where(pokemon_type.c.type_id.isnot(None))
+        .order_by(pokemon_type.c.pokemon_id, pokemon_type.c.form_id,
+                  pokemon_type.c.slot)
+    ):
+        types[positions[row.pokemon_id, row.form_id]].append(
+            chart.index(row.type_id))
+
+    width = max(map(len, types), default=0) or 1
+    type_indexes = numpy.full((len(keys), width), chart.NO_TYPE,
+                              dtype=numpy.intp)
+
+    for position, indexes in enumerate(types):
+        type_indexes[position, :len(indexes)] = indexes
+
+    return CompiledGameTypes(
+        game_id,
+        chart,
+        numpy.array([key.pokemon_id for key in keys], dtype=numpy.int64),
+        numpy.array([key.form_id for key in keys], dtype=numpy.int64),
+        type_indexes
+    )
+
+def as_fraction(multiplier):
+    """Convert a multiplier from one of the arrays into a Fraction.
+
+    This is exact, since the multipliers are all zero or powers of two.
+    """
+
+    return fractions.Fraction(float(multiplier))
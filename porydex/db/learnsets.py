@@ -0,0 +1,153 @@
+"""An in-memory index of who learns what, in both directions.
+
+Learnsets are stored as move lists, each shared between any number of
+Pokémon, forms, games, and methods through pokemon_move_list_map.  Rather
+than joining through all of that, `LearnsetIndex` loads it once and keeps
+the sharing: each list's moves are only stored once, and the inverted index
+maps (game, move) to the lists it's on in that game, and (game, list) to the
+Pokémon that use the list there.  So:
+
+    index = LearnsetIndex.load(connection)
+    index.learners(game_id, move_id)       # Who learns it, how, at what level
+    index.learnset(game_id, pokemon_id, form_id)  # Everything one form learns
+    index.learners_of_all(game_id, move_ids)  # Who learns every one of these
+
+None of these touch the database.
+"""
+
+import collections
+
+import sqlalchemy as sa
+
+import porydex.db
+
+
+Learner = collections.namedtuple(
+    'Learner', 'pokemon_id form_id method level')
+LearnsetMove = collections.namedtuple(
+    'LearnsetMove', 'move_id method level order_within_level')
+
+
+class LearnsetIndex:
+    """Every learnset in the database, indexed both ways.
+
+    `list_moves` maps each move list's id to a list of (move_id, level,
+    order_within_level) tuples, in the same order as
+    `PokemonMoveList.pokemon_moves`.  `list_users` maps (game_id, list id)
+    to a list of (pokemon_id, form_id, method) tuples, and `move_lists` maps
+    (game_id, move_id) to a list of (list id, level) pairs.  `instance_lists`
+    maps (game_id, pokemon_id, form_id) to a list of (method, list id) pairs.
+    """
+
+    def __init__(self):
+        self.list_moves = {}
+        self.list_users = {}
+        self.move_lists = {}
+        self.instance_lists = {}
+
+    @classmethod
+    def load(cls, connection):
+        """Load every move list and map row from the database."""
+
+        tables = porydex.db.TableBase.metadata.tables
+        pokemon_moves = tables['pokemon_moves']
+        list_map = tables['pokemon_move_list_map']
+
+        index = cls()
+
+        for row in connection.execute(
+            sa.select([pokemon_moves.c.pokemon_move_list_id,
+                       pokemon_moves.c.move_id,
+                       pokemon_moves.c.level,
+                       pokemon_moves.c.order_within_level])
+            .order_by(pokemon_moves.c.pokemon_move_list_id,
+                      pokemon_moves.c.move_id, pokemon_moves.c.id)
+        ):
+            index.list_moves.setdefault(row[0], []).append(tuple(row[1:]))
+
+        for (game_id, pokemon_id, form_id, method,
+             list_id) in connection.execute(
+            sa.select([list_map.c.game_id, list_map.c.pokemon_id,
+                       list_map.c.form_id, list_map.c.method,
+                       list_map.c.pokemon_move_list_id])
+            .where(list_map.c.pokemon_move_list_id.isnot(None))
+            .order_by(*list_map.primary_key.columns)
+        ):
+            index.list_users.setdefault((game_id, list_id), []).append(
+                (pokemon_id, form_id, method))
+            index.instance_lists.setdefault(
+                (game_id, pokemon_id, form_id), []).append((method, list_id))
+
+        # Each list's moves only need going through once per game it's used
+        # in, no matter how many Pokémon share it there
+        for game_id, list_id in index.list_users:
+            for move_id, level, order_within_level in (
+                    index.list_moves.get(list_id, ())):
+                index.move_lists.setdefault((game_id, move_id), []).append(
+                    (list_id, level))
+
+        return index
+
+    def learners(self, game_id, move_id):
+        """Return a list of `Learner`s for everything that can learn a move
+        in a game, one per Pokémon form, method, and level.
+        """
+
+        return [
+            Learner(pokemon_id, form_id, method, level)
+            for list_id, level in self.move_lists.get((game_id, move_id), ())
+            for pokemon_id, form_id, method
+            in self.list_users[game_id, list_id]
+        ]
+
+    def learnset(self, game_id, pokemon_id, form_id):
+        """Return a list of `LearnsetMove`s for everything a Pokémon form
+        can learn in a game, grouped by method.
+        """
+
+        return [
+            LearnsetMove(move_id, method, level, order_within_level)
+            for method, list_id in self.instance_lists.get(
+                (game_id, pokemon_id, form_id), ())
+            for move_id, level, order_within_level in self.list_moves.get(
+                list_id, ())
+        ]
+
+    def learner_forms(self, game_id, move_id, methods=None):
+        """Return the set of (pokemon_id, form_id) pairs that can learn a
+        move in a game, optionally only by some methods.
+        """
+
+        return {
+            (pokemon_id, form_id)
+            for list_id, level in self.move_lists.get((game_id, move_id), ())
+            for pokemon_id, form_id, method
+            in self.list_users[game_id, list_id]
+            if methods is None or method in methods
+        }
+
+    def learners_of_all(self, game_id, move_ids, methods=None):
+        """Return the set of (pokemon_id, form_id) pairs that can learn every
+        one of some moves in a game, optionally only by some methods.
+        """
+
+        # Start from the rarest move, so the running set is as small as it
+        # can be from the beginning
+        move_ids = sorted(
+            set(move_ids),
+            key=lambda move_id: len(
+                self.move_lists.get((game_id, move_id), ()))
+        )
+
+        if not move_ids:
+            return set()
+
+        forms = self.learner_forms(game_id, move_ids[0], methods)
+
+        for move_id in move_ids[1:]:
+            if not forms:
+                break
+
+            forms &= self.learner_forms(game_id, move_id, methods)
+
+        return forms
@@ -0,0 +1,226 @@
+"""Named eager-loading profiles for common access patterns.
+
+The schema's relationships load in a mixture of ways (joined, selectin, and
+lazy), so how many queries a page takes depends on what it touches and how
+many rows it shows.  A `LoaderProfile` instead names every relationship path
+a page needs up front, and loads them all in a bounded number of round
+trips, whatever the size of the result:
+
+    instances = (loaders.INSTANCE_DETAIL.query(session)
+                 .filter_by(game_id=game_id, pokemon_id=pokemon_id).all())
+
+Within a profile, many-to-one relationships are joined into the query that
+loads their parent, and collections are loaded with one subquery load each
+(rather than selectin, which splits large results into several batches).
+Every other relationship along the way is made lazy, so nothing outside the
+profile is loaded behind your back.  `ByLanguage` names are the `_names`
+relationship.
+
+A query takes one round trip for itself and one per collection, except that
+SQLAlchemy skips the loads nested under a collection that comes back empty
+(e.g. egg groups, which games before Generation 2 don't have).  So each
+profile's `round_trips` is an upper bound.  `count_statements` and
+`check_profile` check that a profile stays within it.
+"""
+
+import collections.abc
+import contextlib
+
+import sqlalchemy as sa
+import sqlalchemy.event
+import sqlalchemy.orm
+
+import porydex.db
+
+
+class LoaderProfile:
+    """A named set of relationship paths to load eagerly for one entity.
+
+    `paths` are dotted attribute names, e.g. 'stats.stat._names'.
+    `round_trips` is the most statements a query with this profile takes,
+    which it does when every collection along the paths has something in
+    it.
+    """
+
+    def __init__(self, name, entity, paths, round_trips):
+        self.name = name
+        self.entity = entity
+        self.paths = tuple(paths)
+        self.round_trips = round_trips
+        self._options = None
+
+    def __repr__(self):
+        return '<LoaderProfile {!r}>'.format(self.name)
+
+    def options(self):
+        """Return the loader options for this profile."""
+
+        if self._options is None:
+            self._options = path_options(self.entity, self.paths)
+
+        return self._options
+
+    def query(self, session):
+        """Return a query for this profile's entity, with its options."""
+
+        return session.query(self.entity).options(*self.options())
+
+def path_options(entity, paths):
+    """Return loader options that load some relationship paths eagerly, with
+    a fixed number of statements, and everything else lazily.
+    """
+
+    options = [sa.orm.lazyload('*')]
+    loaders = {}
+
+    for path in paths:
+        cls = entity
+        loader = None
+        prefix = ()
+
+        for name in path.split('.'):
+            attribute = getattr(cls, name)
+            relationship = attribute.property
+            prefix += (name,)
+
+            if prefix not in loaders:
+                strategy = ('subqueryload' if relationship.uselist
+                            else 'joinedload')
+                loaders[prefix] = getattr(
+                    sa.orm if loader is None else loader, strategy)(attribute)
+                options.extend((loaders[prefix],
+                                loaders[prefix].lazyload('*')))
+
+            loader = loaders[prefix]
+            cls = relationship.mapper.class_
+
+    return options
+
+
+### Profiles
+
+INSTANCE_DETAIL = LoaderProfile(
+    'instance detail',
+    porydex.db.PokemonInstance,
+    [
+        'game',
+        'pokemon_form._names',
+        'pokemon_form.pokemon._names',
+        'stats.stat._names',
+        'types._names',
+        'pokemon_abilities.ability._names',
+        'egg_groups._names',
+        'move_list_maps.pokemon_move_list.pokemon_moves.move._names',
+    ],
+    round_trips=13
+)
+
+GAME_ROSTER = LoaderProfile(
+    'game roster',
+    porydex.db.PokemonInstance,
+    [
+        'pokemon_form._names',
+        'pokemon_form.pokemon._names',
+        'types._names',
+    ],
+    round_trips=5
+)
+
+MOVE_LEARNERS = LoaderProfile(
+    'move learners',
+    porydex.db.PokemonMoveListMap,
+    [
+        'pokemon_instance.pokemon_form._names',
+        'pokemon_instance.pokemon_form.pokemon._names',
+        'pokemon_move_list.pokemon_moves',
+    ],
+    round_trips=4
+)
+
+PROFILES = {profile.name: profile
+            for profile in (INSTANCE_DETAIL, GAME_ROSTER, MOVE_LEARNERS)}
+
+
+### Checking round trips
+
+class StatementCounter:
+    """Counts the statements executed on an engine, while it's active."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def _before_cursor_execute(self, connection, cursor, statement, *args):
+        self.count += 1
+        self.statements.append(statement)
+
+@contextlib.contextmanager
+def count_statements(bind):
+    """Count the statements executed on an engine (or a session's engine)
+    inside a `with` block:
+
+        with count_statements(session) as counter:
+            ...
+        counter.count
+    """
+
+    if isinstance(bind, sa.orm.Session):
+        bind = bind.get_bind()
+
+    engine = getattr(bind, 'engine', bind)
+    counter = StatementCounter()
+    sa.event.listen(engine, 'before_cursor_execute',
+                    counter._before_cursor_execute)
+
+    try:
+        yield counter
+    finally:
+        sa.event.remove(engine, 'before_cursor_execute',
+                        counter._before_cursor_execute)
+
+def check_profile(session, profile, query=None):
+    """Run a profile's query and touch every path in it, and raise
+    AssertionError if that took more than `profile.round_trips` statements.
+
+    `query` is a function that refines the profile's query, e.g. with a
+    filter; it should return at least one row.  Return the statement count.
+    """
+
+    with count_statements(session) as counter:
+        base_query = profile.query(session)
+        results = (base_query if query is None else query(base_query)).all()
+
+        if not results:
+            raise ValueError('The query for {!r} found nothing'.format(
+                profile.name))
+
+        for path in profile.paths:
+            touch(results, path.split('.'))
+
+    if counter.count > profile.round_trips:
+        raise AssertionError(
+            '{!r} took {} statements, more than {}:\n\n{}'.format(
+                profile.name, counter.count, profile.round_trips,
+                '\n\n'.join(counter.statements)))
+
+    return counter.count
+
+def touch(things, names):
+    """Follow a path of attribute names from some objects, loading
+    everything along it.
+    """
+
+    if not names:
+        return
+
+    for thing in things:
+        value = getattr(thing, names[0])
+
+        if value is None:
+            continue
+        elif isinstance(value, collections.abc.Mapping):
+            value = list(value.values())
+        elif not isinstance(value, list):
+            value = [value]
+
+        touch(value, names[1:])
@@ -0,0 +1,136 @@
+"""Bulk name lookup for `ByLanguage` classes.
+
+Every `ByLanguage` object's `names` come from a selectin relationship, which
+means an extra query per batch of objects and a whole mapped collection per
+object, just to get at one string.  A `NameCache` instead loads every name
+in one language for a class with a single query, into a flat dict keyed by
+primary key, and then answers lookups for any object of that class without
+touching the database again:
+
+    names = NameCache(engine, language_id)
+    names.name(pokemon), names.full_name(form), names.abbreviation(stat)
+
+Objects are looked up by primary key rather than by identity, so one cache
+can serve objects from any number of sessions.  A class's names are loaded
+the first time they're needed; `load_all` loads all of them up front.
+"""
+
+import sqlalchemy as sa
+
+import porydex.db
+from porydex.db.schema.language import ENGLISH_ID, ByLanguage
+
+
+class NameCache:
+    """Every name in one language, loaded a class at a time.
+
+    `bind` is anything that can execute a query: an engine, a connection,
+    or a session.  Names are cached as they come out of the name tables,
+    including any extra columns (`PokemonFormName.full_name`,
+    `StatName.abbreviation`).
+    """
+
+    def __init__(self, bind, language_id=ENGLISH_ID):
+        self.bind = bind
+        self.language_id = language_id
+
+        # {class: {attribute name: {primary key: value}}}
+        self._values = {}
+
+    def name(self, thing):
+        """Return something's name, or None if it doesn't have one in this
+        language.
+        """
+
+        return self.get(type(thing), 'name', self.key(thing))
+
+    def full_name(self, form):
+        """Return a Pokémon form's full name, falling back to the Pokémon's
+        name like `PokemonForm.full_name`.
+        """
+
+        return (self.get(porydex.db.PokemonForm, 'full_name', self.key(form))
+                or self.get(porydex.db.Pokemon, 'name', (form.pokemon_id,)))
+
+    def abbreviation(self, stat):
+        """Return a stat's abbreviated name."""
+
+        return self.get(porydex.db.Stat, 'abbreviation', self.key(stat))
+
+    def get(self, cls, attribute, key):
+        """Return the value of a name table attribute for the object of the
+        given class with the given primary key, or None.
+        """
+
+        return self.values(cls, attribute).get(key)
+
+    def values(self, cls, attribute='name'):
+        """Return a dict of one name table attribute for every object of a
+        class, keyed by primary key tuples.
+        """
+
+        if cls not in self._values:
+            self._values[cls] = self._load(cls)
+
+        return self._values[cls][attribute]
+
+    def load_all(self):
+        """Load the names for every `ByLanguage` class now."""
+
+        for cls in by_language_classes():
+            self.values(cls)
+
+    def clear(self):
+        """Forget everything loaded so far."""
+
+        self._values.clear()
+
+    @staticmethod
+    def key(thing):
+        """Return an object's primary key, as a tuple."""
+
+        return tuple(sa.inspect(type(thing)).primary_key_from_instance(thing))
+
+    def _load(self, cls):
+        mapper = sa.inspect(cls)
+        relationship = mapper.relationships['_names']
+        name_mapper = relationship.mapper
+
+        # The name table's foreign key columns, in primary key order
+        remote_columns = dict(relationship.local_remote_pairs)
+        key_columns = [remote_columns[column]
+                       for column in mapper.primary_key]
+
+        attributes = [
+            attribute for attribute in name_mapper.column_attrs
+            if attribute.columns[0] not in key_columns
+            and attribute.key != 'language_id'
+        ]
+
+        query = (
+            sa.select(key_columns +
+                      [attribute.columns[0] for attribute in attributes])
+            .where(name_mapper.c.language_id == self.language_id)
+        )
+
+        width = len(key_columns)
+        values = {attribute.key: {} for attribute in attributes}
+        value_dicts = [values[attribute.key] for attribute in attributes]
+
+        for row in self.bind.execute(query):
+            row = tuple(row)
+            key = row[:width]
+
+            for value_dict, value in zip(value_dicts, row[width:]):
+                value_dict[key] = value
+
+        return values
+
+
+def by_language_classes():
+    """Return a list of every mapped class with names in different
+    languages.
+    """
+
+    return [cls for cls in porydex.db.TableBase._decl_class_registry.values()
+            if isinstance(cls, type) and issubclass(cls, ByLanguage)]
@@ -0,0 +1,448 @@
+"""Timing instrumentation for loads, and for queries in general.
+
+A `Profiler` attached to an engine records every statement executed on it,
+through SQLAlchemy's cursor events: how many there were, the slowest ones,
+and a histogram of their latency by mapped class (the class whose table a
+statement reads from or writes to).  During a load, it also records how long
+each table spent being read from its CSV, converted, and inserted, and how
+long each step of the load took.  From the command line:
+
+    porydex --profile sqlite:///porydex.sqlite load
+    porydex --profile-json report.json sqlite:///porydex.sqlite load
+
+From a long-running service, pass one to `connect`, and look at its report
+whenever you like:
+
+    profiler = Profiler()
+    session = porydex.db.connect(uri, profiler=profiler)
+    ...
+    profiler.report()['latency']['PokemonInstance']
+
+Each profiler gets its own engine from `connect`, so it only records
+sessions connected with it.
+
+Timing is done with `time.perf_counter`, so durations are wall-clock time.
+With `load --jobs`, tables are read and converted in worker processes, so
+their read and convert times overlap each other.
+"""
+
+import bisect
+import contextlib
+import heapq
+import itertools
+import json
+import threading
+import time
+
+import sqlalchemy as sa
+import sqlalchemy.event
+
+import porydex.db
+
+
+# The key a connection's profiler, if any, is kept under in connection.info
+INFO_KEY = 'porydex_profiler'
+
+# Upper bounds of the latency histogram's buckets, in seconds; the last
+# bucket holds everything slower
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+DEFAULT_SLOWEST = 10
+
+
+class TableTimings:
+    """How long a table spent in each step of a load, in seconds, and how
+    many rows it had.
+    """
+
+    __slots__ = ('read', 'convert', 'insert', 'rows')
+
+    def __init__(self):
+        self.read = 0.0
+        self.convert = 0.0
+        self.insert = 0.0
+        self.rows = 0
+
+    @property
+    def seconds(self):
+        return self.read + self.convert + self.insert
+
+    @property
+    def rows_per_second(self):
+        if not self.seconds:
+            return None
+
+        return self.rows / self.seconds
+
+    def add(self, other):
+        """Add another `TableTimings` (e.g. from a worker) to this one."""
+
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    @contextlib.contextmanager
+    def timing(self, step):
+        """Add the time spent in a `with` block to one of the steps."""
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            setattr(self, step,
+                    getattr(self, step) + time.perf_counter() - start)
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'read': self.read,
+            'convert': self.convert,
+            'insert': self.insert,
+            'rows_per_second': self.rows_per_second,
+        }
+
+
+class Histogram:
+    """A latency histogram, with buckets bounded by `LATENCY_BUCKETS`."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.seconds += duration
+        self.max = max(self.max, duration)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket the `q` quantile falls in,
+        or the maximum if it's in the last bucket.
+        """
+
+        target = q * self.count
+        seen = 0
+
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+
+            if count and seen >= target:
+                return min(bound, self.max)
+
+        return self.max
+
+    def as_dict(self):
+        labels = ['<={}'.format(bound) for bound in LATENCY_BUCKETS]
+        labels.append('>{}'.format(LATENCY_BUCKETS[-1]))
+
+        return {
+            'count': self.count,
+            'seconds': self.seconds,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': dict(zip(labels, self.buckets)),
+        }
+
+
+class Profiler:
+    """Collects statement timings from engines, and load timings from the
+    CLI.
+
+    It's safe to attach one profiler to engines used by several threads.
+    """
+
+    def __init__(self, slowest=DEFAULT_SLOWEST):
+        self.slowest_count = slowest
+        self.phases = {}
+        self.tables = {}
+        self.statement_count = 0
+        self.statement_seconds = 0.0
+        self.latency = {}
+
+        # A heap of (duration, tiebreaker, label, statement)
+        self._slowest = []
+        self._tiebreaker = itertools.count()
+        self._engines = []
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        """Start recording the statements executed on an engine."""
+
+        if engine in self._engines:
+            return
+
+        for name, func in self._listeners():
+            sa.event.listen(engine, name, func)
+
+        self._engines.append(engine)
+
+    def detach(self, engine=None):
+        """Stop recording statements on an engine, or on every engine."""
+
+        for attached in list(self._engines):
+            if engine is None or attached is engine:
+                for name, func in self._listeners():
+                    sa.event.remove(attached, name, func)
+
+                self._engines.remove(attached)
+
+    def _listeners(self):
+        return [
+            ('before_cursor_execute', self._before_cursor_execute),
+            ('after_cursor_execute', self._after_cursor_execute),
+            ('handle_error', self._handle_error),
+        ]
+
+    def _before_cursor_execute(self, connection, cursor, statement,
+                               parameters, context, executemany):
+        connection.info.setdefault('porydex_profiler_starts', []).append(
+            time.perf_counter())
+
+    def _after_cursor_execute(self, connection, cursor, statement,
+                              parameters, context, executemany):
+        duration = (time.perf_counter() -
+                    connection.info['porydex_profiler_starts'].pop())
+        self.record(statement_label(context), statement, duration)
+
+    def _handle_error(self, exception_context):
+        starts = exception_context.connection.info.get(
+            'porydex_profiler_starts')
+
+        if starts:
+            starts.pop()
+
+    def record(self, label, statement, duration):
+        """Record one statement's execution."""
+
+        with self._lock:
+            self.statement_count += 1
+            self.statement_seconds += duration
+            self.latency.setdefault(label, Histogram()).add(duration)
+
+            entry = (duration, next(self._tiebreaker), label, statement)
+
+            if len(self._slowest) < self.slowest_count:
+                heapq.heappush(self._slowest, entry)
+            elif self._slowest and duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def table(self, table_name):
+        """Return the `TableTimings` for a table, creating it if need be."""
+
+        try:
+            return self.tables[table_name]
+        except KeyError:
+            return self.tables.setdefault(table_name, TableTimings())
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Add the time spent in a `with` block to a named phase."""
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.phases[name] = (self.phases.get(name, 0.0) +
+                                 time.perf_counter() - start)
+
+    def slowest(self):
+        """Return a list of (duration, label, statement) tuples for the
+        slowest statements, slowest first.
+        """
+
+        with self._lock:
+            entries = sorted(self._slowest, reverse=True)
+
+        return [(duration, label, statement)
+                for duration, tiebreaker, label, statement in entries]
+
+    def report(self):
+        """Return everything recorded so far as a JSON-friendly dict."""
+
+        with self._lock:
+            latency = {label: histogram.as_dict()
+                       for label, histogram in sorted(self.latency.items())}
+            statements = {'count': self.statement_count,
+                          'seconds': self.statement_seconds}
+
+        return {
+            'phases': dict(self.phases),
+            'tables': {name: timings.as_dict()
+                       for name, timings in self.tables.items()},
+            'statements': statements,
+            'slowest': [
+                {'seconds': duration, 'label': label, 'statement': statement}
+                for duration, label, statement in self.slowest()
+            ],
+            'latency': latency,
+        }
+
+    def write_json(self, path):
+        """Write `report` to a file as JSON."""
+
+        with open(path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2)
+            report_file.write('\n')
+
+    def summary(self):
+        """Return a human-readable summary of `report`, as a string."""
+
+        report = self.report()
+        lines = []
+
+        if report['phases']:
+            lines.append('Phases:')
+            lines.extend('  {:<30} {:>9.3f}s'.format(name, seconds)
+                         for name, seconds in report['phases'].items())
+
+        if report['tables']:
+            lines.append('Tables:')
+            lines.append('  {:<30} {:>9} {:>9} {:>9} {:>9} {:>10}'.format(
+                'table', 'rows', 'read', 'convert', 'insert', 'rows/s'))
+
+            for name, timings in report['tables'].items():
+                rate = timings['rows_per_second']
+                lines.append(
+                    '  {:<30} {:>9} {:>8.3f}s {:>8.3f}s {:>8.3f}s {:>10}'
+                    .format(name, timings['rows'], timings['read'],
+                            timings['convert'], timings['insert'],
+                            '-' if rate is None else '{:.0f}'.format(rate)))
+
+        lines.append('Statements: {} in {:.3f}s'.format(
+            report['statements']['count'], report['statements']['seconds']))
+
+        if report['slowest']:
+            lines.append('Slowest statements:')
+            lines.extend(
+                '  {:>8.3f}s  {:<20} {}'.format(
+                    entry['seconds'], entry['label'],
+                    shorten(entry['statement'], 80))
+                for entry in report['slowest'])
+
+        if report['latency']:
+            lines.append('Latency by class:')
+            lines.append('  {:<30} {:>8} {:>9} {:>9} {:>9} {:>9}'.format(
+                'class', 'count', 'total', 'p50', 'p95', 'max'))
+            lines.extend(
+                '  {:<30} {:>8} {:>8.3f}s {:>8.4f}s {:>8.4f}s {:>8.4f}s'
+                .format(label, histogram['count'], histogram['seconds'],
+                        histogram['p50'], histogram['p95'], histogram['max'])
+                for label, histogram in report['latency'].items())
+
+        return '\n'.join(lines)
+
+
+_mapped_classes = {}
+
+def mapped_classes():
+    """Return a dict mapping every table in the schema to its mapped class."""
+
+    if not _mapped_classes:
+        classes = list(porydex.db.TableBase.__subclasses__())
+
+        while classes:
+            cls = classes.pop()
+            classes.extend(cls.__subclasses__())
+
+            table = getattr(cls, '__table__', None)
+            if table is not None:
+                _mapped_classes.setdefault(table, cls)
+
+    return _mapped_classes
+
+def statement_label(context):
+    """Return a label for the statement being executed in an execution
+    context, for grouping latency by: the name of the mapped class (or
+    failing that, the table) it selects from or modifies, or a description
+    in parentheses.
+    """
+
+    compiled = getattr(context, 'compiled', None)
+
+    if compiled is None:
+        return '(raw SQL)'
+    elif isinstance(compiled.statement, sa.schema.DDLElement):
+        return '(DDL)'
+
+    table = statement_table(compiled.statement)
+
+    if table is None:
+        return '(other)'
+
+    cls = mapped_classes().get(table)
+    return table.name if cls is None else cls.__name__
+
+def statement_table(statement):
+    """Return the table a statement modifies, or the table its first column
+    comes from, or None.
+    """
+
+    # INSERT, UPDATE, and DELETE
+    table = getattr(statement, 'table', None)
+
+    if table is None and isinstance(statement, sa.sql.Select):
+        for column in statement.inner_columns:
+            table = getattr(column, 'table', None)
+
+            if table is not None:
+                break
+
+    while isinstance(table, sa.sql.expression.Alias):
+        table = table.original
+
+    return table if isinstance(table, sa.Table) else None
+
+def shorten(statement, width):
+    """Squash a statement onto one line, no longer than `width`."""
+
+    statement = ' '.join(statement.split())
+
+    if len(statement) > width:
+        statement = statement[:width - 3] + '...'
+
+    return statement
+
+
+### Helpers for the CLI
+
+def connection_profiler(connection):
+    """Return the profiler a CLI connection is being profiled with, or
+    None.
+    """
+
+    return connection.info.get(INFO_KEY)
+
+def table_timings(connection, table_name):
+    """Return the `TableTimings` to record a table's load in, or None if the
+    connection isn't being profiled.
+    """
+
+    profiler = connection_profiler(connection)
+    return None if profiler is None else profiler.table(table_name)
+
+def timed(timings, step):
+    """Add the time spent in a `with` block to one step of a
+    `TableTimings`, if there is one.
+    """
+
+    if timings is None:
+        return contextlib.nullcontext()
+
+    return timings.timing(step)
+
+def phase(connection, name):
+    """Add the time spent in a `with` block to a phase of a profiled
+    connection's load, if it's being profiled.
+    """
+
+    profiler = connection_profiler(connection)
+
+    if profiler is None:
+        return contextlib.nullcontext()
+
+    return profiler.phase(name)
@@ -0,0 +1,251 @@
+"""Ranged CSVs for the per-game tables.
+
+pokemon_stats, pokemon_types, pokemon_abilities, and pokemon_egg_groups have
+a row for every game a Pokémon form appears in, even though most of their
+values only change every generation or so.  A ranged CSV stores each fact
+once, along with the range of games it applies to: the `game_id` column is
+replaced by `first_game_id` and `last_game_id`, and the row stands for one
+row in each game from the first to the last, inclusive, in game id order.
+
+Ranged CSVs are named e.g. pokemon_stats.ranged.csv, and take the place of
+the plain CSV; the CLI's `pack` and `unpack` commands convert between the
+two.  The database itself still has a row per game, so that the schema's
+foreign keys and relationships (e.g. `PokemonInstance.stats`) work as-is;
+ranged CSVs are expanded on the way in, and dump packs them back up.
+
+Ranged CSVs only save disk space.  Every row has to be expanded back in
+Python on the way in, so loading a packed table is slower than loading its
+plain CSV.  Expanding only holds the ranged rows in memory, and generates the
+plain rows one game at a time, so it doesn't take much more memory, at least.
+"""
+
+import csv
+import io
+
+
+RANGED_TABLES = (
+    'pokemon_stats',
+    'pokemon_types',
+    'pokemon_abilities',
+    'pokemon_egg_groups',
+)
+
+
+def ranged_headers(headers):
+    """Return the headers a ranged CSV has in place of a plain one's."""
+
+    position = headers.index('game_id')
+    return (headers[:position] + ('first_game_id', 'last_game_id') +
+            headers[position + 1:])
+
+def pack_rows(headers, rows, game_ids):
+    """Pack a plain CSV's rows into ranges.
+
+    `headers` are the plain CSV's headers; `rows` are lists of strings, and
+    `game_ids` is every game id, in order.  Rows are grouped by everything
+    but their game, and each run of consecutive games in a group becomes one
+    ranged row.  Return a list of ranged rows, in no particular order.
+    """
+
+    position = headers.index('game_id')
+    game_positions = {str(game_id): index
+                      for index, game_id in enumerate(game_ids)}
+    game_ids = [str(game_id) for game_id in game_ids]
+    runs = {}
+
+    for row in rows:
+        fact = tuple(row[:position]) + tuple(row[position + 1:])
+        runs.setdefault(fact, []).append(game_positions[row[position]])
+
+    ranged_rows = []
+
+    for fact, positions in runs.items():
+        positions.sort()
+        first = previous = positions[0]
+
+        for game_position in positions[1:] + [None]:
+            if game_position is not None and game_position == previous + 1:
+                previous = game_position
+                continue
+
+            ranged_rows.append(
+                fact[:position] + (game_ids[first], game_ids[previous]) +
+                fact[position:])
+            first = previous = game_position
+
+    return ranged_rows
+
+def primary_key_sorter(table, headers):
+    """Return a sort key function for plain rows of strings that puts them
+    in primary key order, the way dump writes them.
+    """
+
+    parts = []
+
+    for column in table.primary_key.columns:
+        index = headers.index(column.name)
+        enum_class = getattr(column.type, 'enum_class', None)
+
+        if enum_class is not None:
+            order = {member.name: n for n, member in enumerate(enum_class)}
+            parts.append((index, order.__getitem__))
+        elif column.type.python_type is int:
+            parts.append((index, int))
+        else:
+            parts.append((index, str))
+
+    def sort_key(row):
+        return tuple(convert(row[index]) for index, convert in parts)
+
+    return sort_key
+
+def expand_csv(table, ranged_csv, game_ids):
+    """Expand an open ranged CSV into a plain one.
+
+    Return an `ExpandedCSV` that reads like the plain CSV, with its rows in
+    primary key order.  The ranged rows are all read up front, so
+    `ranged_csv` can be closed straight away.
+    """
+
+    reader = csv.reader(ranged_csv)
+    ranged_header_row = next(reader)
+    headers = tuple(
+        name for name in ranged_header_row if name != 'last_game_id')
+    headers = tuple('game_id' if name == 'first_game_id' else name
+                    for name in headers)
+
+    return ExpandedCSV(expanded_lines(
+        table, ranged_header_row, headers, list(reader), game_ids))
+
+def expanded_lines(table, ranged_header_row, headers, rows, game_ids):
+    """Yield the lines of a plain CSV, header first, for a ranged CSV's
+    rows, in primary key order.
+
+    Every ranged table's primary key starts with game_id, so the plain rows
+    are generated a game at a time: each game's are the ranged rows whose
+    range covers it, in order of the rest of the key.
+    """
+
+    if table.primary_key.columns.values()[0].name != 'game_id':
+        raise ValueError("{}'s primary key doesn't start with game_id"
+                         .format(table.name))
+
+    position = ranged_header_row.index('first_game_id')
+    game_positions = {str(game_id): index
+                      for index, game_id in enumerate(game_ids)}
+    sort_key = primary_key_sorter(table, headers)
+
+    # (first game position, last game position, plain row)
+    facts = []
+
+    for row in rows:
+        first = game_positions[row[position]]
+        last = game_positions[row[position + 1]]
+
+        if last < first:
+            raise ValueError('Game range {}-{} is backwards'.format(
+                row[position], row[position + 1]))
+
+        facts.append((first, last, row[:position + 1] + row[position + 2:]))
+
+    # (The game id is the first part of the key, and the same for every row
+    # in a game)
+    facts.sort(key=lambda fact: sort_key(fact[2])[1:])
+
+    yield from csv_lines([headers])
+
+    for game_position, game_id in enumerate(game_ids):
+        game_id = str(game_id)
+        game_rows = []
+
+        for first, last, row in facts:
+            if first <= game_position <= last:
+                row[position] = game_id
+                game_rows.append(row)
+
+        yield from csv_lines(game_rows)
+
+def csv_lines(rows):
+    """Return a list of the lines of a CSV with some rows."""
+
+    plain_csv = io.StringIO(newline='')
+    csv.writer(plain_csv, lineterminator='\n').writerows(rows)
+    return plain_csv.getvalue().splitlines(keepends=True)
+
+
+class ExpandedCSV(io.TextIOBase):
+    """A read-only text file whose lines come from an iterator."""
+
+    def __init__(self, lines):
+        super().__init__()
+        self._lines = iter(lines)
+        # What's left of the line being read, if it's been read partway
+        self._rest = ''
+
+    def readable(self):
+        return True
+
+    def __iter__(self):
+        self._checkClosed()
+
+        if self._rest:
+            line, self._rest = self._rest, ''
+            yield line
+
+        yield from self._lines
+
+    def readline(self, size=-1):
+        self._checkClosed()
+        line = self._rest or next(self._lines, '')
+
+        if size is None or size < 0 or size >= len(line):
+            self._rest = ''
+            return line
+
+        line, self._rest = line[:size], line[size:]
+        return line
+
+    def read(self, size=-1):
+        self._checkClosed()
+
+        if size is None or size < 0:
+            text = self._rest + ''.join(self._lines)
+            self._rest = ''
+            return text
+
+        chunks = []
+
+        while size > 0:
+            line = self.readline(size)
+
+            if not line:
+                break
+
+            chunks.append(line)
+            size -= len(line)
+
+        return ''.join(chunks)
+
+def pack_csv(table, plain_csv, ranged_csv, game_ids):
+    """Pack an open plain CSV into an open ranged one."""
+
+    reader = csv.reader(plain_csv)
+    headers = tuple(next(reader))
+
+    writer = csv.writer(ranged_csv, lineterminator='\n')
+    writer.writerow(ranged_headers(headers))
+
+    ranged_rows = pack_rows(headers, reader, game_ids)
+    plain_sort_key = primary_key_sorter(table, headers)
+    position = headers.index('game_id')
+    game_key_position = [column.name for column in table.primary_key.columns
+                         ].index('game_id')
+
+    # Sort by primary key, using the first game but putting it last, so that
+    # each form's facts stay together
+    def sort_key(row):
+        key = plain_sort_key(row[:position + 1] + row[position + 2:])
+        return (key[:game_key_position] + key[game_key_position + 1:] +
+                key[game_key_position:game_key_position + 1])
+
+    writer.writerows(sorted(ranged_rows, key=sort_key))
@@ -1,4 +1,5 @@
 import sqlalchemy as sa
+import sqlalchemy.orm
 
 from porydex.db.schema.game import Game
 from porydex.db.schema.language import ByLanguage, Language
@@ -16,6 +17,12 @@ class EggGroup(TableBase, ByLanguage):
     id = sa.Column(sa.Integer, primary_key=True)
     identifier = sa.Column(sa.Unicode, unique=True, nullable=False)
 
+    pokemon_instances = sa.orm.relationship(
+        'PokemonInstance',
+        secondary='pokemon_egg_groups',
+        backref=sa.orm.backref('egg_groups', order_by='EggGroup.id')
+    )
+
 class EggGroupName(TableBase):
     """An egg group's name in a particular language."""
 
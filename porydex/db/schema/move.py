@@ -6,7 +6,8 @@ import sqlalchemy.orm
 from .game import Game
 from .language import ByLanguage
 from .pokemon import (
-    Pokemon, PokemonForm, pokemon_form_key, pokemon_instance_key)
+    Pokemon, PokemonForm, PokemonInstance, pokemon_form_key,
+    pokemon_instance_key)
 from ..core import TableBase
 
 
@@ -177,5 +178,11 @@ class PokemonMoveListMap(TableBase):
 
     pokemon_move_list = sa.orm.relationship(PokemonMoveList)
     game = sa.orm.relationship(Game)
+    pokemon_instance = sa.orm.relationship(
+        PokemonInstance,
+        backref=sa.orm.backref(
+            'move_list_maps', order_by=method, viewonly=True),
+        viewonly=True  # game_id is already set by game
+    )
 
     __table_args__ = (pokemon_form_key(), pokemon_instance_key())
@@ -0,0 +1,384 @@
+"""A search index over every name table, for autocompletion.
+
+Names are folded before they're indexed, and queries are folded the same
+way, so that matching ignores case, accents, full-width vs half-width forms,
+and hiragana vs katakana; Japanese names are also indexed in Hepburn romaji,
+so that "pikachu" finds ピカチュウ.  Each folded name goes in a sorted array,
+along with every word in it after the first, so a prefix search is a binary
+search plus a scan over the matches.  When there aren't enough prefix
+matches, a trigram index fills in fuzzy matches for typos.
+
+    index = load_index(connection)
+    index.search('pika')  # [Hit(kind='pokemon', id=25, ...), ...]
+
+Building the index takes a moment, so `load_index` pickles it into the cache
+directory, named after a hash of all the names, and only rebuilds it when
+the names change.
+"""
+
+import bisect
+import collections
+import glob
+import hashlib
+import os
+import pickle
+import tempfile
+import unicodedata
+
+import sqlalchemy as sa
+
+import porydex.db
+from porydex.db.core import default_cache_dir
+
+
+# Bump this whenever the folding or the index's structure changes
+INDEX_VERSION = 1
+
+# (kind, name table, key columns, name columns); hits are reported with the
+# first name column, and any others are just extra keys to match
+SOURCES = (
+    ('pokemon', 'pokemon_names', ('pokemon_id',), ('name',)),
+    ('form', 'pokemon_form_names', ('pokemon_id', 'form_id'),
+     ('full_name', 'form_name')),
+    ('move', 'move_names', ('move_id',), ('name',)),
+    ('ability', 'ability_names', ('ability_id',), ('name',)),
+    ('type', 'type_names', ('type_id',), ('name',)),
+    ('stat', 'stat_names', ('stat_id',), ('name', 'abbreviation')),
+    ('egg_group', 'egg_group_names', ('egg_group_id',), ('name',)),
+)
+
+# How well a key has to match to count as a fuzzy hit, as a Dice coefficient
+# of trigrams
+FUZZY_THRESHOLD = 0.4
+
+# Ranks for the different ways of matching; the score of a hit is its rank
+# plus the fraction of the key the query covers
+EXACT, PREFIX, WORD_PREFIX = 3, 2, 1
+
+
+Hit = collections.namedtuple('Hit', 'kind id language_id name score')
+Hit.__doc__ = """A search result.
+
+`id` is an int, except for forms, where it's a (pokemon_id, form_id) pair.
+"""
+
+
+### Folding
+
+HIRAGANA_ROMAJI = dict(zip(
+    'あいうえおかきくけこがぎぐげごさしすせそざじずぜぞたちつてとだぢづでど'
+    'なにぬねのはひふへほばびぶべぼぱぴぷぺぽまみむめもやゆよらりるれろ'
+    'わゐゑをんゔ',
+    'a i u e o ka ki ku ke ko ga gi gu ge go sa shi su se so za ji zu ze zo '
+    'ta chi tsu te to da ji zu de do na ni nu ne no ha hi fu he ho '
+    'ba bi bu be bo pa pi pu pe po ma mi mu me mo ya yu yo ra ri ru re ro '
+    'wa i e o n vu'.split()
+))
+SMALL_VOWELS = dict(zip('ぁぃぅぇぉ', 'aiueo'))
+SMALL_Y = dict(zip('ゃゅょ', 'auo'))
+SOKUON = 'っ'
+CHOONPU = 'ー'
+
+# Combining marks to keep: the kana voicing marks
+KANA_MARKS = {'゙', '゚'}
+
+
+def fold(text):
+    """Fold a name or a query for matching.
+
+    This applies compatibility normalization (which folds full-width Latin
+    and half-width kana), case folding, strips accents, and converts
+    katakana to hiragana.
+    """
+
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text
+                   if char in KANA_MARKS or not unicodedata.combining(char))
+    text = unicodedata.normalize('NFC', text)
+
+    return ''.join(
+        chr(ord(char) - 0x60) if 'ァ' <= char <= 'ヶ' else char
+        for char in text
+    )
+
+def romaji(text):
+    """Convert the hiragana in some folded text to Hepburn romaji, or return
+    None if there's no kana to convert.
+    """
+
+    syllables = []
+    double_next = False
+    converted = False
+
+    for char in text:
+        if char in HIRAGANA_ROMAJI:
+            syllable = HIRAGANA_ROMAJI[char]
+
+            if double_next:
+                syllable = ('t' if syllable.startswith('ch') else
+                            syllable[0]) + syllable
+                double_next = False
+
+            syllables.append(syllable)
+        elif char in SMALL_Y and syllables and syllables[-1].endswith('i'):
+            # きゃ -> kya, しゃ -> sha
+            stem = syllables[-1][:-1]
+            glide = '' if stem.endswith(('sh', 'ch', 'j')) else 'y'
+            syllables[-1] = stem + glide + SMALL_Y[char]
+        elif char in SMALL_VOWELS and syllables:
+            # ファ -> fa, ティ -> ti, ウィ -> wi
+            stem = syllables[-1][:-1] or 'w'
+            syllables[-1] = stem + SMALL_VOWELS[char]
+        elif char in SMALL_VOWELS or char in SMALL_Y:
+            syllables.append((SMALL_VOWELS.get(char) or SMALL_Y[char]))
+        elif char == SOKUON:
+            double_next = True
+        elif char == CHOONPU:
+            pass
+        else:
+            syllables.append(char)
+            continue
+
+        converted = True
+
+    return ''.join(syllables) if converted else None
+
+def word_starts(key):
+    """Yield the positions in a key where a word other than the first
+    starts.
+    """
+
+    for position in range(1, len(key)):
+        if key[position].isalnum() and not key[position - 1].isalnum():
+            yield position
+
+def trigrams(key):
+    """Return the set of trigrams in a key, padded so that the start of the
+    key counts for more.
+    """
+
+    padded = '  {} '.format(key)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+### The index
+
+class SearchIndex:
+    """A prefix and trigram index over names.
+
+    `entries` is a list of (kind, id, language_id, name) tuples.  `keys` is
+    a sorted list of folded names and words, and `postings` is the matching
+    list of (entry index, rank) pairs, where the rank says whether the key is
+    the whole name (PREFIX) or a later word in it (WORD_PREFIX).  `grams`
+    maps trigrams to sorted lists of entry indexes, and `gram_counts` is how
+    many trigrams each entry's name has.
+    """
+
+    def __init__(self, entries, keys, postings, grams, gram_counts,
+                 name_hash=None):
+        self.entries = entries
+        self.keys = keys
+        self.postings = postings
+        self.grams = grams
+        self.gram_counts = gram_counts
+        self.name_hash = name_hash
+
+    @classmethod
+    def build(cls, names, name_hash=None):
+        """Build an index from an iterable of (kind, id, language_id, name,
+        other names) tuples.
+        """
+
+        entries = []
+        indexed_keys = []
+        grams = collections.defaultdict(set)
+        gram_counts = []
+
+        for kind, id, language_id, name, other_names in names:
+            entry = len(entries)
+            entries.append((kind, id, language_id, name))
+            gram_counts.append(len(trigrams(fold(name))))
+
+            for each_name in (name, *other_names):
+                folded = fold(each_name)
+                keys = {folded}
+
+                if romaji(folded) is not None:
+                    keys.add(romaji(folded))
+
+                for key in keys:
+                    indexed_keys.append((key, entry, PREFIX))
+                    indexed_keys.extend(
+                        (key[position:], entry, WORD_PREFIX)
+                        for position in word_starts(key)
+                    )
+
+                    for gram in trigrams(key):
+                        grams[gram].add(entry)
+
+        indexed_keys.sort()
+
+        return cls(
+            entries,
+            [key for key, entry, rank in indexed_keys],
+            [(entry, rank) for key, entry, rank in indexed_keys],
+            {gram: sorted(gram_entries)
+             for gram, gram_entries in grams.items()},
+            gram_counts,
+            name_hash
+        )
+
+    def search(self, query, limit=10, kinds=None, language_id=None):
+        """Search for names matching a query.
+
+        Return up to `limit` hits, best first, at most one per thing and
+        language.  Prefix matches always rank above fuzzy ones.  `kinds` and
+        `language_id` restrict the results.
+        """
+
+        query = fold(query).strip()
+
+        if not query:
+            return []
+
+        scores = {}
+
+        def add(entry, score):
+            kind, id, entry_language_id, name = self.entries[entry]
+
+            if kinds is not None and kind not in kinds:
+                return
+            elif language_id is not None and entry_language_id != language_id:
+                return
+
+            if score > scores.get(entry, 0):
+                scores[entry] = score
+
+        position = bisect.bisect_left(self.keys, query)
+
+        while (position < len(self.keys) and
+               self.keys[position].startswith(query)):
+            key = self.keys[position]
+            entry, rank = self.postings[position]
+            rank = EXACT if key == query and rank == PREFIX else rank
+            add(entry, rank + len(query) / len(key))
+            position += 1
+
+        if len(scores) < limit:
+            self._fuzzy_search(query, add)
+
+        best = {}
+
+        for entry, score in scores.items():
+            kind, id, entry_language_id, name = self.entries[entry]
+            hit = Hit(kind, id, entry_language_id, name, score)
+            thing = (kind, id, entry_language_id)
+
+            if thing not in best or hit.score > best[thing].score:
+                best[thing] = hit
+
+        return sorted(best.values(),
+                      key=lambda hit: (-hit.score, len(hit.name), hit.name)
+                      )[:limit]
+
+    def _fuzzy_search(self, query, add):
+        query_grams = trigrams(query)
+        counts = collections.Counter()
+
+        for gram in query_grams:
+            counts.update(self.grams.get(gram, ()))
+
+        for entry, count in counts.items():
+            dice = 2 * count / (len(query_grams) + self.gram_counts[entry])
+
+            if dice >= FUZZY_THRESHOLD:
+                add(entry, min(dice, 1) * 0.99)
+
+
+### Loading and caching
+
+def fetch_names(connection):
+    """Return a list of every name in the database, as the tuples that
+    `SearchIndex.build` takes.
+    """
+
+    tables = porydex.db.TableBase.metadata.tables
+    names = []
+
+    for kind, table_name, key_columns, name_columns in SOURCES:
+        table = tables[table_name]
+        query = (
+            sa.select([table.c[column] for column in
+                       key_columns + ('language_id',) + name_columns])
+            .order_by(*table.primary_key.columns)
+        )
+        width = len(key_columns)
+
+        for row in connection.execute(query):
+            id = row[0] if width == 1 else tuple(row[:width])
+            names.append((kind, id, row[width], row[width + 1],
+                          tuple(row[width + 2:])))
+
+    return names
+
+def names_hash(names):
+    """Return a hash of a list of names from `fetch_names`."""
+
+    sha256 = hashlib.sha256(str(INDEX_VERSION).encode())
+
+    for name in names:
+        sha256.update(repr(name).encode('UTF-8'))
+        sha256.update(b'\n')
+
+    return sha256.hexdigest()
+
+def load_index(connection, directory=None):
+    """Return a search index for the names in the database.
+
+    The index is loaded from `directory` (by default, the same cache
+    directory as prebuilt databases) if it's been built for these names
+    before; otherwise it's built and saved there, and any indexes for older
+    names are removed.
+    """
+
+    if directory is None:
+        directory = default_cache_dir()
+
+    names = fetch_names(connection)
+    name_hash = names_hash(names)
+    path = os.path.join(directory, 'search-{}.pickle'.format(name_hash[:16]))
+
+    try:
+        with open(path, 'rb') as index_file:
+            index = pickle.load(index_file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        pass
+    else:
+        if index.name_hash == name_hash:
+            return index
+
+    index = SearchIndex.build(names, name_hash)
+    save_index(index, path)
+
+    for old_path in glob.glob(os.path.join(directory, 'search-*.pickle')):
+        if old_path != path:
+            os.remove(old_path)
+
+    return index
+
+def save_index(index, path):
+    """Pickle an index to a file, atomically."""
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+    try:
+        with open(fd, 'wb') as index_file:
+            pickle.dump(index, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
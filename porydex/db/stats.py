@@ -0,0 +1,244 @@
+"""Vectorized stat queries over a game's Pokémon, computed with NumPy.
+
+pokemon_stats is pivoted into one matrix per game, with a row per Pokémon
+instance (in form order) and a column per stat, so that questions like "base
+stat total at least 600, sorted by Speed" are a few array operations:
+
+    stats = game_stats(connection, game_id)
+    result = stats.select(stats.totals() >= 600, order_by=SPEED_ID, limit=10)
+    result.pokemon_ids, result.form_ids, result.values, result.percentiles
+
+Transient stats (Accuracy and Evasion) never get a column.  Effort yields are
+null for whole games (Gen 1-2 and Let's Go), so they come with a mask.
+
+NumPy is an optional dependency: install porydex[numpy] to use this module.
+Pivoted games are cached per engine, and the cache is cleared whenever
+porydex changes the data (load, sync, and so on; see
+`porydex.db.core.register_invalidation_hook`).  Anything else that changes
+the data should call `clear_cache`.
+"""
+
+import weakref
+
+import numpy
+import sqlalchemy as sa
+
+import porydex.db
+from porydex.db.core import register_invalidation_hook
+
+
+# {engine: {game_id: GameStats}}
+_cache = weakref.WeakKeyDictionary()
+
+
+class GameStats:
+    """Every Pokémon instance's stats in one game.
+
+    `pokemon_ids` and `form_ids` identify the rows, in form order, and
+    `stat_ids` the columns, in stat id order.  `base_stats` and
+    `effort_yields` are integer matrices; `missing` is true where an instance
+    has no row for a stat at all, and `effort_null` where its effort yield is
+    null.  Missing and null values are stored as 0.
+    """
+
+    def __init__(self, game_id, pokemon_ids, form_ids, stat_ids, base_stats,
+                 effort_yields, missing, effort_null):
+        self.game_id = game_id
+        self.pokemon_ids = pokemon_ids
+        self.form_ids = form_ids
+        self.stat_ids = tuple(stat_ids)
+        self.stat_indexes = {
+            stat_id: index for index, stat_id in enumerate(self.stat_ids)}
+        self.base_stats = base_stats
+        self.effort_yields = effort_yields
+        self.missing = missing
+        self.effort_null = effort_null
+
+        for array in (pokemon_ids, form_ids, base_stats, effort_yields,
+                      missing, effort_null):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.pokemon_ids)
+
+    def column(self, stat_id):
+        """Return a stat's column index.
+
+        Raise KeyError if the game doesn't have the stat.
+        """
+
+        try:
+            return self.stat_indexes[stat_id]
+        except KeyError:
+            raise KeyError('Stat {} is not in game {}'.format(
+                stat_id, self.game_id)) from None
+
+    def base(self, stat_id):
+        """Return every instance's base value for a stat, masked where it's
+        missing.
+        """
+
+        index = self.column(stat_id)
+        return numpy.ma.MaskedArray(
+            self.base_stats[:, index], self.missing[:, index])
+
+    def effort(self, stat_id):
+        """Return every instance's effort yield for a stat, masked where it's
+        null.
+        """
+
+        index = self.column(stat_id)
+        return numpy.ma.MaskedArray(
+            self.effort_yields[:, index], self.effort_null[:, index])
+
+    def totals(self):
+        """Return every instance's base stat total."""
+
+        return self.base_stats.sum(axis=1)
+
+    def select(self, where=None, order_by='total', descending=True,
+               limit=None):
+        """Filter, sort, and rank the instances in one go.
+
+        `where` is a boolean array with one value per instance, e.g.
+        `stats.totals() >= 600`; masked values count as false.  `order_by` is
+        a stat id, or 'total' for base stat totals.  Ties keep form order.
+        Return a `StatSelection` of up to `limit` instances.
+        """
+
+        if order_by == 'total':
+            values = self.totals()
+            unknown = self.missing.any(axis=1)
+        else:
+            index = self.column(order_by)
+            values = self.base_stats[:, index]
+            unknown = self.missing[:, index]
+
+        rows = numpy.arange(len(self))
+
+        if where is not None:
+            rows = rows[numpy.ma.filled(where, False)]
+
+        rows = rows[~unknown[rows]]
+        keys = -values[rows] if descending else values[rows]
+        rows = rows[numpy.argsort(keys, kind='stable')][:limit]
+
+        # Percentiles are among every instance in the game with a value,
+        # not just the ones that passed the filter
+        known = numpy.sort(values[~unknown])
+        percentiles = (numpy.searchsorted(known, values[rows], side='right')
+                       * 100 / max(len(known), 1))
+
+        return StatSelection(self, rows, values[rows], percentiles)
+
+
+class StatSelection:
+    """The result of `GameStats.select`.
+
+    `rows` are indexes into the game's matrices, and `values` the values the
+    instances were sorted by.  `percentiles` is the percentage of instances
+    in the game whose value is at most each instance's.
+    """
+
+    def __init__(self, game_stats, rows, values, percentiles):
+        self.rows = rows
+        self.pokemon_ids = game_stats.pokemon_ids[rows]
+        self.form_ids = game_stats.form_ids[rows]
+        self.values = values
+        self.totals = game_stats.base_stats[rows].sum(axis=1)
+        self.base_stats = game_stats.base_stats[rows]
+        self.percentiles = percentiles
+
+    def __len__(self):
+        return len(self.rows)
+
+    def keys(self):
+        """Return a list of (pokemon_id, form_id) pairs, in order."""
+
+        return list(zip(self.pokemon_ids.tolist(), self.form_ids.tolist()))
+
+
+def game_stats(connection, game_id):
+    """Return a game's stats pivoted into a `GameStats`, from the cache if
+    it's been pivoted before.
+    """
+
+    cache = _cache.setdefault(connection.engine, {})
+
+    try:
+        return cache[game_id]
+    except KeyError:
+        return cache.setdefault(
+            game_id, pivot_game_stats(connection, game_id))
+
+def clear_cache(engine=None):
+    """Forget pivoted games, for one engine or for all of them."""
+
+    if engine is None:
+        _cache.clear()
+    else:
+        _cache.pop(engine, None)
+
+register_invalidation_hook(clear_cache)
+
+def pivot_game_stats(connection, game_id):
+    """Pivot a game's stats from the database, without using the cache.
+
+    Raise ValueError if the game has no Pokémon.
+    """
+
+    tables = porydex.db.TableBase.metadata.tables
+    stats = tables['stats']
+    instances = tables['pokemon_instances']
+    forms = tables['pokemon_forms']
+    pokemon_stats = tables['pokemon_stats']
+
+    keys = connection.execute(
+        sa.select([instances.c.pokemon_id, instances.c.form_id])
+        .select_from(instances.join(forms))
+        .where(instances.c.game_id == game_id)
+        .order_by(forms.c.order)
+    ).fetchall()
+
+    if not keys:
+        raise ValueError('No Pokémon in game {}'.format(game_id))
+
+    positions = {tuple(key): position for position, key in enumerate(keys)}
+
+    rows = connection.execute(
+        sa.select([pokemon_stats.c.pokemon_id, pokemon_stats.c.form_id,
+                   pokemon_stats.c.stat_id, pokemon_stats.c.base_stat,
+                   pokemon_stats.c.effort_yield])
+        .select_from(pokemon_stats.join(stats))
+        .where(pokemon_stats.c.game_id == game_id)
+        .where(sa.not_(stats.c.is_transient))
+    ).fetchall()
+
+    stat_ids = sorted({row.stat_id for row in rows})
+    columns = {stat_id: index for index, stat_id in enumerate(stat_ids)}
+    shape = (len(keys), len(stat_ids))
+
+    base_stats = numpy.zeros(shape, dtype=numpy.int32)
+    effort_yields = numpy.zeros(shape, dtype=numpy.int32)
+    missing = numpy.ones(shape, dtype=bool)
+    effort_null = numpy.ones(shape, dtype=bool)
+
+    for pokemon_id, form_id, stat_id, base_stat, effort_yield in rows:
+        position = (positions[pokemon_id, form_id], columns[stat_id])
+        base_stats[position] = base_stat
+        missing[position] = False
+
+        if effort_yield is not None:
+            effort_yields[position] = effort_yield
+            effort_null[position] = False
+
+    return GameStats(
+        game_id,
+        numpy.array([key.pokemon_id for key in keys], dtype=numpy.int64),
+        numpy.array([key.form_id for key in keys], dtype=numpy.int64),
+        stat_ids,
+        base_stats,
+        effort_yields,
+        missing,
+        effort_null
+    )
@@ -0,0 +1,423 @@
+"""Checking the CSVs against the schema's constraints, without a database.
+
+A bad foreign key or a duplicate key otherwise only turns up as a database
+error partway through a load, after which the whole transaction is rolled
+back (or, on SQLite, which doesn't enforce foreign keys, not at all).
+`validate_csvs` instead checks every CSV up front, entirely in memory, and
+reports every problem it finds in one go:
+
+    porydex sqlite:///porydex.sqlite validate
+
+`load` and `reload` validate first, unless given --no-validate.
+
+Each table's CSV is read and checked in a worker process: every value must
+convert for its column (which covers enum membership), every column that
+can't be null must be present and non-empty, and the primary key, unique
+constraints, and unique indexes must hold.  The workers also send back sets
+of every key other tables refer to, and of every foreign key value the table
+has, which are then checked against each other, composite keys and all.
+Keys are built a column at a time, rather than row by row, and the lines a
+missing foreign key value is on are only looked up when there is one.
+
+As in the database, unique constraints and foreign keys ignore keys with a
+null in them.  Unique indexes on expressions other than columns, constants,
+and `coalesce` are skipped.  Lines in ranged CSVs are lines of the expanded
+CSV; see `porydex.db.ranged`.
+"""
+
+import concurrent.futures
+import csv
+import itertools
+import operator
+import os
+
+import sqlalchemy as sa
+
+import porydex.db
+import porydex.db.convert
+import porydex.db.csvs
+
+
+class Violation:
+    """A row in a CSV that breaks one of the schema's constraints."""
+
+    __slots__ = ('path', 'line', 'message')
+
+    def __init__(self, path, line, message):
+        self.path = path
+        self.line = line
+        self.message = message
+
+    def __repr__(self):
+        return '<Violation {}>'.format(self)
+
+    def __str__(self):
+        return '{}, line {}: {}'.format(self.path, self.line, self.message)
+
+
+class ValidationError(ValueError):
+    """Raised when the CSVs have any violations."""
+
+    def __init__(self, violations):
+        super().__init__(violations)
+        self.violations = violations
+
+    def __str__(self):
+        return '{} problem{} in the CSVs'.format(
+            len(self.violations), '' if len(self.violations) == 1 else 's')
+
+
+class TableRows:
+    """A table's CSV, read and converted.
+
+    `rows` are the tuples of values that converted, and `lines` the line
+    each one ended on; `violations` are the rows that didn't convert.
+    """
+
+    def __init__(self, table, path, headers=(), rows=(), lines=(),
+                 violations=()):
+        self.table = table
+        self.path = path
+        self.positions = {name: index for index, name in enumerate(headers)}
+        self.rows = list(rows)
+        self.lines = list(lines)
+        self.violations = list(violations)
+
+    def keys(self, expressions):
+        """Return a list of tuples of some columns' (or other index
+        expressions') values, one for each row, or None if an expression
+        can't be evaluated here.
+        """
+
+        columns = [self.values(expression) for expression in expressions]
+
+        if None in columns:
+            return None
+
+        return list(zip(*columns))
+
+    def values(self, expression):
+        """Return an iterable of an index expression's value for each row,
+        or None if it can't be evaluated here.
+        """
+
+        if isinstance(expression, sa.Column):
+            try:
+                position = self.positions[expression.name]
+            except KeyError:
+                # A nullable column can be left out of the CSV entirely
+                return itertools.repeat(None, len(self.rows))
+
+            return map(operator.itemgetter(position), self.rows)
+        elif isinstance(expression, sa.sql.elements.BindParameter):
+            return itertools.repeat(expression.value, len(self.rows))
+        elif isinstance(expression, sa.sql.functions.coalesce):
+            keys = self.keys(expression.clauses)
+            return None if keys is None else map(coalesce, keys)
+
+        return None
+
+
+class TableResult:
+    """What checking one table's CSV found.
+
+    `keys` maps each tuple of column names that other tables refer to onto
+    the set of their values, or is None if the CSV's headers were wrong,
+    so that there's nothing to check against.  `references` maps each of
+    the table's foreign key constraints (by position in
+    `sorted_foreign_keys`) onto the set of values it refers to.
+    """
+
+    __slots__ = ('table_name', 'path', 'violations', 'keys', 'references')
+
+    def __init__(self, table_name, path):
+        self.table_name = table_name
+        self.path = path
+        self.violations = []
+        self.keys = {}
+        self.references = {}
+
+
+def validate_csvs(jobs=None):
+    """Check every table's CSV, in `jobs` worker processes (by default, one
+    per CPU), and return a list of every `Violation`, in table order and
+    then line order.
+    """
+
+    tables = porydex.db.TableBase.metadata.sorted_tables
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(
+                check_table, [table.name for table in tables]))
+    else:
+        results = [check_table(table.name) for table in tables]
+
+    results = {result.table_name: result for result in results}
+    violations = []
+
+    for table in tables:
+        result = results[table.name]
+        violations.extend(sorted(
+            result.violations + check_references(table, result, results),
+            key=operator.attrgetter('line')))
+
+    return violations
+
+def check_table(table_name):
+    """Read and check a table's CSV, in a worker process; return a
+    `TableResult`.
+    """
+
+    table = porydex.db.TableBase.metadata.tables[table_name]
+    table_rows = read_table(table)
+    result = TableResult(table.name, table_rows.path)
+    result.violations = table_rows.violations
+
+    if not table_rows.positions:
+        if table_rows.violations:
+            result.keys = None
+
+        return result
+
+    for name, expressions, nulls_count in unique_keys(table):
+        keys = table_rows.keys(expressions)
+
+        if keys is not None:
+            result.violations.extend(duplicate_violations(
+                table_rows, name, keys, nulls_count))
+
+    result.keys = {
+        names: non_null(table_rows.keys(table.c[name] for name in names))
+        for names in referenced_columns(table)
+    }
+    result.references = {
+        index: non_null(table_rows.keys(constraint.columns))
+        for index, constraint in enumerate(sorted_foreign_keys(table))
+    }
+
+    return result
+
+def read_table(table):
+    """Read and convert a table's CSV; return a `TableRows`.
+
+    A table without a CSV has no rows, and no violations; one whose headers
+    are wrong has no rows, and a violation for each bad header.
+    """
+
+    try:
+        table_csv = porydex.db.csvs.open_csv(table)
+    except FileNotFoundError:
+        return TableRows(table, porydex.db.csvs.csv_path(table))
+
+    with table_csv:
+        return read_rows(table, table_csv)
+
+def read_rows(table, table_csv):
+    """Read and convert the rows in an open CSV for a table; return a
+    `TableRows`.
+    """
+
+    path = getattr(table_csv, 'name', '{}.csv'.format(table.name))
+    reader = csv.reader(table_csv)
+    headers = tuple(next(reader, ()))
+
+    violations = [
+        Violation(path, 1, 'no column {} in {}'.format(name, table.name))
+        for name in headers if name not in table.c
+    ]
+    violations.extend(
+        Violation(path, 1, 'missing required column {}'.format(column.name))
+        for column in table.c
+        if required(column) and column.name not in headers)
+
+    if violations:
+        return TableRows(table, path, violations=violations)
+
+    convert = porydex.db.convert.compile_converter(table, headers)
+
+    # Empty strings convert fine for text columns, but stand for null
+    text_positions = [index for index, name in enumerate(headers)
+                      if not table.c[name].nullable and
+                      isinstance(table.c[name].type, sa.String)]
+
+    rows = []
+    lines = []
+
+    for row in reader:
+        try:
+            values = convert(row)
+
+            for position in text_positions:
+                if values[position] == '':
+                    raise ValueError('Missing value')
+        except ValueError:
+            violations.append(
+                row_violation(table, headers, row, path, reader.line_num))
+            continue
+
+        rows.append(values)
+        lines.append(reader.line_num)
+
+    return TableRows(table, path, headers, rows, lines, violations)
+
+def row_violation(table, headers, row, path, line):
+    """Return a `Violation` explaining why a row didn't convert."""
+
+    if len(row) == len(headers):
+        for name, value in zip(headers, row):
+            if value == '' and not table.c[name].nullable:
+                return Violation(path, line, 'missing value for {}'
+                                 .format(name))
+
+    error = porydex.db.convert.conversion_error(
+        table, headers, row, path, line)
+    return Violation(error.path, error.line, error.message)
+
+def duplicate_violations(table_rows, name, keys, nulls_count):
+    """Return a list of violations for every repeated key in a list of keys,
+    one per row.  Unless `nulls_count`, keys with a null in them are never
+    repeats.
+    """
+
+    lines = table_rows.lines
+
+    if not nulls_count:
+        pairs = [(key, line) for key, line in zip(keys, lines)
+                 if None not in key]
+        keys = [key for key, line in pairs]
+        lines = [line for key, line in pairs]
+
+    if len(set(keys)) == len(keys):
+        return []
+
+    violations = []
+    first_lines = {}
+
+    for key, line in zip(keys, lines):
+        first_line = first_lines.setdefault(key, line)
+
+        if first_line != line:
+            violations.append(Violation(
+                table_rows.path, line, 'duplicate {} {}, first seen on line {}'
+                .format(name, format_key(key), first_line)))
+
+    return violations
+
+def check_references(table, result, results):
+    """Check a table's foreign key values against the keys they refer to, and
+    return a list of violations.
+    """
+
+    constraints = sorted_foreign_keys(table)
+    missing = {}
+
+    for index, values in result.references.items():
+        constraint = constraints[index]
+        referred_keys = results[constraint.referred_table.name].keys
+
+        if referred_keys is None:
+            continue
+
+        keys = referred_keys.get(
+            tuple(element.column.name for element in constraint.elements),
+            set())
+
+        if not values <= keys:
+            missing[constraint] = values - keys
+
+    if not missing:
+        return []
+
+    # Only now go back for the lines the missing values are on
+    table_rows = read_table(table)
+    violations = []
+
+    for constraint, values in missing.items():
+        keys = table_rows.keys(constraint.columns)
+
+        violations.extend(
+            Violation(table_rows.path, line, '{} {} not found in {}'.format(
+                format_names(constraint.column_keys), format_key(key),
+                constraint.referred_table.name))
+            for key, line in zip(keys, table_rows.lines)
+            if key in values
+        )
+
+    return violations
+
+
+### Constraints
+
+def required(column):
+    """Return whether a column has to be in its table's CSV."""
+
+    return (not column.nullable and column.default is None and
+            column.server_default is None)
+
+def unique_keys(table):
+    """Return a list of (name, expressions, whether keys with nulls count)
+    for a table's primary key, unique constraints, and unique indexes.
+    """
+
+    keys = [('primary key', list(table.primary_key), True)]
+
+    for constraint in table.constraints:
+        if isinstance(constraint, sa.UniqueConstraint):
+            keys.append((format_names(constraint.columns.keys()),
+                         list(constraint.columns), False))
+
+    for index in sorted(table.indexes, key=lambda index: index.name or ''):
+        if index.unique:
+            keys.append((index.name, list(index.expressions), False))
+
+    return keys
+
+def sorted_foreign_keys(table):
+    """Return a table's foreign key constraints, in a fixed order."""
+
+    return sorted(table.foreign_key_constraints,
+                  key=lambda constraint: tuple(constraint.column_keys))
+
+def referenced_columns(table):
+    """Return a set of the tuples of a table's column names that foreign
+    keys (in any table) refer to.
+    """
+
+    return {
+        tuple(element.column.name for element in constraint.elements)
+        for other_table in porydex.db.TableBase.metadata.tables.values()
+        for constraint in other_table.foreign_key_constraints
+        if constraint.referred_table is table
+    }
+
+def non_null(keys):
+    """Return a set of the keys without a null in them."""
+
+    return {key for key in keys if None not in key}
+
+def coalesce(values):
+    """Return the first value that isn't None, like SQL's COALESCE."""
+
+    return next((value for value in values if value is not None), None)
+
+def format_names(names):
+    """Format some column names for a message."""
+
+    if len(names) == 1:
+        return names[0]
+
+    return '({})'.format(', '.join(names))
+
+def format_key(key):
+    """Format a key's values for a message."""
+
+    key = tuple(getattr(value, 'name', value) for value in key)
+
+    if len(key) == 1:
+        return repr(key[0])
+
+    return '({})'.format(', '.join(repr(value) for value in key))
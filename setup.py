@@ -4,8 +4,15 @@ requires = [
     'SQLAlchemy==1.3.13'
 ]
 
+extras_require = {
+    'numpy': ['numpy']
+}
+
 entry_points = {
-    'console_scripts': 'porydex = porydex.db.cli:main'
+    'console_scripts': [
+        'porydex = porydex.db.cli:main',
+        'porydex-benchmark = porydex.db.benchmark:main',
+    ]
 }
 
 setuptools.setup(
@@ -13,6 +20,8 @@ setuptools.setup(
     packages=setuptools.find_packages(),
     include_package_data=True,
     zip_safe=False,
+    python_requires='>=3.7',
     install_requires=requires,
+    extras_require=extras_require,
     entry_points=entry_points
 )
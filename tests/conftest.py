@@ -0,0 +1,48 @@
+import shutil
+
+import pytest
+
+import porydex.db
+import porydex.db.core
+import porydex.db.csvs
+
+
+@pytest.fixture(scope='session', autouse=True)
+def cache_dir(tmp_path_factory):
+    """Build the prebuilt database somewhere temporary, rather than in the
+    user's real cache directory.
+    """
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        directory = tmp_path_factory.mktemp('cache')
+        monkeypatch.setenv('PORYDEX_CACHE_DIR', str(directory))
+        yield directory
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """A scratch copy of the CSVs, used in place of the real ones."""
+
+    directory = tmp_path / 'data'
+    shutil.copytree(porydex.db.csvs.data_dir(), directory)
+    monkeypatch.setenv('PORYDEX_DATA_DIR', str(directory))
+    return directory
+
+@pytest.fixture(scope='session')
+def engine(cache_dir):
+    """The prebuilt database, built from the CSVs the first time."""
+
+    return porydex.db.connect().get_bind()
+
+@pytest.fixture
+def scratch_database(engine, tmp_path):
+    """The path to a copy of the prebuilt database, to change at will."""
+
+    path = tmp_path / 'porydex.sqlite'
+    shutil.copy(porydex.db.core.prebuilt_path(), str(path))
+    return path
+
+@pytest.fixture
+def session(engine):
+    session = porydex.db.connect()
+    yield session
+    session.close()
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import sqlalchemy as sa
+
+import porydex.db
+from porydex.db import aio, core
+
+
+CHARIZARD = 6
+SUN = 25
+
+# Counts to a billion, which takes long enough to be sure to be cancelled
+SLOW_QUERY = sa.text(
+    'WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL '
+    'SELECT n + 1 FROM counter WHERE n < 1000000000) '
+    'SELECT count(*) FROM counter WHERE running(n)')
+
+COUNT_QUERY = sa.text(
+    'WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL '
+    'SELECT n + 1 FROM counter WHERE n < 100000) '
+    'SELECT count(*) FROM counter')
+
+def run(coroutine_func, *args, **kwargs):
+    """Run an async function with an `AsyncDex` on the prebuilt database."""
+
+    async def main():
+        async with aio.AsyncDex(*args, **kwargs) as dex:
+            return await coroutine_func(dex)
+
+    return asyncio.run(main())
+
+def test_lookups(engine):
+    async def lookups(dex):
+        return await asyncio.gather(
+            dex.by_identifier(porydex.db.Pokemon, 'charizard'),
+            dex.by_identifier(porydex.db.Pokemon, 'missingno'),
+            dex.instance_detail(SUN, CHARIZARD),
+            dex.learnset(SUN, CHARIZARD, 1),
+        )
+
+    charizard, missingno, instance, learnset = run(lookups)
+
+    assert charizard.id == CHARIZARD
+    assert missingno is None
+    assert (instance.game_id, instance.pokemon_id) == (SUN, CHARIZARD)
+    assert instance.pokemon_form.is_default
+    assert len(instance.stats) == 6
+    # (pokemon_moves has no CSV yet, so nothing can learn anything)
+    assert learnset == []
+
+    # Everything promised was loaded before the session was closed
+    assert sa.inspect(instance).detached
+    assert charizard.name == 'Charizard'
+    assert instance.pokemon_form.pokemon.name == 'Charizard'
+    assert [stat.stat.identifier for stat in instance.stats][0] == 'hp'
+
+def test_many_queries_on_a_small_pool(engine):
+    identifiers = [row.identifier for row in engine.execute(
+        sa.select([porydex.db.Pokemon.identifier])
+        .order_by(porydex.db.Pokemon.id).limit(100))]
+
+    async def lookups(dex):
+        pokemon = await asyncio.gather(*(
+            dex.by_identifier(porydex.db.Pokemon, identifier)
+            for identifier in identifiers))
+        return pokemon, core.pool_metrics(dex.engine)
+
+    pokemon, metrics = run(lookups, max_workers=2)
+
+    assert [pokemon.identifier for pokemon in pokemon] == identifiers
+    assert metrics['checkouts'] == len(identifiers)
+    assert metrics['connects'] <= 2
+    assert metrics['checked_out'] == 0
+
+def test_cancelling_a_running_job(engine):
+    running = threading.Event()
+    errors = []
+
+    def slow(session):
+        # Called by the query itself, so it's definitely running by the time
+        # it's cancelled
+        dbapi_connection = session.connection().connection.connection
+        dbapi_connection.create_function(
+            'running', 1, lambda n: running.set() or 1)
+
+        try:
+            return session.execute(SLOW_QUERY).scalar()
+        except sa.exc.OperationalError as error:
+            errors.append(error)
+            raise
+
+    async def cancel(dex):
+        task = asyncio.ensure_future(dex.run(slow))
+        await asyncio.get_running_loop().run_in_executor(None, running.wait)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # The worker thread finishes up after the task is cancelled
+        deadline = time.monotonic() + 10
+
+        while (core.pool_metrics(dex.engine)['checked_out'] and
+               time.monotonic() < deadline):
+            await asyncio.sleep(0.01)
+
+        return core.pool_metrics(dex.engine)
+
+    start = time.monotonic()
+    metrics = run(cancel, max_workers=1)
+
+    assert time.monotonic() - start < 10
+    assert 'interrupted' in str(errors[0])
+    assert metrics['checked_out'] == 0
+    assert metrics['idle'] == 1
+
+def test_cancelling_a_waiting_job(engine):
+    started = threading.Event()
+    release = threading.Event()
+    ran = []
+
+    def blocker(session):
+        started.set()
+        release.wait()
+
+    async def cancel(dex):
+        blocking = asyncio.ensure_future(dex.run(blocker))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+
+        # With one worker, this can't start until the first one is done
+        waiting = asyncio.ensure_future(dex.run(ran.append))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        release.set()
+        await blocking
+
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    run(cancel, max_workers=1)
+
+    assert ran == []
+
+def test_job_cancelled_before_starting():
+    job = aio.Job()
+    job.cancel()
+
+    assert not job.start(None)
+
+def test_job_cancelled_between_statements(engine):
+    # One connection, so that it's the same one both times
+    engine = aio.pooled_engine(None, 1)
+    job = aio.Job()
+
+    with engine.connect() as connection:
+        assert job.start(connection)
+        assert connection.execute('SELECT 1').scalar() == 1
+
+        job.cancel()
+
+        with pytest.raises(aio.Cancelled):
+            connection.execute('SELECT 1')
+
+        job.finish()
+
+    # The connection went back to the pool without the job's progress
+    # handler, which would otherwise still abort everything
+    assert engine.execute(COUNT_QUERY).scalar() == 100000
+    engine.dispose()
@@ -0,0 +1,31 @@
+import porydex.db
+from porydex.db import loaders
+
+
+def statement_count(session, func):
+    with loaders.count_statements(session) as counter:
+        func()
+
+    return counter.count
+
+def test_navigating_to_cached_objects():
+    session = porydex.db.connect(cache=True)
+    instance = session.query(porydex.db.PokemonInstance).first()
+
+    # (The stats themselves are loaded along with the instance)
+    assert statement_count(
+        session, lambda: [stat.stat.name for stat in instance.stats]) == 0
+    assert statement_count(
+        session, lambda: session.query(porydex.db.Stat).get(1).name) == 0
+
+def test_querying_cached_classes():
+    session = porydex.db.connect(cache=True)
+    Stat = porydex.db.Stat
+
+    # One SELECT for the criteria, but no second one for the names
+    assert statement_count(
+        session, lambda: [stat.name for stat in session.query(Stat)]) == 1
+    assert statement_count(
+        session,
+        lambda: session.query(Stat).filter_by(identifier='speed').one().name
+    ) == 1
@@ -0,0 +1,22 @@
+import pytest
+
+from porydex.db import cli
+
+
+@pytest.mark.parametrize('argv', [
+    ['load', '-j', '0'],
+    ['reload', '--jobs', '-3'],
+    ['validate', '-j', 'many'],
+    ['build', '-j', '0'],
+    ['dump', '-j', '0'],
+    ['load', '--batch-size', '0'],
+])
+def test_counts_must_be_positive(argv, capsys):
+    with pytest.raises(SystemExit):
+        cli.make_parser().parse_args(['sqlite://'] + argv)
+
+    assert 'argument' in capsys.readouterr().err
+
+def test_jobs():
+    args = cli.make_parser().parse_args(['sqlite://', 'load', '-j', '4'])
+    assert args.jobs == 4
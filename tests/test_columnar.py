@@ -0,0 +1,71 @@
+import pytest
+import sqlalchemy as sa
+
+import porydex.db
+from porydex.db import cli, columnar
+
+
+@pytest.fixture
+def scratch_engine(scratch_database):
+    engine = sa.create_engine('sqlite:///{}'.format(scratch_database))
+    yield engine
+    engine.dispose()
+
+def contents(engine, table):
+    return engine.execute(
+        sa.select([table]).order_by(*table.primary_key.columns)).fetchall()
+
+def run(engine, func, *args):
+    with engine.connect() as connection:
+        with connection.begin():
+            func(connection, *args)
+
+        cli.run_after_commit(connection)
+
+def test_round_trip(scratch_engine, tmp_path):
+    path = str(tmp_path / 'porydex.snapshot')
+    tables = [porydex.db.TableBase.metadata.tables[name]
+              for name in columnar.SNAPSHOT_TABLES]
+    originals = {table.name: contents(scratch_engine, table)
+                 for table in tables}
+
+    run(scratch_engine, cli.snapshot, path)
+
+    # Throw some of everything away, so that loading has to put it back
+    for table in tables:
+        scratch_engine.execute(table.delete().where(table.c.game_id > 20))
+
+    run(scratch_engine, cli.load_snapshot, path)
+
+    for table in tables:
+        assert contents(scratch_engine, table) == originals[table.name]
+
+def test_reading(scratch_engine, tmp_path):
+    path = str(tmp_path / 'porydex.snapshot')
+    run(scratch_engine, cli.snapshot, path)
+
+    stats = porydex.db.PokemonStat.__table__
+    original = contents(scratch_engine, stats)
+    map_table = porydex.db.PokemonMoveListMap.__table__
+    original_map = contents(scratch_engine, map_table)
+
+    with columnar.Snapshot(path) as snapshot:
+        snapshot_stats = snapshot['pokemon_stats']
+        assert len(snapshot_stats) == len(original)
+        assert (snapshot_stats.columns['base_stat'][0] ==
+                original[0].base_stat)
+
+        # Nullable and enum columns decode to the same values
+        snapshot_map = snapshot['pokemon_move_list_map']
+        rows = list(snapshot_map.rows())
+        assert len(rows) == len(original_map)
+        assert set(rows) == {
+            tuple(row[name] for name in snapshot_map.column_names)
+            for row in original_map}
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / 'not.snapshot'
+    path.write_bytes(b'not a snapshot at all')
+
+    with pytest.raises(ValueError, match='not a porydex snapshot'):
+        columnar.Snapshot(str(path))
@@ -0,0 +1,86 @@
+import collections
+
+import pytest
+import sqlalchemy as sa
+
+import porydex.db
+from porydex.db import cli
+
+# Move lists 1 and 3 hold the same moves in a different row order, as do 2
+# and 5; 4 is like 1 but at a different level, and 6 is missing one of 1's
+# moves.  Rows are (list id, move id, level, order within level).
+MOVES = [
+    (1, 33, 1, 1), (1, 45, 1, 2), (1, 52, 7, None),
+    (2, 10, 1, None), (2, 43, 4, None),
+    (3, 52, 7, None), (3, 45, 1, 2), (3, 33, 1, 1),
+    (4, 33, 1, 1), (4, 45, 1, 2), (4, 52, 9, None),
+    (5, 43, 4, None), (5, 10, 1, None),
+    (6, 33, 1, 1), (6, 45, 1, 2),
+]
+
+
+@pytest.fixture
+def scratch_engine(scratch_database):
+    engine = sa.create_engine('sqlite:///{}'.format(scratch_database))
+    engine.execute(porydex.db.PokemonMove.__table__.insert(), [
+        {'id': id, 'pokemon_move_list_id': list_id, 'move_id': move_id,
+         'level': level, 'order_within_level': order}
+        for id, (list_id, move_id, level, order) in enumerate(MOVES, 1)
+    ])
+    yield engine
+    engine.dispose()
+
+def learnsets(engine):
+    """Return each map row's moves, as a Counter, by its primary key."""
+
+    list_map = porydex.db.PokemonMoveListMap.__table__
+    pokemon_moves = porydex.db.PokemonMove.__table__
+    moves = {}
+
+    for row in engine.execute(pokemon_moves.select()):
+        moves.setdefault(row.pokemon_move_list_id, []).append(
+            (row.move_id, row.level, row.order_within_level))
+
+    return {
+        (row.game_id, row.pokemon_id, row.form_id, row.method):
+            collections.Counter(moves.get(row.pokemon_move_list_id, ()))
+        for row in engine.execute(list_map.select())
+    }
+
+def count(engine, table):
+    return engine.execute(
+        sa.select([sa.func.count()]).select_from(table)).scalar()
+
+def run_compact(engine):
+    with engine.connect() as connection:
+        with connection.begin():
+            cli.compact_movelists(connection)
+
+        cli.run_after_commit(connection)
+
+def test_learnsets_unchanged(scratch_engine):
+    list_map = porydex.db.PokemonMoveListMap.__table__
+    move_lists = porydex.db.PokemonMoveList.__table__
+    pokemon_moves = porydex.db.PokemonMove.__table__
+    original = learnsets(scratch_engine)
+    list_count = count(scratch_engine, move_lists)
+
+    run_compact(scratch_engine)
+
+    assert learnsets(scratch_engine) == original
+    assert count(scratch_engine, move_lists) == list_count - 2
+    assert count(scratch_engine, pokemon_moves) == len(MOVES) - 5
+
+    # Duplicates point at the lowest-numbered copy, and empty lists are left
+    # alone rather than merged
+    list_ids = {row.pokemon_move_list_id
+                for row in scratch_engine.execute(list_map.select())}
+    assert not list_ids & {3, 5}
+    assert {1, 2, 4, 6, 7, 8} <= list_ids
+
+def test_nothing_to_compact(scratch_engine, capsys):
+    run_compact(scratch_engine)
+    capsys.readouterr()
+
+    run_compact(scratch_engine)
+    assert 'No duplicate move lists.' in capsys.readouterr().out
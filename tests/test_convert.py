@@ -0,0 +1,74 @@
+import decimal
+import io
+
+import pytest
+
+import porydex.db
+from porydex.db import convert
+
+
+def table(name):
+    return porydex.db.TableBase.metadata.tables[name]
+
+def open_csv(text, name='test.csv'):
+    table_csv = io.StringIO(text)
+    table_csv.name = name
+    return table_csv
+
+def test_compile_converter():
+    forms = table('pokemon_forms')
+    headers = ('weight_kg', 'pokemon_id', 'form_id', 'identifier',
+               'is_default', 'order', 'height_m')
+    convert_row = convert.compile_converter(forms, headers)
+
+    assert convert_row(['', '6', '1', 'charizard', 'True', '7', '1.7']) == (
+        None, 6, 1, 'charizard', True, 7, decimal.Decimal('1.7'))
+
+    for row in [
+        ['90.5', '6', '1', 'charizard', 'true', '7', '1.7'],
+        ['90.5', 'six', '1', 'charizard', 'True', '7', '1.7'],
+        ['90.5', '6', '1', 'charizard', 'True', '7', 'tall'],
+        ['90.5', '6', '1', 'charizard', 'True', '7'],
+    ]:
+        with pytest.raises(ValueError):
+            convert_row(row)
+
+def test_enums():
+    convert_row = convert.compile_converter(
+        table('type_matchups'), ('result',))
+
+    assert (convert_row(['super_effective']) ==
+            (porydex.db.TypeMatchupResult.super_effective,))
+
+    with pytest.raises(ValueError):
+        convert_row(['super-effective'])
+
+def test_read_csv():
+    headers, rows = convert.read_csv(
+        table('pokemon'), open_csv('id,identifier,order\n1,bulbasaur,1\n'))
+
+    assert headers == ('id', 'identifier', 'order')
+    assert list(rows) == [(1, 'bulbasaur', 1)]
+
+@pytest.mark.parametrize('table_name, text, line, message', [
+    ('pokemon', 'id,identifier,order\n1,bulbasaur,1\n2,ivysaur,two\n',
+     3, "bad value 'two' for order: invalid literal for int() with base 10: "
+        "'two'"),
+    ('type_matchups',
+     'type_chart_id,attacking_type_id,defending_type_id,result\n'
+     '1,1,1,neutral\n1,1,2,neutral\n1,1,3,bogus\n',
+     4, "bad value 'bogus' for result: Not a member of TypeMatchupResult"),
+    ('pokemon', 'id,identifier,order\n1,bulbasaur,1,\n',
+     2, 'expected 3 values, found 4'),
+    ('pokemon', 'id,identifier,spam\n', 1, 'no column spam in pokemon'),
+])
+def test_conversion_errors(table_name, text, line, message):
+    with pytest.raises(convert.ConversionError) as error:
+        headers, rows = convert.read_csv(
+            table(table_name), open_csv(text, 'data/test.csv'))
+        list(rows)
+
+    assert (error.value.path, error.value.line, error.value.message) == (
+        'data/test.csv', line, message)
+    assert str(error.value) == 'data/test.csv, line {}: {}'.format(
+        line, message)
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+import sqlalchemy as sa
+
+import porydex.db
+from porydex.db import core, profiler
+
+
+@pytest.fixture
+def sqlite_uri(tmp_path):
+    path = tmp_path / 'scratch.sqlite'
+    connection = sqlite3.connect(str(path))
+    connection.execute('CREATE TABLE things (id INTEGER PRIMARY KEY)')
+    connection.commit()
+    connection.close()
+
+    return 'sqlite:///{}'.format(path)
+
+def test_sessions_share_an_engine(sqlite_uri):
+    assert (porydex.db.connect(sqlite_uri).get_bind() is
+            porydex.db.connect(sqlite_uri).get_bind())
+
+def test_sqlite_is_read_only_by_default(sqlite_uri):
+    session = porydex.db.connect(sqlite_uri)
+
+    with pytest.raises(sa.exc.OperationalError, match='readonly'):
+        session.execute('INSERT INTO things VALUES (1)')
+
+    session.close()
+
+    session = porydex.db.connect(sqlite_uri, read_only=False)
+    session.execute('INSERT INTO things VALUES (1)')
+    session.commit()
+
+    assert session.execute('SELECT count(*) FROM things').scalar() == 1
+
+def test_profiled_sessions_get_their_own_engine(sqlite_uri):
+    statements = profiler.Profiler()
+    profiled = porydex.db.connect(sqlite_uri, profiler=statements)
+    plain = porydex.db.connect(sqlite_uri)
+
+    assert profiled.get_bind() is not plain.get_bind()
+    assert (porydex.db.connect(sqlite_uri, profiler=statements).get_bind()
+            is profiled.get_bind())
+
+    profiled.execute('SELECT count(*) FROM things')
+    plain.execute('SELECT count(*) FROM things')
+
+    assert statements.statement_count == 1
+
+def test_pool_metrics(sqlite_uri):
+    engine = porydex.db.connect(sqlite_uri).get_bind()
+
+    with engine.connect():
+        assert core.pool_metrics(engine)['checked_out'] == 1
+
+    metrics = core.pool_metrics(engine)
+    assert metrics['checked_out'] == 0
+    assert metrics['idle'] == 1
+
+def test_in_memory_databases_are_separate():
+    assert (porydex.db.connect('sqlite://').get_bind() is not
+            porydex.db.connect('sqlite://').get_bind())
@@ -0,0 +1,103 @@
+import fractions
+import functools
+import operator
+
+import pytest
+import sqlalchemy as sa
+
+import porydex.db
+
+pytest.importorskip('numpy')
+
+import porydex.db.effectiveness as effectiveness  # noqa: E402
+
+
+@pytest.fixture
+def connection(engine):
+    with engine.connect() as connection:
+        yield connection
+
+def matchups(connection, type_chart_id):
+    """Return a dict of each (attacking, defending) type id pair's result's
+    Fraction in a type chart, straight from the database.
+    """
+
+    table = porydex.db.TypeMatchup.__table__
+    return {
+        (row.attacking_type_id, row.defending_type_id):
+            row.result.damage_multiplier
+        for row in connection.execute(
+            table.select().where(table.c.type_chart_id == type_chart_id))
+    }
+
+def instance_types(connection, game_id):
+    """Return a dict of each instance's type ids, in slot order."""
+
+    table = porydex.db.PokemonType.__table__
+    types = {}
+
+    for row in connection.execute(
+        table.select().where(table.c.game_id == game_id)
+        .where(table.c.type_id.isnot(None))
+        .order_by(table.c.slot)
+    ):
+        types.setdefault((row.pokemon_id, row.form_id), []).append(
+            row.type_id)
+
+    return types
+
+def test_matches_fraction_math(connection):
+    games = porydex.db.Game.__table__
+    charts = connection.execute(
+        sa.select([games.c.type_chart_id, sa.func.min(games.c.id)])
+        .group_by(games.c.type_chart_id)).fetchall()
+    assert len(charts) == 3
+
+    for type_chart_id, game_id in charts:
+        chart = matchups(connection, type_chart_id)
+        attacking_type_ids = sorted({attacking for attacking, _ in chart})
+        types = instance_types(connection, game_id)
+
+        result = effectiveness.effectiveness(
+            connection, game_id, attacking_type_ids)
+        keys = list(zip(result.pokemon_ids.tolist(),
+                        result.form_ids.tolist()))
+        assert result.multipliers.shape == (
+            len(attacking_type_ids), len(keys))
+
+        for row, attacking in enumerate(attacking_type_ids):
+            for column, key in enumerate(keys):
+                expected = functools.reduce(operator.mul, (
+                    chart[attacking, defending]
+                    for defending in types.get(key, ())
+                ), fractions.Fraction(1))
+
+                assert effectiveness.as_fraction(
+                    result.multipliers[row, column]) == expected
+
+def test_chart_multiplier(connection):
+    games = porydex.db.Game.__table__
+    types = porydex.db.Type.__table__
+    sun_chart = connection.execute(
+        sa.select([games.c.type_chart_id]).where(games.c.identifier == 'sun')
+    ).scalar()
+    type_ids = dict(connection.execute(
+        sa.select([types.c.identifier, types.c.id])).fetchall())
+
+    chart = effectiveness.compiled_type_chart(connection, sun_chart)
+
+    # Ground against Charizard, and Rock against it
+    assert chart.multiplier(
+        type_ids['ground'], type_ids['fire'], type_ids['flying']) == 0
+    assert chart.multiplier(
+        type_ids['rock'], type_ids['fire'], type_ids['flying']) == 4
+
+    with pytest.raises(KeyError):
+        chart.index(-1)
+
+def test_cache(connection, engine):
+    chart = effectiveness.compiled_type_chart(connection, 1)
+    assert effectiveness.compiled_type_chart(connection, 1) is chart
+
+    effectiveness.clear_cache(engine)
+    assert effectiveness.compiled_type_chart(connection, 1) is not chart
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import porydex.db.benchmark
+
+
+# How long each module may take to import, relative to SQLAlchemy itself,
+# which is timed alongside it so that a busy machine slows both down
+RELATIVE_BUDGETS = {
+    'porydex.db': 0.25,
+    'porydex.db.cli': 4,
+}
+
+@pytest.mark.skipif('PORYDEX_SKIP_TIMING' in os.environ,
+                    reason='$PORYDEX_SKIP_TIMING is set')
+@pytest.mark.parametrize('module', sorted(RELATIVE_BUDGETS))
+def test_import_time(module):
+    # Best of three, since noise only ever makes imports slower
+    seconds = min(porydex.db.benchmark.import_time(module) for n in range(3))
+    baseline = min(porydex.db.benchmark.import_time('sqlalchemy')
+                   for n in range(3))
+
+    assert seconds <= baseline * RELATIVE_BUDGETS[module]
+
+def test_import_is_lazy():
+    modules = subprocess.run(
+        [sys.executable, '-c',
+         'import sys, porydex.db; print(" ".join(sys.modules))'],
+        stdout=subprocess.PIPE, universal_newlines=True, check=True
+    ).stdout.split()
+
+    assert 'sqlalchemy' not in modules
+    assert 'porydex.db.schema' not in modules
+
+def test_star_import():
+    namespace = {}
+    exec('from porydex.db import *', namespace)
+
+    for name in ('TableBase', 'connect', 'Pokemon', 'PokemonInstance',
+                 'PokemonMoveMethod', 'pokemon_instance_key', 'ENGLISH_ID'):
+        assert name in namespace
+
+    assert not any(name.startswith('_') for name in namespace
+                   if name != '__builtins__')
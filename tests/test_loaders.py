@@ -0,0 +1,59 @@
+import pytest
+
+import porydex.db
+from porydex.db import loaders
+
+
+# Charizard in Sun, with something in every collection
+SUN = 25
+CHARIZARD = 6
+
+def test_instance_detail(session):
+    count = loaders.check_profile(
+        session, loaders.INSTANCE_DETAIL,
+        lambda query: query.filter_by(game_id=SUN, pokemon_id=CHARIZARD))
+
+    assert count == loaders.INSTANCE_DETAIL.round_trips
+
+def test_instance_detail_without_egg_groups(session):
+    # Generation 1 has no egg groups, so their names aren't loaded at all
+    count = loaders.check_profile(
+        session, loaders.INSTANCE_DETAIL,
+        lambda query: query.filter_by(game_id=1, pokemon_id=CHARIZARD))
+
+    assert count < loaders.INSTANCE_DETAIL.round_trips
+
+def test_game_roster(session):
+    count = loaders.check_profile(
+        session, loaders.GAME_ROSTER,
+        lambda query: query.filter_by(game_id=SUN))
+
+    assert count == loaders.GAME_ROSTER.round_trips
+
+def test_move_learners(session):
+    PokemonMoveListMap = porydex.db.PokemonMoveListMap
+
+    count = loaders.check_profile(
+        session, loaders.MOVE_LEARNERS,
+        lambda query: (query.filter_by(game_id=SUN)
+                       .order_by(PokemonMoveListMap.pokemon_id,
+                                 PokemonMoveListMap.form_id,
+                                 PokemonMoveListMap.method)
+                       .limit(100)))
+
+    # Loading them one by one would take a statement for each of the 100
+    assert count == loaders.MOVE_LEARNERS.round_trips
+
+def test_too_many_statements(session):
+    profile = loaders.LoaderProfile(
+        'too few', porydex.db.PokemonInstance,
+        loaders.INSTANCE_DETAIL.paths, round_trips=1)
+
+    with pytest.raises(AssertionError):
+        loaders.check_profile(
+            session, profile,
+            lambda query: query.filter_by(game_id=SUN, pokemon_id=CHARIZARD))
+
+def test_profiles_are_registered():
+    assert set(loaders.PROFILES.values()) == {
+        loaders.INSTANCE_DETAIL, loaders.GAME_ROSTER, loaders.MOVE_LEARNERS}
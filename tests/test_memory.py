@@ -0,0 +1,64 @@
+import pytest
+
+import porydex.db
+from porydex.db import memory
+
+
+CHARIZARD = 6
+SUN = 25
+
+def test_repr_includes_inherited_slots():
+    assert repr(memory.Type(10, 'fire')) == "Type(id=10, identifier='fire')"
+
+@pytest.fixture(scope='module')
+def dex(engine):
+    with engine.connect() as connection:
+        return memory.Dex.load(connection)
+
+def test_instances_match_the_orm(dex, session):
+    # Charizard's forms in Sun, whose Mega Evolutions differ from it in
+    # types and abilities
+    instances = (session.query(porydex.db.PokemonInstance)
+                 .filter_by(game_id=SUN, pokemon_id=CHARIZARD).all())
+    assert len(instances) == 3
+
+    for instance in instances:
+        record = dex.instances[instance.game_id, instance.pokemon_id,
+                               instance.form_id]
+
+        assert record.game.identifier == instance.game.identifier
+        assert record.form.identifier == instance.pokemon_form.identifier
+        assert record.is_current == instance.is_current
+        assert ([(stat.stat.identifier, stat.base_stat, stat.effort_yield)
+                 for stat in record.stats] ==
+                [(stat.stat.identifier, stat.base_stat, stat.effort_yield)
+                 for stat in instance.stats])
+        assert ([type.identifier for type in record.types] ==
+                [type.identifier for type in instance.types])
+        assert ([(ability.ability.identifier, ability.slot)
+                 for ability in record.pokemon_abilities] ==
+                [(ability.ability.identifier, ability.slot)
+                 for ability in instance.pokemon_abilities])
+        assert ([egg_group.identifier for egg_group in record.egg_groups] ==
+                [egg_group.identifier for egg_group in instance.egg_groups])
+
+def test_everything_is_loaded(dex, session):
+    assert (len(dex.instances) ==
+            session.query(porydex.db.PokemonInstance).count())
+    assert (sum(len(instances) for instances in dex.instances_by_game.values())
+            == len(dex.instances))
+    assert dex.pokemon[CHARIZARD].name == 'Charizard'
+    assert dex.pokemon[CHARIZARD].preevolution.identifier == 'charmeleon'
+
+def test_identifier_indexes(dex):
+    for name in memory.Dex._identifier_indexes:
+        things = getattr(dex, name)
+        by_identifier = getattr(dex, name + '_by_identifier')
+
+        assert things
+        assert len(by_identifier) == len(things)
+        assert all(by_identifier[thing.identifier] is thing
+                   for thing in things.values())
+
+    assert dex.pokemon_by_identifier['charizard'] is dex.pokemon[CHARIZARD]
+    assert dex.games_by_identifier['sun'].id == SUN
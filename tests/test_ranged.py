@@ -0,0 +1,33 @@
+import porydex.db
+from porydex.db import cli, csvs, ranged
+
+
+def test_pack_and_unpack(data_dir):
+    tables = [porydex.db.TableBase.metadata.tables[name]
+              for name in ranged.RANGED_TABLES]
+    originals = {table.name: (data_dir / '{}.csv'.format(table.name))
+                 .read_bytes() for table in tables}
+
+    cli.pack(None)
+
+    for table in tables:
+        assert not (data_dir / '{}.csv'.format(table.name)).exists()
+        packed = data_dir / '{}.ranged.csv'.format(table.name)
+        assert packed.stat().st_size < len(originals[table.name]) / 2
+
+        # Packed CSVs read exactly like the plain ones
+        with csvs.open_csv(table) as table_csv:
+            assert table_csv.read().encode() == originals[table.name]
+
+    cli.unpack(None)
+
+    for table in tables:
+        assert not (data_dir / '{}.ranged.csv'.format(table.name)).exists()
+        assert ((data_dir / '{}.csv'.format(table.name)).read_bytes() ==
+                originals[table.name])
+
+def test_packing_twice(data_dir, capsys):
+    cli.pack(None, ['pokemon_stats'])
+    cli.pack(None, ['pokemon_stats'])
+
+    assert 'Already packed' in capsys.readouterr().out
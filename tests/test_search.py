@@ -0,0 +1,100 @@
+import pytest
+
+from porydex.db import search
+
+ENGLISH, JAPANESE = 9, 1
+NAMES = [
+    ('pokemon', 25, ENGLISH, 'Pikachu', ()),
+    ('pokemon', 25, JAPANESE, 'ピカチュウ', ()),
+    ('pokemon', 6, ENGLISH, 'Charizard', ()),
+    ('form', (6, 2), ENGLISH, 'Mega Charizard X', ('Mega X',)),
+    ('move', 85, ENGLISH, 'Thunderbolt', ()),
+    ('move', 87, ENGLISH, 'Thunder', ()),
+    ('ability', 65, ENGLISH, 'Overgrow', ()),
+]
+
+
+@pytest.fixture
+def connection(engine):
+    with engine.connect() as connection:
+        yield connection
+
+@pytest.mark.parametrize('text, folded', [
+    ('Pokémon', 'pokemon'),
+    ('ＰＩＫＡＣＨＵ', 'pikachu'),
+    ('ピカチュウ', 'ぴかちゅう'),
+    ('ﾋﾟｶﾁｭｳ', 'ぴかちゅう'),
+])
+def test_fold(text, folded):
+    assert search.fold(text) == folded
+
+@pytest.mark.parametrize('text, expected', [
+    ('ピカチュウ', 'pikachuu'),
+    ('リザードン', 'rizadon'),
+    ('ファイヤー', 'faiya'),
+    ('キャタピー', 'kyatapi'),
+    ('マッシブーン', 'masshibun'),
+    ('pikachu', None),
+])
+def test_romaji(text, expected):
+    assert search.romaji(search.fold(text)) == expected
+
+def ids(hits):
+    return [(hit.kind, hit.id) for hit in hits]
+
+def test_prefix_search():
+    index = search.SearchIndex.build(NAMES)
+
+    hits = index.search('thunder')
+    assert ids(hits) == [('move', 87), ('move', 85)]
+    assert hits[0].score == search.EXACT + 1
+
+    # Later words and extra names are keys too
+    assert ids(index.search('charizard x'))[0] == ('form', (6, 2))
+    assert ids(index.search('mega x'))[0] == ('form', (6, 2))
+    assert ('form', (6, 2)) in ids(index.search('charizard'))
+
+def test_japanese_search():
+    index = search.SearchIndex.build(NAMES)
+
+    for query in ('ピカ', 'ぴか', 'ﾋﾟｶ', 'pikachu'):
+        assert ('pokemon', 25, JAPANESE) in {
+            (hit.kind, hit.id, hit.language_id)
+            for hit in index.search(query)}
+
+def test_filters():
+    index = search.SearchIndex.build(NAMES)
+
+    assert index.search('   ') == []
+    assert ids(index.search('pika', language_id=ENGLISH)) == [('pokemon', 25)]
+    assert ids(index.search('o', kinds={'ability'})) == [('ability', 65)]
+    assert ids(index.search('thunder', limit=1)) == [('move', 87)]
+
+def test_fuzzy_search():
+    index = search.SearchIndex.build(NAMES)
+
+    hits = index.search('pikahcu', language_id=ENGLISH)
+    assert ids(hits) == [('pokemon', 25)]
+    assert hits[0].score < search.WORD_PREFIX
+
+    assert index.search('zzzzzz') == []
+
+def test_load_index(connection, tmp_path):
+    index = search.load_index(connection, str(tmp_path))
+    assert index.search('pikachu', kinds={'pokemon'})[0].id == 25
+    assert index.search('charizard', kinds={'pokemon'})[0].id == 6
+
+    # The second load comes from the pickle
+    (path,) = tmp_path.glob('search-*.pickle')
+    loaded = search.load_index(connection, str(tmp_path))
+    assert loaded is not index
+    assert loaded.name_hash == index.name_hash
+    assert loaded.keys == index.keys
+
+    # Rebuilding throws away indexes for other names
+    stale_path = tmp_path / 'search-0000000000000000.pickle'
+    stale_path.write_bytes(b'')
+    path.unlink()
+    search.load_index(connection, str(tmp_path))
+    assert not stale_path.exists()
+    assert path.exists()
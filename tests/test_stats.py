@@ -0,0 +1,102 @@
+import pytest
+import sqlalchemy as sa
+
+import porydex.db
+import porydex.db.core
+
+pytest.importorskip('numpy')
+
+import porydex.db.stats as stats  # noqa: E402
+
+RED, SUN = 1, 25
+HP, SPECIAL_ATTACK, SPEED, SPECIAL = 1, 4, 6, 7
+
+
+@pytest.fixture
+def connection(engine):
+    with engine.connect() as connection:
+        yield connection
+
+def base_stats(connection, game_id):
+    """Return each instance's {stat id: base stat}, straight from the
+    database.
+    """
+
+    table = porydex.db.PokemonStat.__table__
+    stat_table = porydex.db.Stat.__table__
+    base = {}
+
+    for row in connection.execute(
+        sa.select([table]).select_from(table.join(stat_table))
+        .where(table.c.game_id == game_id)
+        .where(sa.not_(stat_table.c.is_transient))
+    ):
+        base.setdefault((row.pokemon_id, row.form_id), {})[row.stat_id] = (
+            row.base_stat)
+
+    return base
+
+def test_matches_database(connection):
+    game_stats = stats.game_stats(connection, SUN)
+    expected = base_stats(connection, SUN)
+    keys = list(zip(game_stats.pokemon_ids.tolist(),
+                    game_stats.form_ids.tolist()))
+
+    assert set(keys) == set(expected)
+    assert SPECIAL not in game_stats.stat_ids
+    assert game_stats.totals().tolist() == [
+        sum(expected[key].values()) for key in keys]
+    assert game_stats.base(SPEED).tolist() == [
+        expected[key][SPEED] for key in keys]
+
+    with pytest.raises(KeyError):
+        game_stats.column(SPECIAL)
+
+def test_select(connection):
+    game_stats = stats.game_stats(connection, SUN)
+    expected = base_stats(connection, SUN)
+    keys = list(zip(game_stats.pokemon_ids.tolist(),
+                    game_stats.form_ids.tolist()))
+
+    result = game_stats.select(
+        game_stats.totals() >= 600, order_by=SPEED, limit=10)
+    strong = [key for key in keys if sum(expected[key].values()) >= 600]
+    strong.sort(key=lambda key: -expected[key][SPEED])
+
+    assert len(result) == 10
+    assert result.keys() == strong[:10]
+    assert result.values.tolist() == [
+        expected[key][SPEED] for key in strong[:10]]
+    assert (result.totals >= 600).all()
+
+    # The fastest instance in the game is at the 100th percentile
+    fastest = game_stats.select(order_by=SPEED, limit=1)
+    assert fastest.percentiles.tolist() == [100]
+
+    slowest = game_stats.select(order_by=SPEED, descending=False, limit=1)
+    assert slowest.values[0] == min(
+        base[SPEED] for base in expected.values())
+
+def test_effort_yields(connection):
+    red = stats.game_stats(connection, RED)
+    assert SPECIAL in red.stat_ids
+    assert SPECIAL_ATTACK not in red.stat_ids
+    assert red.effort(HP).mask.all()
+
+    sun = stats.game_stats(connection, SUN)
+    assert not sun.effort(HP).mask.any()
+
+def test_unknown_game(connection):
+    with pytest.raises(ValueError):
+        stats.game_stats(connection, -1)
+
+def test_cache(connection, engine):
+    game_stats = stats.game_stats(connection, SUN)
+    assert stats.game_stats(connection, SUN) is game_stats
+
+    porydex.db.core.invalidate_caches(engine)
+    reloaded = stats.game_stats(connection, SUN)
+    assert reloaded is not game_stats
+
+    stats.clear_cache()
+    assert stats.game_stats(connection, SUN) is not reloaded
@@ -0,0 +1,122 @@
+import csv
+
+import pytest
+import sqlalchemy as sa
+
+import porydex.db
+from porydex.db import cli
+
+
+@pytest.fixture
+def sync_engine(scratch_database, data_dir):
+    """An SQLite database loaded from the CSVs in `data_dir`, checking
+    foreign keys at the end of each transaction.
+    """
+
+    engine = sa.create_engine('sqlite:///{}'.format(scratch_database))
+
+    # pysqlite's own transaction handling would commit the pragmas right
+    # away, so take it over, as in SQLAlchemy's SQLite documentation
+    @sa.event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute('PRAGMA foreign_keys = ON')
+
+    @sa.event.listens_for(engine, 'begin')
+    def begin(connection):
+        connection.execute('BEGIN')
+        connection.execute('PRAGMA defer_foreign_keys = ON')
+
+    yield engine
+    engine.dispose()
+
+def run_sync(engine):
+    with engine.connect() as connection:
+        with connection.begin():
+            cli.sync(connection)
+
+        cli.run_after_commit(connection)
+
+def edit_csv(data_dir, table_name, edit):
+    """Replace a CSV's rows (as lists of strings, without the headers) with
+    `edit(rows)`.
+    """
+
+    path = data_dir / '{}.csv'.format(table_name)
+
+    with path.open(encoding='UTF-8', newline='') as table_csv:
+        reader = csv.reader(table_csv)
+        headers = next(reader)
+        rows = edit(list(reader))
+
+    with path.open('w', encoding='UTF-8', newline='') as table_csv:
+        writer = csv.writer(table_csv, lineterminator='\n')
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+def type_charts(engine):
+    table = porydex.db.TypeChart.__table__
+    return engine.execute(sa.select([table]).order_by(table.c.id)).fetchall()
+
+def test_nothing_changed(sync_engine, capsys):
+    run_sync(sync_engine)
+
+    assert capsys.readouterr().out == 'Syncing tables...\n'
+
+def test_insert_update_delete(sync_engine, data_dir):
+    stat_names = porydex.db.StatName.__table__
+
+    edit_csv(data_dir, 'type_charts', lambda rows: rows + [['4', 'gen-9']])
+    edit_csv(data_dir, 'type_charts', lambda rows: [
+        [id, 'first-chart' if id == '1' else identifier]
+        for id, identifier in rows
+    ])
+    edit_csv(data_dir, 'stat_names', lambda rows: rows[1:])
+
+    run_sync(sync_engine)
+
+    assert type_charts(sync_engine) == [
+        (1, 'first-chart'), (2, 'gen-2-chart'), (3, 'gen-6-chart'),
+        (4, 'gen-9'),
+    ]
+    assert sync_engine.execute(
+        sa.select([sa.func.count()]).select_from(stat_names)
+        .where(stat_names.c.language_id == 3)
+        .where(stat_names.c.stat_id == 1)
+    ).scalar() == 0
+
+def test_renumber(sync_engine, data_dir):
+    # The new row has the old one's unique identifier, so the old one has to
+    # go first
+    def renumber(column):
+        return lambda rows: [
+            [value if index != column or value != '3' else '4'
+             for index, value in enumerate(row)]
+            for row in rows
+        ]
+
+    edit_csv(data_dir, 'type_charts', renumber(0))
+    edit_csv(data_dir, 'type_matchups', renumber(0))
+    edit_csv(data_dir, 'games', renumber(3))
+
+    run_sync(sync_engine)
+
+    games = porydex.db.Game.__table__
+    matchups = porydex.db.TypeMatchup.__table__
+
+    assert type_charts(sync_engine) == [
+        (1, 'gen-1-chart'), (2, 'gen-2-chart'), (4, 'gen-6-chart')]
+    assert sync_engine.execute(
+        sa.select([sa.func.count()]).where(games.c.type_chart_id == 4)
+    ).scalar() == 12
+    assert sync_engine.execute(
+        sa.select([sa.func.count()]).where(matchups.c.type_chart_id == 4)
+    ).scalar() == 324
+
+def test_synced_tables_are_skipped(sync_engine, data_dir, capsys):
+    edit_csv(data_dir, 'type_charts', lambda rows: rows + [['4', 'gen-9']])
+    run_sync(sync_engine)
+    capsys.readouterr()
+
+    run_sync(sync_engine)
+    assert capsys.readouterr().out == 'Syncing tables...\n'
@@ -0,0 +1,84 @@
+import pytest
+
+import porydex.db
+from porydex.db import validate
+
+
+def append_line(data_dir, table_name, line):
+    """Add a line to the end of a table's CSV, and return its line number."""
+
+    path = data_dir / '{}.csv'.format(table_name)
+
+    with path.open('a', encoding='UTF-8', newline='') as table_csv:
+        table_csv.write(line + '\r\n')
+
+    with path.open(encoding='UTF-8', newline='') as table_csv:
+        return sum(1 for line in table_csv)
+
+def messages(violations):
+    return [(violation.path.rsplit('/', 1)[-1], violation.line,
+             violation.message) for violation in violations]
+
+def test_shipped_csvs_are_valid():
+    assert validate.validate_csvs(jobs=1) == []
+
+def test_duplicate_primary_key(data_dir):
+    line = append_line(data_dir, 'pokemon_stats', '1,1,1,1,45,')
+
+    assert messages(validate.validate_csvs(jobs=1)) == [
+        ('pokemon_stats.csv', line,
+         'duplicate primary key (1, 1, 1, 1), first seen on line 2'),
+    ]
+
+def test_missing_composite_foreign_key(data_dir):
+    line = append_line(data_dir, 'pokemon_stats', '1,6,99,1,78,')
+
+    assert messages(validate.validate_csvs(jobs=1)) == [
+        ('pokemon_stats.csv', line,
+         '(game_id, pokemon_id, form_id) (1, 6, 99) not found in '
+         'pokemon_instances'),
+        ('pokemon_stats.csv', line,
+         '(pokemon_id, form_id) (6, 99) not found in pokemon_forms'),
+    ]
+
+def test_bad_values(data_dir):
+    int_line = append_line(data_dir, 'pokemon', '900,spam,,eggs')
+    enum_line = append_line(data_dir, 'type_matchups', '1,1,1,bogus')
+    missing_line = append_line(data_dir, 'pokemon', '901,,,902')
+
+    violations = messages(validate.validate_csvs(jobs=1))
+
+    assert [(path, line) for path, line, message in violations] == [
+        ('pokemon.csv', int_line),
+        ('pokemon.csv', missing_line),
+        ('type_matchups.csv', enum_line),
+    ]
+    assert violations[1][2] == 'missing value for identifier'
+
+def test_missing_nullable_column(data_dir):
+    path = data_dir / 'pokemon.csv'
+
+    with path.open(encoding='UTF-8', newline='') as pokemon_csv:
+        rows = [line.rstrip('\r\n').split(',') for line in pokemon_csv]
+
+    with path.open('w', encoding='UTF-8', newline='') as pokemon_csv:
+        for row in rows:
+            del row[2]
+            pokemon_csv.write(','.join(row) + '\r\n')
+
+    assert rows[0] == ['id', 'identifier', 'order']
+    assert validate.validate_csvs(jobs=1) == []
+
+def test_missing_required_column(data_dir):
+    path = data_dir / 'type_charts.csv'
+    path.write_text('id\r\n1\r\n', encoding='UTF-8')
+
+    assert messages(validate.validate_csvs(jobs=1)) == [
+        ('type_charts.csv', 1, 'missing required column identifier'),
+    ]
+
+def test_validation_error():
+    error = validate.ValidationError([validate.Violation('x.csv', 2, 'bad')])
+
+    assert str(error) == '1 problem in the CSVs'
+    assert str(error.violations[0]) == 'x.csv, line 2: bad'